@@ -0,0 +1,115 @@
+"""
+Course structure maps used to maintain AggregateCompletion records.
+
+This app does not know how learning contexts are structured, so the host names
+a provider with the COMPLETION_AGGREGATE_STRUCTURE_PROVIDER setting: the dotted
+path of a callable that takes a LearningContextKey and returns a dict mapping
+the UsageKey of every block that has children to the list of its children's
+UsageKeys, or None if the structure is unknown.  Blocks that have no children
+are the completable leaves; excluded blocks should be left out.
+
+The structure is reduced to the aggregation blocks above each leaf, and the
+number of leaves below each aggregation block, and kept in the Django cache
+for COMPLETION_AGGREGATE_STRUCTURE_TIMEOUT seconds.  Call
+clear_course_structure() when a course is published.
+"""
+
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .caching import get_cache, hash_key
+
+DEFAULT_AGGREGATION_TYPES = ('course', 'chapter', 'sequential', 'vertical')
+
+
+class CourseStructure(namedtuple('CourseStructure', ['ancestors', 'possible'])):
+    """
+    The aggregation structure of a learning context.
+
+    * ancestors: dict mapping the UsageKey of each leaf to a tuple of the
+      aggregation blocks above it.
+    * possible: dict mapping the UsageKey of each aggregation block to the
+      number of leaves below it.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_children(cls, children, aggregation_types=None):
+        """
+        Build the structure from a dict mapping block keys to lists of child keys.
+        """
+        aggregation_types = aggregation_types or get_aggregation_types()
+        parents = {}
+        for parent, child_keys in children.items():
+            for child in child_keys:
+                parents.setdefault(child, []).append(parent)
+
+        ancestors = {}
+        possible = {}
+        for leaf in parents:
+            if children.get(leaf) or leaf.block_type in aggregation_types:
+                continue
+            seen = set()
+            stack = list(parents[leaf])
+            while stack:
+                block_key = stack.pop()
+                if block_key in seen:
+                    continue
+                seen.add(block_key)
+                stack.extend(parents.get(block_key, ()))
+            leaf_ancestors = tuple(block_key for block_key in seen if block_key.block_type in aggregation_types)
+            ancestors[leaf] = leaf_ancestors
+            for block_key in leaf_ancestors:
+                possible[block_key] = possible.get(block_key, 0) + 1
+        return cls(ancestors, possible)
+
+
+def aggregates_enabled():
+    """
+    Returns True if AggregateCompletion records should be maintained.
+    """
+    return getattr(settings, 'COMPLETION_AGGREGATES_ENABLED', False)
+
+
+def get_aggregation_types():
+    """
+    Returns the block types that get AggregateCompletion records.
+    """
+    return tuple(getattr(settings, 'COMPLETION_AGGREGATION_BLOCK_TYPES', DEFAULT_AGGREGATION_TYPES))
+
+
+def _structure_key(context_key):
+    return f'completion.structure.{hash_key(context_key)}'
+
+
+def get_course_structure(context_key):
+    """
+    Returns the CourseStructure of a learning context, or None if no
+    provider is configured or the provider does not know the context.
+    """
+    provider_path = getattr(settings, 'COMPLETION_AGGREGATE_STRUCTURE_PROVIDER', None)
+    if not provider_path:
+        return None
+    cache = get_cache()
+    cache_key = _structure_key(context_key)
+    structure = cache.get(cache_key)
+    if structure is None:
+        children = import_string(provider_path)(context_key)
+        if children is None:
+            return None
+        structure = CourseStructure.from_children(children)
+        cache.set(cache_key, structure, getattr(settings, 'COMPLETION_AGGREGATE_STRUCTURE_TIMEOUT', 3600))
+    return structure
+
+
+def clear_course_structure(context_key):
+    """
+    Forget the cached structure of a learning context.
+
+    AggregateCompletion records are not updated; rebuild them with the
+    rebuild_completion_aggregates management command if the possible counts
+    changed.
+    """
+    get_cache().delete(_structure_key(context_key))
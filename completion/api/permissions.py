@@ -45,3 +45,18 @@ class IsUserInUrl(BasePermission):
                 return False  # staff gets 403
             raise Http404()
         return True
+
+
+class IsStaffOrUserInUrl(BasePermission):
+    """
+    Permission that allows access to staff users, or to the user named in the URL.
+
+    Unlike IsStaffOrOwner, the query string and request body are ignored,
+    since the requesting user controls them.
+    """
+
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        url_username = getattr(view, 'kwargs', {}).get('username', '')
+        return request.user.username.lower() == url_username.lower()
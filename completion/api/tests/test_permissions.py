@@ -5,7 +5,7 @@ import ddt
 from django.test import TestCase, RequestFactory
 from rest_framework.generics import GenericAPIView
 
-from ..permissions import IsStaffOrOwner
+from ..permissions import IsStaffOrOwner, IsStaffOrUserInUrl
 from ...test_utils import UserFactory
 
 
@@ -98,3 +98,34 @@ class IsStaffOrOwnerTests(TestCase):
         view = GenericAPIView()
         view.kwargs = {'username': UserFactory().username}
         self.assertFalse(self.permission.has_permission(self.request, view))
+
+
+class IsStaffOrUserInUrlTests(TestCase):
+    """ Tests for IsStaffOrUserInUrl permission class. """
+
+    def setUp(self):
+        super().setUp()
+        self.permission = IsStaffOrUserInUrl()
+        self.view = GenericAPIView()
+        self.view.kwargs = {'username': UserFactory().username}
+
+    def test_staff_user(self):
+        """ Staff users should be permitted. """
+        request = RequestFactory().get('/')
+        request.user = UserFactory(is_staff=True)
+        self.assertTrue(self.permission.has_permission(request, self.view))
+
+    def test_user_in_url(self):
+        """ The user named in the URL should be permitted, whatever the case of the name. """
+        user = UserFactory()
+        request = RequestFactory().get('/')
+        request.user = user
+        self.view.kwargs = {'username': user.username.upper()}
+        self.assertTrue(self.permission.has_permission(request, self.view))
+
+    def test_spoofed_query_parameter(self):
+        """ A username in the query string should not grant access to another user's URL. """
+        user = UserFactory()
+        request = RequestFactory().get(f'/?username={user.username}')
+        request.user = user
+        self.assertFalse(self.permission.has_permission(request, self.view))
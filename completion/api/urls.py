@@ -8,4 +8,5 @@ from django.urls import path
 app_name = 'completion'  # pylint: disable=invalid-name
 urlpatterns = [
     path('v1/', include('completion.api.v1.urls')),
+    path('v2/', include('completion.api.v2.urls')),
 ]
@@ -8,7 +8,24 @@ from . import views
 app_name = 'v1'  # pylint: disable=invalid-name
 urlpatterns = [
     path('completion-batch', views.CompletionBatchView.as_view(), name='completion-batch'),
-    re_path(r'^subsection-completion/{username}/{course_key}/{subsection_id}'.format(  # pylint: disable=consider-using-f-string
+    re_path(r'^completions/{username}/{course_key}$'.format(  # pylint: disable=consider-using-f-string
+        username=r'(?P<username>[^/]*)',
+        course_key=r'(?P<course_key>[^/+]+(/|\+)[^/+]+(/|\+)[^/?]+)',
+    ),  # noqa
+        views.LearningContextCompletionsView.as_view(),
+        name='learning-context-completions'),
+    re_path(r'^completion-matrix/{course_key}$'.format(  # pylint: disable=consider-using-f-string
+        course_key=r'(?P<course_key>[^/+]+(/|\+)[^/+]+(/|\+)[^/?]+)',
+    ),  # noqa
+        views.CompletionMatrixView.as_view(),
+        name='completion-matrix'),
+    re_path(r'^completion-stats/{course_key}$'.format(  # pylint: disable=consider-using-f-string
+        course_key=r'(?P<course_key>[^/+]+(/|\+)[^/+]+(/|\+)[^/?]+)',
+    ),  # noqa
+        views.CompletionStatsView.as_view(),
+        name='completion-stats'),
+    # pylint: disable-next=consider-using-f-string
+    re_path(r'^subsection-completion/{username}/{course_key}/{subsection_id}'.format(
         username=r'(?P<username>[^/]*)',
         course_key=r'(?P<course_key>[^/+]+(/|\+)[^/+]+(/|\+)[^/?]+)',
         subsection_id=r'(?P<subsection_id>[^/]*)'
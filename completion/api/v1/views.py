@@ -9,6 +9,9 @@ from rest_framework.views import APIView
 from django.contrib import auth
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db import DatabaseError
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.utils.translation import gettext as _
 
 # pylint: disable=ungrouped-imports
@@ -24,18 +27,18 @@ except ImportError:
 # pylint: enable=ungrouped-imports
 
 from opaque_keys import InvalidKeyError
-from opaque_keys.edx.keys import LearningContextKey, UsageKey
 
 try:
-    from common.djangoapps.student.models import CourseEnrollment
     from lms.djangoapps.course_api.blocks.api import get_blocks
     from openedx.core.lib.api.authentication import BearerAuthenticationAllowInactiveUser
 except ImportError:
     pass
 
-from completion import waffle
-from completion.api.permissions import IsStaffOrOwner, IsUserInUrl
-from completion.models import BlockCompletion
+from completion import batch, keys, lookups, waffle
+from completion.api.permissions import IsStaffOrOwner, IsStaffOrUserInUrl, IsUserInUrl
+from completion.export import MATRIX_FIELDS, iter_completion_matrix, iter_csv, iter_ndjson
+from completion.models import BlockCompletion, validate_percent
+from completion.utilities import get_aggregate_completion, get_completions_validators
 
 User = auth.get_user_model()
 
@@ -69,7 +72,7 @@ class CompletionBatchView(APIView):
             ```
 
         Return Value:
-            * tuple: (User, LearningContextKey, List of tuples (UsageKey, completion_float)
+            * tuple: (user id, List of tuples (UsageKey, completion_float))
 
         Raises:
 
@@ -89,11 +92,13 @@ class CompletionBatchView(APIView):
                 raise ValidationError(_("Key '{key}' not found.").format(key=key))
 
         username = batch_object['username']
-        user = User.objects.get(username=username)
+        user_id = batch.get_user_ids({username}).get(username)
+        if user_id is None:
+            raise User.DoesNotExist(_("User matching query does not exist."))
 
         context_key_obj = self._validate_and_parse_context_key(batch_object['course_key'])
 
-        if context_key_obj.is_course and not CourseEnrollment.is_enrolled(user, context_key_obj):
+        if context_key_obj.is_course and not lookups.get_enrolled({(user_id, context_key_obj)}, lookups.load_enrolled):
             raise ValidationError(_('User is not enrolled in course.'))
 
         blocks = batch_object['blocks']
@@ -103,36 +108,19 @@ class CompletionBatchView(APIView):
             completion = float(blocks[block_key])
             block_objs.append((block_key_obj, completion))
 
-        return user, block_objs
+        return user_id, block_objs
 
     def _validate_and_parse_context_key(self, context_key):
         """
         Returns a validated parsed LearningContextKey deserialized from the given context_key.
         """
-        try:
-            return LearningContextKey.from_string(context_key)
-        except InvalidKeyError as error:
-            raise ValidationError(_("Invalid learning context key: {}").format(context_key)) from error
+        return batch.parse_context_key(context_key)
 
     def _validate_and_parse_block_key(self, block_key, context_key_obj):
         """
         Returns a validated, parsed UsageKey deserialized from the given block_key.
         """
-        try:
-            block_key_obj = UsageKey.from_string(block_key)
-        except InvalidKeyError as error:
-            raise ValidationError(_("Invalid block key: {}").format(block_key)) from error
-
-        if block_key_obj.context_key.is_course and block_key_obj.context_key.run is None:
-            # block_key_obj is from an old mongo course and its context_key is missing run info:
-            block_key_obj = block_key_obj.replace(course_key=context_key_obj)
-
-        if block_key_obj.context_key != context_key_obj:
-            raise ValidationError(
-                _("Block with key: '{key}' is not in context {context}").format(key=block_key, context=context_key_obj)
-            )
-
-        return block_key_obj
+        return batch.parse_block_key(block_key, context_key_obj)
 
     def post(self, request, *args, **kwargs):  # pylint: disable=unused-argument
         """
@@ -167,8 +155,10 @@ class CompletionBatchView(APIView):
         """
         batch_object = request.data or {}
         try:
-            user, blocks = self._validate_and_parse(batch_object)
-            BlockCompletion.objects.submit_batch_completion(user, blocks)
+            user_id, blocks = self._validate_and_parse(batch_object)
+            BlockCompletion.objects.submit_bulk_completion(
+                (user_id, block_key, completion) for block_key, completion in blocks
+            )
         except ValidationError as exc:
             return Response({
                 "detail": _(' ').join(str(msg) for msg in exc.messages),
@@ -203,29 +193,6 @@ class SubsectionCompletionView(APIView):
         Returns completion for a (user, subsection, course).
         """
 
-        def get_completion(course_completions, all_blocks, block_id):
-            """
-            Recursively get the aggregate completion for a subsection,
-            given the subsection block and a list of all blocks.
-
-            Parameters:
-                course_completions: a dictionary of completion values by block IDs
-                all_blocks: a dictionary of the block structure for a subsection
-                block_id: an ID of a block for which to get completion
-            """
-            block = all_blocks.get(block_id)
-            child_ids = block.get('children', [])
-            if not child_ids:
-                return course_completions.get(block.serializer.instance, 0)
-
-            completion = 0
-            total_children = 0
-            for child_id in child_ids:
-                completion += get_completion(course_completions, all_blocks, child_id)
-                total_children += 1
-
-            return int(completion == total_children)
-
         user_id = User.objects.get(username=username).id
         block_types_filter = [
             'course',
@@ -241,7 +208,7 @@ class SubsectionCompletionView(APIView):
 
         blocks = get_blocks(
             request,
-            UsageKey.from_string(subsection_id),
+            keys.parse_usage_key(subsection_id),
             nav_depth=2,
             requested_fields=[
                 'children'
@@ -249,8 +216,207 @@ class SubsectionCompletionView(APIView):
             block_types_filter=block_types_filter
         )
 
-        course_key = LearningContextKey.from_string(course_key)
-        context_completions = BlockCompletion.get_learning_context_completions(user_id, course_key)
-        aggregated_completion = get_completion(context_completions, blocks['blocks'], blocks['root'])
+        # Only the completions of the subsection's leaf blocks are read, rather than the whole course.
+        children = {}
+        block_keys = {}
+        for block_id, block in blocks['blocks'].items():
+            child_ids = block.get('children', [])
+            if child_ids:
+                children[block_id] = child_ids
+            else:
+                block_keys[block_id] = block.serializer.instance
+        aggregated_completion = get_aggregate_completion(
+            user_id, keys.parse_context_key(course_key), blocks['root'], children, block_keys,
+        )
 
         return Response({"completion": aggregated_completion}, status=status.HTTP_200_OK)
+
+
+class LearningContextCompletionsView(APIView):
+    """
+    Handles API requests to read the completions of a user in a learning context.
+    """
+    authentication_classes = (
+        JwtAuthentication, BearerAuthenticationAllowInactiveUser, SessionAuthenticationAllowInactiveUser,
+    )
+    permission_classes = (permissions.IsAuthenticated, IsStaffOrUserInUrl,)
+
+    def get(self, request, username, course_key):
+        """
+        Returns the completions of a user in a course or other learning context.
+
+        **Example Request**
+
+            GET /api/completion/v1/completions/{username}/{course_key}
+
+        **Returns**
+
+        If successful, status code is 200, with ETag and Last-Modified headers.
+        ```
+        {
+          "username": "username",
+          "course_key": "course-key",
+          "completions": {
+            "block_key1": 1.0,
+            "block_key2": 0.5,
+          }
+        }
+        ```
+
+        If the request has an If-None-Match or If-Modified-Since header that
+        matches the current completions, status code is 304 and the
+        completions are not read.
+
+        Otherwise, a 400 or 404 may be returned, and the "detail" content will explain the error.
+        """
+        try:
+            context_key = keys.parse_context_key(course_key)
+        except InvalidKeyError:
+            return Response({
+                "detail": _("Invalid learning context key: {}").format(course_key),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            user_id = User.objects.values_list('id', flat=True).get(username=username)
+        except ObjectDoesNotExist as exc:
+            return Response({
+                "detail": str(exc),
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        etag, last_modified = get_completions_validators(user_id, context_key)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            completions = BlockCompletion.get_learning_context_completions(user_id, context_key)
+            response = Response({
+                "username": username,
+                "course_key": str(context_key),
+                "completions": {str(block_key): completion for block_key, completion in completions.items()},
+            }, status=status.HTTP_200_OK)
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Clients and intermediaries must check back before reusing a learner's completions.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class CompletionMatrixView(APIView):
+    """
+    Handles staff API requests to stream every learner's completions in a learning context.
+    """
+    authentication_classes = (
+        JwtAuthentication, BearerAuthenticationAllowInactiveUser, SessionAuthenticationAllowInactiveUser,
+    )
+    permission_classes = (permissions.IsAuthenticated, permissions.IsAdminUser,)
+    OUTPUT_FORMATS = {
+        'ndjson': ('application/x-ndjson', iter_ndjson),
+        'csv': ('text/csv', iter_csv),
+    }
+
+    def get(self, request, course_key):
+        """
+        Streams a (username, block_key, completion) row for every completion in a course.
+
+        **Example Request**
+
+            GET /api/completion/v1/completion-matrix/{course_key}?output=csv&block_type=problem
+
+        **Query Parameters**
+
+            * output: "ndjson" (the default) or "csv".
+            * block_type: Only include completions of this block type.  May be repeated.
+
+        **Returns**
+
+        If successful, status code is 200 and the rows are streamed as they are
+        read, one page of rows at a time.  NDJSON rows look like
+        ```
+        {"username": "username", "block_key": "block_key1", "completion": 1.0}
+        ```
+
+        Otherwise, a 400 may be returned, and the "detail" content will explain the error.
+        """
+        try:
+            context_key = keys.parse_context_key(course_key)
+        except InvalidKeyError:
+            return Response({
+                "detail": _("Invalid learning context key: {}").format(course_key),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        output = request.GET.get('output', 'ndjson')
+        if output not in self.OUTPUT_FORMATS:
+            return Response({
+                "detail": _("Invalid output format: {}").format(output),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, formatter = self.OUTPUT_FORMATS[output]
+        rows = iter_completion_matrix(context_key, block_types=request.GET.getlist('block_type'))
+        response = StreamingHttpResponse(formatter(rows, MATRIX_FIELDS), content_type=content_type)
+        if output == 'csv':
+            response['Content-Disposition'] = 'attachment; filename="completions.csv"'
+        return response
+
+
+class CompletionStatsView(APIView):
+    """
+    Handles staff API requests for the completion statistics of every block in a learning context.
+    """
+    authentication_classes = (
+        JwtAuthentication, BearerAuthenticationAllowInactiveUser, SessionAuthenticationAllowInactiveUser,
+    )
+    permission_classes = (permissions.IsAuthenticated, permissions.IsAdminUser,)
+
+    def get(self, request, course_key):
+        """
+        Returns the completion statistics of every block, and every block type, in a course.
+
+        **Example Request**
+
+            GET /api/completion/v1/completion-stats/{course_key}?threshold=0.5
+
+        **Query Parameters**
+
+            * threshold: The completion at or above which a block counts as
+              completed, between 0.0 and 1.0.  Defaults to 1.0.
+
+        **Returns**
+
+        If successful, status code is 200.  "learners" is the number of
+        learners with a completion record for the block, "completed" the
+        number of them at or above the threshold, and "average" their
+        average completion.
+        ```
+        {
+          "course_key": "course-key",
+          "threshold": 1.0,
+          "blocks": {
+            "block_key1": {"block_type": "problem", "learners": 20, "completed": 15, "average": 0.8},
+          },
+          "block_types": {
+            "problem": {"blocks": 1, "learners": 20, "completed": 15, "average": 0.8},
+          }
+        }
+        ```
+
+        Otherwise, a 400 may be returned, and the "detail" content will explain the error.
+        """
+        try:
+            context_key = keys.parse_context_key(course_key)
+        except InvalidKeyError:
+            return Response({
+                "detail": _("Invalid learning context key: {}").format(course_key),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            threshold = float(request.GET.get('threshold', 1.0))
+            validate_percent(threshold)
+        except (ValueError, ValidationError):
+            return Response({
+                "detail": _("Invalid threshold: {}").format(request.GET.get('threshold')),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        stats = BlockCompletion.get_learning_context_stats(context_key, threshold)
+        return Response({
+            "course_key": str(context_key),
+            "threshold": threshold,
+            "blocks": {str(block_key): block_stats for block_key, block_stats in stats['blocks'].items()},
+            "block_types": stats['block_types'],
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,11 @@
+"""
+API v2 URLs.
+"""
+from django.urls import path
+
+from . import views
+
+app_name = 'v2'  # pylint: disable=invalid-name
+urlpatterns = [
+    path('completion-batch', views.CompletionBatchView.as_view(), name='completion-batch'),
+]
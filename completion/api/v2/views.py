@@ -0,0 +1,95 @@
+"""
+API v2 views.
+"""
+
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext as _
+
+# pylint: disable=ungrouped-imports
+try:
+    from edx_rest_framework_extensions.auth.jwt.authentication import JwtAuthentication
+except ImportError:
+    from edx_rest_framework_extensions.authentication import JwtAuthentication
+
+try:
+    from edx_rest_framework_extensions.auth.session.authentication import SessionAuthenticationAllowInactiveUser
+except ImportError:
+    from edx_rest_framework_extensions.authentication import SessionAuthenticationAllowInactiveUser
+# pylint: enable=ungrouped-imports
+
+try:
+    from openedx.core.lib.api.authentication import BearerAuthenticationAllowInactiveUser
+except ImportError:
+    pass
+
+from completion.batch import submit_completion_groups
+from completion.lookups import load_enrolled
+
+
+class CompletionBatchView(APIView):
+    """
+    Handles API requests to submit the completions of many users and learning contexts at once.
+    """
+    authentication_classes = (
+        JwtAuthentication, BearerAuthenticationAllowInactiveUser, SessionAuthenticationAllowInactiveUser,
+    )
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request, *args, **kwargs):  # pylint: disable=unused-argument
+        """
+        Inserts the completions of many (username, course_key) batches.
+
+        Staff may submit completions for any user; other users only for themselves.
+
+        REST Endpoint Format:
+        ```
+        {
+          "batches": [
+            {
+              "username": "username",
+              "course_key": "course-key",
+              "blocks": {
+                "block_key1": 0.0,
+                "block_key2": 1.0,
+              }
+            },
+            ...
+          ]
+        }
+        ```
+
+        **Returns**
+
+        If the request is well formed, status code is 200, with a result for
+        each batch, in the same order.  The completions of every batch with
+        status 200 were written; the others were not.
+        ```
+        {
+          "results": [
+            {"username": "username", "course_key": "course-key", "status": 200, "detail": "ok"},
+            {"username": "other", "course_key": "course-key", "status": 404, "detail": "User other does not exist."},
+          ]
+        }
+        ```
+
+        Otherwise, a 400 is returned, and the "detail" content will explain the error.
+        """
+        groups = request.data.get('batches') if isinstance(request.data, dict) else None
+        if not isinstance(groups, list):
+            return Response({
+                "detail": _("Key 'batches' not found."),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            results = submit_completion_groups(
+                groups, load_enrolled, username=None if request.user.is_staff else request.user.username,
+            )
+        except ValidationError as exc:
+            return Response({
+                "detail": _(' ').join(str(msg) for msg in exc.messages),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
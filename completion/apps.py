@@ -2,8 +2,11 @@
 App Configuration for Completion
 """
 
+import atexit
 
 from django.apps import AppConfig
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save
 
 
 class CompletionAppConfig(AppConfig):
@@ -37,7 +40,29 @@ class CompletionAppConfig(AppConfig):
                         'signal_path': 'lms.djangoapps.grades.signals.signals.PROBLEM_WEIGHTED_SCORE_CHANGED',
                         'dispatch_uid': 'completion.handlers.scorable_block_completion',
                     },
+                    {
+                        'receiver_func_name': 'enrollment_status_changed',
+                        'signal_path': 'common.djangoapps.student.signals.ENROLL_STATUS_CHANGE',
+                        'dispatch_uid': 'completion.handlers.enrollment_status_changed',
+                    },
                 ],
             },
         },
     }
+
+    def ready(self):
+        from django.contrib.auth import get_user_model  # pylint: disable=import-outside-toplevel
+        from waffle import get_waffle_switch_model  # pylint: disable=import-outside-toplevel
+        from .buffer import flush_write_buffer  # pylint: disable=import-outside-toplevel
+        from .handlers import check_dispatch_settings  # pylint: disable=import-outside-toplevel
+        from .lookups import clear_user_cache  # pylint: disable=import-outside-toplevel
+        from .policies import warm_block_policies  # pylint: disable=import-outside-toplevel
+        from .waffle import clear_switch_cache  # pylint: disable=import-outside-toplevel
+        request_finished.connect(flush_write_buffer, dispatch_uid='completion.buffer.flush_write_buffer')
+        atexit.register(flush_write_buffer)
+        switch_model = get_waffle_switch_model()
+        post_save.connect(clear_switch_cache, sender=switch_model, dispatch_uid='completion.waffle.switch_saved')
+        post_delete.connect(clear_switch_cache, sender=switch_model, dispatch_uid='completion.waffle.switch_deleted')
+        post_save.connect(clear_user_cache, sender=get_user_model(), dispatch_uid='completion.lookups.user_saved')
+        warm_block_policies()
+        check_dispatch_settings()
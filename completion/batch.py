@@ -0,0 +1,207 @@
+"""
+Submission of the completions of many (user, learning context) groups at once.
+
+Each group has the format of a v1 completion batch.  Users are looked up with
+a single query and enrollments with a single call, both memoized in process
+by completion.lookups.  Every valid group is written in one bulk transaction,
+and each group gets its own report, so an invalid group does not prevent the
+others from being written.
+"""
+
+from django.conf import settings
+from django.contrib import auth
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError
+from django.utils.translation import gettext as _
+from opaque_keys import InvalidKeyError
+
+from . import keys, lookups, waffle
+from .models import BlockCompletion, validate_percent
+
+User = auth.get_user_model()
+
+REQUIRED_KEYS = ('username', 'course_key', 'blocks')
+
+
+def parse_context_key(context_key):
+    """
+    Returns a validated parsed LearningContextKey deserialized from the given context_key.
+    """
+    try:
+        return keys.parse_context_key(context_key)
+    except InvalidKeyError as error:
+        raise ValidationError(_("Invalid learning context key: {}").format(context_key)) from error
+
+
+def parse_block_key(block_key, context_key_obj):
+    """
+    Returns a validated, parsed UsageKey deserialized from the given block_key.
+    """
+    try:
+        block_key_obj = keys.parse_usage_key(block_key)
+    except InvalidKeyError as error:
+        raise ValidationError(_("Invalid block key: {}").format(block_key)) from error
+
+    if block_key_obj.context_key.is_course and block_key_obj.context_key.run is None:
+        # block_key_obj is from an old mongo course and its context_key is missing run info:
+        block_key_obj = keys.fill_in_run(block_key_obj, context_key_obj)
+
+    if block_key_obj.context_key != context_key_obj:
+        raise ValidationError(
+            _("Block with key: '{key}' is not in context {context}").format(key=block_key, context=context_key_obj)
+        )
+
+    return block_key_obj
+
+
+def _parse_group(group):
+    """
+    Returns the username, LearningContextKey and list of (UsageKey, completion)
+    tuples of a group.
+
+    Raises:
+        django.core.exceptions.ValidationError: If the group is not valid.
+    """
+    if not isinstance(group, dict):
+        raise ValidationError(_("Each batch must be an object."))
+    for key in REQUIRED_KEYS:
+        if key not in group:
+            raise ValidationError(_("Key '{key}' not found.").format(key=key))
+    for key in ('username', 'course_key'):
+        if not isinstance(group[key], str) or not group[key]:
+            raise ValidationError(_("'{key}' must be a non-empty string.").format(key=key))
+
+    context_key_obj = parse_context_key(group['course_key'])
+    blocks = group['blocks']
+    if not isinstance(blocks, dict):
+        raise ValidationError(_("'blocks' must be an object."))
+    block_objs = []
+    for block_key, completion in blocks.items():
+        block_key_obj = parse_block_key(block_key, context_key_obj)
+        try:
+            completion = float(completion)
+        except (TypeError, ValueError) as error:
+            raise ValidationError(_("Invalid completion: {}").format(completion)) from error
+        validate_percent(completion)
+        block_objs.append((block_key_obj, completion))
+    return group['username'], context_key_obj, block_objs
+
+
+def _load_user_ids(usernames):
+    """
+    Returns a dict mapping each of `usernames` that exists to its user id.
+
+    Usernames are matched the way the database compares them, like
+    User.objects.get(username=...), so where its collation is case-insensitive
+    a username that differs in case from the stored one is found too.
+    """
+    stored = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    folded = {username.casefold(): user_id for username, user_id in stored.items()}
+    user_ids = {}
+    for username in usernames:
+        user_id = stored.get(username, folded.get(username.casefold()))
+        if user_id is not None:
+            user_ids[username] = user_id
+    return user_ids
+
+
+def get_user_ids(usernames):
+    """
+    Returns a dict mapping each of `usernames` that exists to its user id.
+
+    Ids are memoized in process for COMPLETION_LOOKUP_CACHE_TIMEOUT seconds.
+    """
+    return lookups.get_user_ids(usernames, _load_user_ids)
+
+
+def submit_completion_groups(groups, get_enrolled, username=None):
+    """
+    Validate and submit the completions of many (user, learning context) groups.
+
+    Parameters:
+        * groups: A list of dicts with the format of a v1 completion batch:
+          ```
+          {
+              "username": "username",
+              "course_key": "context-key",
+              "blocks": {"block_key1": 0.0, "block_key2": 1.0}
+          }
+          ```
+        * get_enrolled (callable): Takes a set of (user_id, CourseKey) tuples
+          and returns the set of those where the user is enrolled in the
+          course.  It is not called for other learning contexts, nor for
+          enrollments memoized for COMPLETION_LOOKUP_CACHE_TIMEOUT seconds.
+        * username (str): If given, only groups of this user are accepted.
+
+    Return Value:
+        A list with a report for each group, in the same order:
+        ```
+        {"username": "username", "course_key": "context-key", "status": 200, "detail": "ok"}
+        ```
+        The status is 200 if the completions were written, 400 if the group
+        is not valid or the user is not enrolled in the course, 403 if it is
+        for another user than `username`, 404 if the user does not exist and
+        500 if the completions could not be written.
+
+    Raises:
+        django.core.exceptions.ValidationError: If there are more than
+            COMPLETION_BATCH_MAX_GROUPS groups, or the feature is disabled.
+    """
+    if not waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
+        raise ValidationError(
+            _("BlockCompletion.objects.submit_bulk_completion should not be called when the feature is disabled.")
+        )
+    max_groups = getattr(settings, 'COMPLETION_BATCH_MAX_GROUPS', 1000)
+    if len(groups) > max_groups:
+        raise ValidationError(
+            _("At most {max_groups} batches may be submitted at once.").format(max_groups=max_groups)
+        )
+
+    reports = []
+    parsed = {}
+    for index, group in enumerate(groups):
+        report = {
+            'username': group.get('username') if isinstance(group, dict) else None,
+            'course_key': group.get('course_key') if isinstance(group, dict) else None,
+        }
+        reports.append(report)
+        try:
+            parsed[index] = _parse_group(group)
+        except ValidationError as exc:
+            report.update(status=400, detail=' '.join(str(msg) for msg in exc.messages))
+            continue
+        if username is not None and parsed[index][0] != username:
+            del parsed[index]
+            report.update(status=403, detail=_("You may only submit your own completions."))
+
+    user_ids = get_user_ids({group[0] for group in parsed.values()}) if parsed else {}
+    course_user_ids = {
+        (user_ids[group_username], context_key)
+        for group_username, context_key, blocks in parsed.values()
+        if group_username in user_ids and context_key.is_course
+    }
+    enrolled = lookups.get_enrolled(course_user_ids, get_enrolled) if course_user_ids else set()
+
+    accepted = []
+    submissions = []
+    for index, (group_username, context_key, blocks) in parsed.items():
+        user_id = user_ids.get(group_username)
+        if user_id is None:
+            reports[index].update(
+                status=404, detail=_("User {username} does not exist.").format(username=group_username)
+            )
+        elif context_key.is_course and (user_id, context_key) not in enrolled:
+            reports[index].update(status=400, detail=_('User is not enrolled in course.'))
+        else:
+            accepted.append(index)
+            submissions.extend((user_id, block_key, completion) for block_key, completion in blocks)
+
+    try:
+        BlockCompletion.objects.submit_bulk_completion(submissions)
+    except DatabaseError as exc:
+        for index in accepted:
+            reports[index].update(status=500, detail=str(exc))
+    else:
+        for index in accepted:
+            reports[index].update(status=200, detail=_("ok"))
+    return reports
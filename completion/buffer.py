@@ -0,0 +1,283 @@
+"""
+Optional in-process write-behind buffer for completion submissions.
+
+Learners often submit the same block several times within a few seconds
+(complete-on-view, video progress, rescoring).  When the buffer is enabled,
+those submissions are coalesced in memory and written to the database in bulk.
+
+Pending submissions are also written by a background timer, at the end of
+every request, and when the process exits.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from . import tracking, waffle
+from .models import BlockCompletion, validate_percent
+
+log = logging.getLogger(__name__)
+
+
+def write_buffer_enabled():
+    """
+    Returns True if completion submissions should go through the write buffer.
+    """
+    return getattr(settings, 'COMPLETION_WRITE_BUFFER_ENABLED', False)
+
+
+class CompletionWriteBuffer:
+    """
+    Coalesces completion submissions in memory and writes them in bulk.
+
+    Submissions are keyed by (user, block_key), and a later submission for the
+    same block replaces an earlier one.  Pending submissions are written when
+    the buffer holds `max_size` entries, when the oldest entry has waited
+    `flush_interval` seconds, or when flush() is called, which happens at the
+    end of every request and when the process exits.
+
+    If a bulk write fails, each submission is written on its own, and those
+    that fail again are kept and retried by a later flush, up to
+    `max_attempts` times in all.  At most `max_pending` submissions are kept;
+    beyond that, new submissions are written right away.
+
+    The tracker context of each submission is captured when it is queued,
+    and its tracking log is emitted in that context, whichever request or
+    thread writes it.
+    """
+
+    def __init__(self, max_size=None, flush_interval=None, max_pending=None, max_attempts=None):
+        self._max_size = max_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._flushing = {}
+        self._oldest = None
+        self._retry_at = 0
+        self._timer = None
+
+    @property
+    def max_size(self):
+        """
+        The number of pending submissions that triggers a flush.
+        """
+        if self._max_size is not None:
+            return self._max_size
+        return getattr(settings, 'COMPLETION_WRITE_BUFFER_MAX_SIZE', 1000)
+
+    @property
+    def flush_interval(self):
+        """
+        The number of seconds a submission may wait before it triggers a flush.
+        """
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'COMPLETION_WRITE_BUFFER_FLUSH_INTERVAL', 5)
+
+    @property
+    def max_pending(self):
+        """
+        The largest number of submissions the buffer holds.
+        """
+        if self._max_pending is not None:
+            return self._max_pending
+        return getattr(settings, 'COMPLETION_WRITE_BUFFER_MAX_PENDING', 10000)
+
+    @property
+    def max_attempts(self):
+        """
+        The number of failed writes after which a submission is dropped.
+        """
+        if self._max_attempts is not None:
+            return self._max_attempts
+        return getattr(settings, 'COMPLETION_WRITE_BUFFER_MAX_ATTEMPTS', 3)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def submit_completion(self, user, block_key, completion):
+        """
+        Submit a completion for the specified user and block.
+
+        Takes the same parameters and raises the same validation errors as
+        BlockCompletion.objects.submit_completion.  When the buffer is
+        disabled, the completion is written immediately and the result of
+        submit_completion is returned.  Otherwise it is queued and None is
+        returned, unless the buffer already holds `max_pending` submissions,
+        in which case it is also written immediately.
+        """
+        if not write_buffer_enabled():
+            return BlockCompletion.objects.submit_completion(user=user, block_key=block_key, completion=completion)
+
+        BlockCompletion.objects._validate_block_key(block_key)  # pylint: disable=protected-access
+        validate_percent(completion)
+        if not waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
+            raise RuntimeError(
+                "CompletionWriteBuffer.submit_completion should not be called when the feature is disabled."
+            )
+
+        context = tracking.capture_context()
+        key = (user.id, block_key)
+        with self._lock:
+            full = key not in self._pending and len(self._pending) >= self.max_pending
+            if not full:
+                now = time.monotonic()
+                if not self._pending:
+                    self._oldest = now
+                self._pending[key] = (completion, context, 0)
+                # After a failed flush, wait for the timer to retry rather
+                # than write again from every submission.
+                should_flush = now >= self._retry_at and (
+                    len(self._pending) >= self.max_size or
+                    now - self._oldest >= self.flush_interval
+                )
+                if not should_flush:
+                    self._start_timer()
+        if full:
+            log.warning("The completion write buffer is full; writing a completion for %s right away.", block_key)
+            return BlockCompletion.objects.submit_completion(user=user, block_key=block_key, completion=completion)
+        if should_flush:
+            self.flush()
+        return None
+
+    def _start_timer(self):
+        """
+        Start a background timer that flushes the buffer after
+        `flush_interval` seconds, unless one is already running.
+
+        Must be called with self._lock held.
+        """
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_interval, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_on_timer(self):
+        """
+        Flush the buffer from the timer thread, and close the database
+        connections the thread opened.
+        """
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def pending_completions(self, user, context_key):
+        """
+        Returns a dictionary mapping BlockKeys to the completion values that
+        have been submitted for the given user and learning context but not
+        written to the database yet.
+
+        Return value:
+            dict[BlockKey] = float
+        """
+        with self._lock:
+            return {
+                block_key: completion
+                for pending in (self._flushing, self._pending)
+                for (user_id, block_key), (completion, _, _) in pending.items()
+                if user_id == user.id and block_key.context_key == context_key
+            }
+
+    def flush(self):
+        """
+        Write all pending submissions to the database.
+
+        Return Value: (int) The number of completions written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._flushing, self._pending = self._pending, {}
+                self._oldest = None
+                timer, self._timer = self._timer, None
+            if timer is not None:
+                timer.cancel()
+            if not self._flushing:
+                return 0
+            try:
+                return self._write(self._flushing)
+            finally:
+                with self._lock:
+                    self._flushing = {}
+
+    def _write(self, entries):
+        """
+        Write `entries` in bulk, or one at a time if the bulk write fails.
+
+        Entries that cannot be written are queued again, behind any newer
+        submissions for the same blocks, or dropped once they have failed
+        `max_attempts` times.
+
+        Return Value: (int) The number of completions written.
+        """
+        try:
+            self._submit(entries)
+            return len(entries)
+        except Exception:  # pylint: disable=broad-except
+            log.exception("Unable to write %d buffered completions; writing them one at a time.", len(entries))
+
+        written = 0
+        failed = {}
+        for key, (completion, context, attempts) in entries.items():
+            try:
+                self._submit({key: (completion, context, attempts)})
+            except Exception:  # pylint: disable=broad-except
+                if attempts + 1 >= self.max_attempts:
+                    log.exception(
+                        "Dropping the buffered completion of user %s for %s after %d failed writes.",
+                        key[0], key[1], attempts + 1,
+                    )
+                else:
+                    failed[key] = (completion, context, attempts + 1)
+            else:
+                written += 1
+        if failed:
+            log.warning("Unable to write %d buffered completions; they will be retried.", len(failed))
+            self._requeue(failed)
+        return written
+
+    @staticmethod
+    def _submit(entries):
+        BlockCompletion.objects._bulk_submit_completions(  # pylint: disable=protected-access
+            ((user_id, block_key, completion) for (user_id, block_key), (completion, _, _) in entries.items()),
+            contexts={key: context for key, (_, context, _) in entries.items()},
+        )
+
+    def _requeue(self, failed):
+        """
+        Queue failed entries again, to be retried by the timer, keeping at
+        most `max_pending` entries.
+        """
+        with self._lock:
+            retried = {key: entry for key, entry in failed.items() if key not in self._pending}
+            overflow = len(retried) + len(self._pending) - self.max_pending
+            if overflow > 0:
+                log.error("The completion write buffer is full; dropping %d completions that failed to write.",
+                          min(overflow, len(retried)))
+                retried = dict(list(retried.items())[overflow:])
+            self._pending = {**retried, **self._pending}
+            if self._pending:
+                now = time.monotonic()
+                if self._oldest is None:
+                    self._oldest = now
+                self._retry_at = now + self.flush_interval
+                self._start_timer()
+
+
+write_buffer = CompletionWriteBuffer()
+
+
+def flush_write_buffer(sender=None, **kwargs):  # pylint: disable=unused-argument
+    """
+    Write any buffered completions at the end of a request, or when the
+    process exits.
+    """
+    if write_buffer_enabled():
+        write_buffer.flush()
@@ -0,0 +1,161 @@
+"""
+Read-through cache of the completions of one user in one learning context.
+
+When COMPLETION_CACHE_ENABLED is set, the block-to-completion map of a
+(user, learning context) is kept in the Django cache named by
+COMPLETION_CACHE_ALIAS.  Each map is stored under a version stamp that is
+replaced whenever a completion in that learning context is written or cleared
+for that user, so every node sharing the cache stops reading the old map at
+once, without having to find and delete it.
+
+The per-block statistics of a learning context are cached for
+COMPLETION_STATS_CACHE_TIMEOUT seconds.  Writes do not invalidate them: every
+write to a course would otherwise throw away statistics that are expensive to
+compute and shared by all of its learners, so they are allowed to be stale for
+that long instead.
+"""
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+_stats = {'hits': 0, 'misses': 0}
+
+
+def completion_cache_enabled():
+    """
+    Returns True if learning context completions should be cached.
+    """
+    return getattr(settings, 'COMPLETION_CACHE_ENABLED', False)
+
+
+def get_cache():
+    """
+    Returns the Django cache named by COMPLETION_CACHE_ALIAS.
+    """
+    return caches[getattr(settings, 'COMPLETION_CACHE_ALIAS', 'default')]
+
+
+def stats_cache_enabled():
+    """
+    Returns True if the per-block statistics of learning contexts should be cached.
+    """
+    return getattr(settings, 'COMPLETION_STATS_CACHE_TIMEOUT', 0) > 0
+
+
+def hash_key(value):
+    """
+    Returns a hash of a key, such as a learning context key or a username, that
+    may be longer than memcached allows or contain characters it does not.
+    """
+    return hashlib.md5(str(value).encode('utf-8'), usedforsecurity=False).hexdigest()
+
+
+def _version_key(user_id, context_key):
+    return f'completion.version.{user_id}.{hash_key(context_key)}'
+
+
+def _stats_key(context_key, threshold):
+    return f'completion.stats.{hash_key(context_key)}.{threshold}'
+
+
+def _get_versioned(version_key, load, timeout):
+    """
+    Returns the value stored under the current version of `version_key`, or
+    stores and returns load() if there is none.
+
+    The version is read before load() runs, so that a write that lands in
+    between replaces the version the value is stored under.
+    """
+    cache = get_cache()
+    version = cache.get(version_key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(version_key, version, None):
+            version = cache.get(version_key, version)
+    else:
+        value = cache.get(f'{version_key}.{version}')
+        if value is not None:
+            _stats['hits'] += 1
+            return value
+
+    _stats['misses'] += 1
+    value = load()
+    cache.set(f'{version_key}.{version}', value, timeout)
+    return value
+
+
+def get_context_completions(user_id, context_key, load):
+    """
+    Returns the completions of a user in a learning context from the cache, or
+    from load() if they are not cached.
+
+    Parameters:
+        * user_id (int): The id of the user.
+        * context_key (LearningContextKey): The learning context.
+        * load (callable): Returns the completions from the database as a
+          dict mapping BlockKeys to floats.
+
+    Return value:
+        dict[BlockKey] = float
+    """
+    return _get_versioned(
+        _version_key(user_id, context_key), load, getattr(settings, 'COMPLETION_CACHE_TIMEOUT', 300)
+    )
+
+
+def get_context_stats(context_key, threshold, load):
+    """
+    Returns the per-block statistics of a learning context for a completion
+    threshold from the cache, or from load() if they are not cached.
+    """
+    cache = get_cache()
+    stats_key = _stats_key(context_key, threshold)
+    value = cache.get(stats_key)
+    if value is not None:
+        _stats['hits'] += 1
+        return value
+
+    _stats['misses'] += 1
+    value = load()
+    cache.set(stats_key, value, getattr(settings, 'COMPLETION_STATS_CACHE_TIMEOUT', 0))
+    return value
+
+
+def invalidate_context_completions(user_context_keys, using=None):
+    """
+    Replace the version stamps of the given (user_id, context_key) pairs.
+
+    The stamps are replaced right away, so that reads later in the current
+    transaction see its writes, and again once the transaction on `using`
+    commits, so that a map read by another process in between is not reused.
+    """
+    if not completion_cache_enabled():
+        return
+    version_keys = {_version_key(user_id, context_key) for user_id, context_key in user_context_keys}
+    if not version_keys:
+        return
+
+    def bump():
+        get_cache().set_many({version_key: uuid.uuid4().hex for version_key in version_keys}, None)
+
+    bump()
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(bump, using=using)
+
+
+def stats():
+    """
+    Returns the number of cache hits and misses in this process.
+    """
+    return dict(_stats)
+
+
+def reset_stats():
+    """
+    Reset the hit and miss counters.
+    """
+    _stats['hits'] = _stats['misses'] = 0
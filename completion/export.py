@@ -0,0 +1,141 @@
+"""
+Streaming exports of the completions of a learning context.
+
+Completions are read in pages with keyset pagination, in the order of the
+(context_key, block_type, user) index, so memory use depends on the page size
+rather than the size of the learning context, and later pages cost no more
+than the first.  Rows are yielded as plain tuples of EXPORT_FIELDS; block keys
+are exported as stored, without being deserialized.
+"""
+
+import csv
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+from . import keys
+from .models import BlockCompletion
+
+EXPORT_FIELDS = ('user_id', 'block_key', 'block_type', 'completion', 'modified')
+MATRIX_FIELDS = ('username', 'block_key', 'completion')
+
+
+def _iter_keyset(completions, fields, batch_size):
+    """
+    Yield the `fields` of `completions`, one page at a time, in the order of
+    the (context_key, block_type, user) index.
+
+    Each row is prefixed with the (block_type, user_id, id) keyset of the row.
+    """
+    completions = completions.order_by('block_type', 'user_id', 'id').values_list(
+        'block_type', 'user_id', 'id', *fields
+    )
+    after = Q()
+    while True:
+        page = list(completions.filter(after)[:batch_size])
+        yield from page
+        if len(page) < batch_size:
+            return
+        block_type, user_id, pk = page[-1][:3]
+        after = (
+            Q(block_type__gt=block_type) |
+            Q(block_type=block_type, user_id__gt=user_id) |
+            Q(block_type=block_type, user_id=user_id, id__gt=pk)
+        )
+
+
+def _context_completions(context_key, block_types=None, modified_after=None, modified_before=None):
+    """
+    Returns the completions of a learning context, filtered by block type and modified time.
+    """
+    completions = BlockCompletion.objects.filter(context_key=context_key)
+    if block_types:
+        completions = completions.filter(block_type__in=block_types)
+    if modified_after is not None:
+        completions = completions.filter(modified__gte=modified_after)
+    if modified_before is not None:
+        completions = completions.filter(modified__lt=modified_before)
+    return completions
+
+
+def iter_context_completions(context_key, block_types=None, modified_after=None, modified_before=None,
+                             batch_size=1000):
+    """
+    Yield the completions of a learning context, one page at a time.
+
+    Parameters:
+        * context_key (LearningContextKey): The learning context.
+        * block_types ([str]): Only export completions of these block types.
+        * modified_after (datetime): Only export completions modified at or
+          after this time.
+        * modified_before (datetime): Only export completions modified before
+          this time.
+        * batch_size (int): The number of rows read per query.
+
+    Yields:
+        (user_id, block_key, block_type, completion, modified) tuples, where
+        block_key is the serialized usage key.
+    """
+    completions = _context_completions(context_key, block_types, modified_after, modified_before)
+    for block_type, user_id, _, block_key, completion, modified in _iter_keyset(
+        completions, (keys.serialized('block_key'), 'completion', 'modified'), batch_size
+    ):
+        yield user_id, block_key, block_type, completion, modified
+
+
+def iter_completion_matrix(context_key, block_types=None, batch_size=1000):
+    """
+    Yield every learner's completion of every block in a learning context,
+    one page at a time.
+
+    Usernames are joined in by the same query, so the first rows are
+    available after a single page is read however many learners there are.
+
+    Parameters:
+        * context_key (LearningContextKey): The learning context.
+        * block_types ([str]): Only include completions of these block types.
+        * batch_size (int): The number of rows read per query.
+
+    Yields:
+        (username, block_key, completion) tuples, where block_key is the
+        serialized usage key.
+    """
+    for _, _, _, username, block_key, completion in _iter_keyset(
+        _context_completions(context_key, block_types),
+        ('user__username', keys.serialized('block_key'), 'completion'),
+        batch_size,
+    ):
+        yield username, block_key, completion
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def iter_ndjson(rows, fields=EXPORT_FIELDS):
+    """
+    Yield each row as a line of JSON, with `fields` as its keys.
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(fields, map(_serialize, row)))) + '\n'
+
+
+class _Echo:
+    """
+    A file-like object that returns what is written to it, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, fields=EXPORT_FIELDS, header=True):
+    """
+    Yield a CSV header line of `fields`, unless `header` is False, then each row as a CSV line.
+    """
+    writer = csv.writer(_Echo())
+    if header:
+        yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_serialize(value) for value in row])
@@ -3,51 +3,189 @@ Signal handlers to trigger completion updates.
 """
 
 import logging
+import threading
+import time
 
+from django.conf import settings
 from django.contrib import auth
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils.module_loading import import_string
 from opaque_keys import InvalidKeyError
-from opaque_keys.edx.keys import LearningContextKey, UsageKey
-from xblock.completable import XBlockCompletionMode
-from xblock.core import XBlock
 
-from . import waffle
-from .models import BlockCompletion
+from . import keys, lookups, waffle
+from .buffer import write_buffer
+from .policies import get_block_policy
+from .workers import OVERFLOW_REJECT, BoundedWorkerPool
 
 log = logging.getLogger(__name__)
 User = auth.get_user_model()
 
+DISPATCH_INLINE = 'inline'
+DISPATCH_POOL = 'pool'
+DISPATCH_EXECUTOR = 'executor'
+
+_pool = None
+_pool_lock = threading.Lock()
+
 
 def scorable_block_completion(sender, **kwargs):  # pylint: disable=unused-argument
     """
     When a problem is scored, submit a new BlockCompletion for that block.
+
+    Depending on the COMPLETION_SCORE_HANDLER_DISPATCH setting, the completion
+    is submitted right away ('inline'), or once the grading transaction
+    commits, either on a local pool of worker threads ('pool') or by the
+    callable named by COMPLETION_SCORE_HANDLER_EXECUTOR ('executor').
     """
     if not waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
         return
+    if kwargs.get('grader_response'):
+        return
+    score = {
+        'user_id': kwargs['user_id'],
+        'course_id': kwargs.get('course_id'),
+        'usage_id': kwargs['usage_id'],
+        'score_deleted': bool(kwargs.get('score_deleted')),
+    }
+
+    dispatch = getattr(settings, 'COMPLETION_SCORE_HANDLER_DISPATCH', DISPATCH_INLINE)
+    if dispatch == DISPATCH_POOL:
+        transaction.on_commit(lambda: _submit_to_pool(score))
+    elif dispatch == DISPATCH_EXECUTOR:
+        executor = get_executor()
+        transaction.on_commit(lambda: executor(submit_score_completion, retries=_retries(), **score))
+    else:
+        submit_score_completion(**score)
+
+
+def enrollment_status_changed(sender, user=None, course_id=None, **kwargs):  # pylint: disable=unused-argument
+    """
+    When a learner enrolls in or unenrolls from a course, forget whether they
+    were enrolled, so that the next completion batch looks it up again.
+    """
+    if user is not None and course_id is not None:
+        lookups.invalidate_enrollment(user.id, course_id)
+
+
+def submit_score_completion(user_id, course_id, usage_id, score_deleted=False, retries=0):
+    """
+    Submit the completion for a scored block.
+
+    Parameters:
+        * user_id (int): The id of the user whose score changed.
+        * course_id (str): The course key, used to fill in the run of old mongo usage keys.
+        * usage_id (str): The usage key of the scored block.
+        * score_deleted (bool): True if the score was deleted, which marks the block incomplete.
+        * retries (int): The number of times to retry the submission after a
+          DatabaseError.  Broken database connections are closed before each
+          retry, which waits COMPLETION_SCORE_HANDLER_RETRY_DELAY seconds,
+          doubled after every attempt.
+    """
     try:
-        block_key = UsageKey.from_string(kwargs['usage_id'])
+        block_key = keys.parse_usage_key(usage_id)
     except InvalidKeyError:
-        log.exception("Unable to parse XBlock usage_id for completion: %s", kwargs['usage_id'])
+        log.exception("Unable to parse XBlock usage_id for completion: %s", usage_id)
         return
 
     if block_key.context_key.is_course and block_key.context_key.run is None:
         # In the case of old mongo courses, the context_key cannot be derived
         # from the block key alone since it will be missing run info:
-        course_key_with_run = LearningContextKey.from_string(kwargs['course_id'])
-        block_key = block_key.replace(course_key=course_key_with_run)
+        block_key = keys.fill_in_run(block_key, keys.parse_context_key(course_id))
 
-    block_cls = XBlock.load_class(block_key.block_type)
-    if XBlockCompletionMode.get_mode(block_cls) != XBlockCompletionMode.COMPLETABLE:
-        return
-    if getattr(block_cls, 'has_custom_completion', False):
+    policy = get_block_policy(block_key.block_type)
+    if not policy.completable or policy.custom_completion:
         return
-    user = User.objects.get(id=kwargs['user_id'])
-    if kwargs.get('score_deleted'):
-        completion = 0.0
-    else:
-        completion = 1.0
-    if not kwargs.get('grader_response'):
-        BlockCompletion.objects.submit_completion(
-            user=user,
-            block_key=block_key,
-            completion=completion,
+
+    for attempt in range(retries + 1):
+        try:
+            user = User.objects.get(id=user_id)
+            write_buffer.submit_completion(
+                user=user,
+                block_key=block_key,
+                completion=0.0 if score_deleted else 1.0,
+            )
+            return
+        except DatabaseError:
+            if attempt == retries:
+                raise
+            log.warning(
+                "Retrying completion submission for %s:%s after a database error (attempt %d of %d).",
+                user_id, block_key, attempt + 1, retries,
+                exc_info=True,
+            )
+            close_old_connections()
+            time.sleep(getattr(settings, 'COMPLETION_SCORE_HANDLER_RETRY_DELAY', 0.1) * 2 ** attempt)
+
+
+def _submit_to_pool(score):
+    """
+    Queue the completion for a scored block on the handler's worker pool,
+    or submit it right away if the pool's queue is full.
+    """
+    if not get_handler_pool().submit(_submit_on_worker, score):
+        log.warning("Completion worker queue is full; submitting completion for %s in process.", score['usage_id'])
+        submit_score_completion(retries=_retries(), **score)
+
+
+def _submit_on_worker(score):
+    """
+    Submit the completion for a scored block from a worker thread.
+    """
+    close_old_connections()
+    try:
+        submit_score_completion(retries=_retries(), **score)
+    finally:
+        close_old_connections()
+
+
+def _retries():
+    return getattr(settings, 'COMPLETION_SCORE_HANDLER_RETRIES', 3)
+
+
+def get_executor():
+    """
+    Returns the callable named by COMPLETION_SCORE_HANDLER_EXECUTOR.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured: If the setting is
+            missing or cannot be imported.
+    """
+    path = getattr(settings, 'COMPLETION_SCORE_HANDLER_EXECUTOR', None)
+    if not path:
+        raise ImproperlyConfigured(
+            "COMPLETION_SCORE_HANDLER_EXECUTOR must be set when COMPLETION_SCORE_HANDLER_DISPATCH is 'executor'."
         )
+    try:
+        return import_string(path)
+    except ImportError as error:
+        raise ImproperlyConfigured(f"Unable to import COMPLETION_SCORE_HANDLER_EXECUTOR {path!r}.") from error
+
+
+def check_dispatch_settings():
+    """
+    Check the score handler settings when the app is loaded, so that a
+    missing or invalid executor fails at startup rather than in a grading
+    request.
+
+    Raises:
+        django.core.exceptions.ImproperlyConfigured
+    """
+    if getattr(settings, 'COMPLETION_SCORE_HANDLER_DISPATCH', DISPATCH_INLINE) == DISPATCH_EXECUTOR:
+        get_executor()
+
+
+def get_handler_pool():
+    """
+    Returns the worker pool used when COMPLETION_SCORE_HANDLER_DISPATCH is 'pool'.
+    """
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None:
+            _pool = BoundedWorkerPool(
+                'completion-scores',
+                workers=getattr(settings, 'COMPLETION_SCORE_HANDLER_WORKERS', 2),
+                max_queue_size=getattr(settings, 'COMPLETION_SCORE_HANDLER_QUEUE_SIZE', 1000),
+                overflow_policy=OVERFLOW_REJECT,
+            )
+        return _pool
@@ -0,0 +1,136 @@
+"""
+Interning caches for the opaque keys parsed by the completion app.
+
+The same usage keys and learning context keys are parsed over and over: on
+every completion submitted through the API or the score handler, and for
+every row read back from the database.  The parsed keys, and the usage keys
+with the run filled in for old mongo courses, are kept in bounded,
+thread-safe LRU caches of COMPLETION_KEY_CACHE_SIZE entries each (0 turns
+them off).  Keys are immutable, so every caller gets the same instance.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import CharField, ExpressionWrapper, F
+from opaque_keys.edx.keys import LearningContextKey, UsageKey
+
+
+class KeyCache:
+    """
+    A bounded, thread-safe LRU cache of the results of `load`.
+
+    `hits` and `misses` count the lookups that were and were not answered
+    from the cache.  Exceptions raised by `load`, such as InvalidKeyError,
+    are not cached.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, *args):
+        """
+        Returns load(*args), from the cache if possible.
+        """
+        with self._lock:
+            if args in self._entries:
+                self._entries.move_to_end(args)
+                self.hits += 1
+                return self._entries[args]
+            self.misses += 1
+
+        value = self._load(*args)
+        maxsize = getattr(settings, 'COMPLETION_KEY_CACHE_SIZE', 10000)
+        if maxsize > 0:
+            with self._lock:
+                # Another thread may have loaded the same key meanwhile; keep its instance.
+                value = self._entries.setdefault(args, value)
+                self._entries.move_to_end(args)
+                while len(self._entries) > maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """
+        Empty the cache and reset its counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Returns the number of hits, misses and cached entries.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+def _replace_course_key(block_key, context_key):
+    return block_key.replace(course_key=context_key)
+
+
+_usage_keys = KeyCache(UsageKey.from_string)
+_context_keys = KeyCache(LearningContextKey.from_string)
+_full_block_keys = KeyCache(_replace_course_key)
+
+
+def parse_usage_key(serialized):
+    """
+    Returns the UsageKey for a serialized usage key.
+
+    Raises:
+        opaque_keys.InvalidKeyError: If the key cannot be parsed.
+    """
+    return _usage_keys.get(serialized)
+
+
+def parse_context_key(serialized):
+    """
+    Returns the LearningContextKey for a serialized learning context key.
+
+    Raises:
+        opaque_keys.InvalidKeyError: If the key cannot be parsed.
+    """
+    return _context_keys.get(serialized)
+
+
+def fill_in_run(block_key, context_key):
+    """
+    Returns `block_key` with the run filled in from `context_key` if it is an
+    old mongo usage key without one, and `block_key` itself otherwise.
+    """
+    if block_key.context_key.is_course and block_key.run is None:
+        return _full_block_keys.get(block_key, context_key)
+    return block_key
+
+
+def serialized(field_name):
+    """
+    Returns an expression that selects a key field as the stored string, so
+    that values_list() does not parse it.
+    """
+    return ExpressionWrapper(F(field_name), output_field=CharField())
+
+
+def stats():
+    """
+    Returns the hits, misses and size of each key cache in this process.
+    """
+    return {
+        'usage_keys': _usage_keys.stats(),
+        'context_keys': _context_keys.stats(),
+        'full_block_keys': _full_block_keys.stats(),
+    }
+
+
+def clear():
+    """
+    Empty the key caches and reset their counters.
+    """
+    for cache in (_usage_keys, _context_keys, _full_block_keys):
+        cache.clear()
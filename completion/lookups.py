@@ -0,0 +1,147 @@
+"""
+Short-lived, per-process memoization of the user and enrollment lookups of
+completion batches.
+
+A learner's client may sync its progress many times a minute, and every
+batch looks up the id of its username and whether that user is enrolled in
+its course.  The ids of existing usernames and the active enrollments found
+are kept in a local memory cache for COMPLETION_LOOKUP_CACHE_TIMEOUT seconds
+(0, the default, turns it off).  Unknown usernames and missing enrollments
+are not cached, so a new user or enrollment is seen right away.
+
+The cache is not shared between processes.  The host platform can call
+invalidate_enrollment() and invalidate_usernames() when an enrollment ends or
+a user is renamed; edx-platform's enrollment signal is connected to
+invalidate_enrollment() by the handlers module, and saving a user calls
+clear_user_cache().  Other processes see the change when their entries
+expire.
+"""
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+
+try:
+    from common.djangoapps.student.models import CourseEnrollment
+except ImportError:
+    pass
+
+from .caching import hash_key
+
+MAX_ENTRIES = 10000
+
+_cache = LocMemCache('completion.lookups', {'OPTIONS': {'MAX_ENTRIES': MAX_ENTRIES}})
+
+
+def lookup_cache_timeout():
+    """
+    Returns the number of seconds user ids and enrollments are cached for.
+    """
+    return getattr(settings, 'COMPLETION_LOOKUP_CACHE_TIMEOUT', 0)
+
+
+def _user_id_key(username):
+    return f'completion.user_id.{hash_key(username)}'
+
+
+def _username_key(user_id):
+    return f'completion.username.{user_id}'
+
+
+def _enrollment_key(user_id, course_key):
+    return f'completion.enrolled.{user_id}.{hash_key(course_key)}'
+
+
+def get_user_ids(usernames, load):
+    """
+    Returns a dict mapping each of `usernames` that exists to its user id.
+
+    Parameters:
+        * usernames (set): The usernames to look up.
+        * load (callable): Takes the set of usernames that are not cached and
+          returns a dict mapping those that exist to their user ids.
+    """
+    timeout = lookup_cache_timeout()
+    if timeout <= 0:
+        return load(usernames)
+    cache_keys = {_user_id_key(username): username for username in usernames}
+    user_ids = {cache_keys[cache_key]: user_id for cache_key, user_id in _cache.get_many(cache_keys).items()}
+    missing = set(usernames) - set(user_ids)
+    if missing:
+        loaded = load(missing)
+        _cache.set_many({_user_id_key(username): user_id for username, user_id in loaded.items()}, timeout)
+        _cache.set_many({_username_key(user_id): username for username, user_id in loaded.items()}, timeout)
+        user_ids.update(loaded)
+    return user_ids
+
+
+def get_enrolled(course_user_ids, load):
+    """
+    Returns the (user_id, course_key) tuples of `course_user_ids` where the
+    user is enrolled in the course.
+
+    Parameters:
+        * course_user_ids (set): (user_id, CourseKey) tuples.
+        * load (callable): Takes the set of tuples that are not cached and
+          returns the set of those where the user is enrolled.
+    """
+    timeout = lookup_cache_timeout()
+    if timeout <= 0:
+        return load(course_user_ids)
+    cache_keys = {_enrollment_key(*course_user_id): course_user_id for course_user_id in course_user_ids}
+    enrolled = {cache_keys[cache_key] for cache_key in _cache.get_many(cache_keys)}
+    missing = set(course_user_ids) - enrolled
+    if missing:
+        loaded = load(missing)
+        _cache.set_many({_enrollment_key(*course_user_id): True for course_user_id in loaded}, timeout)
+        enrolled |= loaded
+    return enrolled
+
+
+def load_enrolled(course_user_ids):
+    """
+    Returns the (user_id, course_key) tuples of `course_user_ids` where the
+    user is actively enrolled in the course, with a single query.
+
+    This is what CourseEnrollment.is_enrolled() checks for one user and
+    course: that an enrollment record exists and is active.
+    """
+    enrollments = CourseEnrollment.objects.filter(
+        user_id__in={user_id for user_id, _ in course_user_ids},
+        course_id__in={course_key for _, course_key in course_user_ids},
+        is_active=True,
+    ).values_list('user_id', 'course_id')
+    return set(enrollments) & set(course_user_ids)
+
+
+def invalidate_usernames(*usernames):
+    """
+    Forget the cached user ids of `usernames` in this process.
+    """
+    _cache.delete_many([_user_id_key(username) for username in usernames])
+
+
+def clear_user_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Forget the cached user ids of the username of a user when it is saved, and
+    of its previous username if the user was renamed.
+    """
+    usernames = [instance.username]
+    previous = _cache.get(_username_key(instance.pk))
+    if previous is not None:
+        usernames.append(previous)
+    invalidate_usernames(*usernames)
+    _cache.delete(_username_key(instance.pk))
+
+
+def invalidate_enrollment(user_id, course_key):
+    """
+    Forget whether the user is enrolled in the course in this process.
+    """
+    _cache.delete(_enrollment_key(user_id, course_key))
+
+
+def clear():
+    """
+    Forget every cached user id and enrollment in this process.
+    """
+    _cache.clear()
@@ -0,0 +1,64 @@
+"""
+Backfill the UserContextCompletionSummary records from existing block completions.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import LearningContextKey
+
+from completion.models import BlockCompletion, UserContextCompletionSummary
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Recompute the completion summaries of every user, or of the given users or
+    learning context, from their block completions.
+
+    Example:
+
+        ./manage.py lms backfill_completion_summaries --context-key course-v1:edX+DemoX+Demo_Course
+    """
+    help = "Recompute the per-user, per-learning-context completion summaries from block completions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id', type=int, action='append', dest='user_ids',
+            help="Only backfill the summaries of this user.  May be repeated.",
+        )
+        parser.add_argument('--context-key', help="Only backfill the summaries of this learning context.")
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="The number of users backfilled per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        context_key = None
+        if options['context_key']:
+            try:
+                context_key = LearningContextKey.from_string(options['context_key'])
+            except InvalidKeyError as error:
+                raise CommandError(f"Invalid learning context key: {options['context_key']}") from error
+
+        user_ids = options['user_ids']
+        if user_ids is None:
+            completions = BlockCompletion.objects.all()
+            summaries = UserContextCompletionSummary.objects.all()
+            if context_key is not None:
+                completions = completions.filter(context_key=context_key)
+                summaries = summaries.filter(context_key=context_key)
+            user_ids = list(completions.order_by('user_id').values_list('user_id', flat=True).distinct())
+            # Users without any completions left should not keep their old summaries.
+            summaries.exclude(user_id__in=completions.values('user_id')).delete()
+
+        batch_size = options['batch_size']
+        total = 0
+        for start in range(0, len(user_ids), batch_size):
+            total += UserContextCompletionSummary.objects.rebuild(
+                user_ids=user_ids[start:start + batch_size], context_key=context_key,
+            )
+        log.info("Wrote %d completion summaries for %d users.", total, len(user_ids))
+        self.stdout.write(f"Wrote {total} completion summaries for {len(user_ids)} users.")
@@ -0,0 +1,68 @@
+"""
+Export the completions of a learning context as NDJSON or CSV.
+"""
+
+from datetime import timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import LearningContextKey
+
+from completion.export import iter_context_completions, iter_csv, iter_ndjson
+
+
+def _parse_datetime(value):
+    """
+    Parse an ISO 8601 datetime, assuming UTC if it has no time zone.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f"Invalid datetime: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class Command(BaseCommand):
+    """
+    Stream every completion of a learning context to standard output or a file.
+
+    Example:
+
+        ./manage.py lms export_completions course-v1:edX+DemoX+Demo_Course --format csv --block-type problem
+    """
+    help = "Export the completions of a learning context as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('context_key', help="The learning context to export.")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson', help="The output format.")
+        parser.add_argument(
+            '--block-type', action='append', dest='block_types',
+            help="Only export completions of this block type.  May be repeated.",
+        )
+        parser.add_argument('--modified-after', help="Only export completions modified at or after this time.")
+        parser.add_argument('--modified-before', help="Only export completions modified before this time.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="The number of rows read per query.")
+        parser.add_argument('--output', help="Write to this file instead of standard output.")
+
+    def handle(self, *args, **options):
+        try:
+            context_key = LearningContextKey.from_string(options['context_key'])
+        except InvalidKeyError as error:
+            raise CommandError(f"Invalid learning context key: {options['context_key']}") from error
+
+        rows = iter_context_completions(
+            context_key,
+            block_types=options['block_types'],
+            modified_after=_parse_datetime(options['modified_after']) if options['modified_after'] else None,
+            modified_before=_parse_datetime(options['modified_before']) if options['modified_before'] else None,
+            batch_size=options['batch_size'],
+        )
+        lines = iter_csv(rows) if options['format'] == 'csv' else iter_ndjson(rows)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,63 @@
+"""
+Rebuild the AggregateCompletion records of a learning context.
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import LearningContextKey
+
+from completion.aggregation import clear_course_structure
+from completion.models import AggregateCompletion, BlockCompletion
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Recompute the aggregate completions of every user, or of the given users,
+    in a learning context from their block completions.
+
+    Example:
+
+        ./manage.py lms rebuild_completion_aggregates course-v1:edX+DemoX+Demo_Course --batch-size 500
+    """
+    help = "Rebuild the aggregate completions of a learning context from its block completions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('context_key', help="The learning context to rebuild.")
+        parser.add_argument(
+            '--user-id', type=int, action='append', dest='user_ids',
+            help="Only rebuild the aggregates of this user.  May be repeated.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="The number of users rebuilt per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            context_key = LearningContextKey.from_string(options['context_key'])
+        except InvalidKeyError as error:
+            raise CommandError(f"Invalid learning context key: {options['context_key']}") from error
+
+        user_ids = options['user_ids']
+        if user_ids is None:
+            completions = BlockCompletion.objects.filter(context_key=context_key)
+            user_ids = list(completions.order_by('user_id').values_list('user_id', flat=True).distinct())
+            # Users without any completions left should not keep their old aggregates.
+            AggregateCompletion.objects.filter(context_key=context_key).exclude(
+                user_id__in=completions.values('user_id')
+            ).delete()
+
+        clear_course_structure(context_key)
+        batch_size = options['batch_size']
+        total = 0
+        for start in range(0, len(user_ids), batch_size):
+            written = AggregateCompletion.objects.rebuild(context_key, user_ids=user_ids[start:start + batch_size])
+            if written is None:
+                raise CommandError(f"The structure of {context_key} is not available.")
+            total += written
+        log.info("Wrote %d aggregate completions for %d users in %s.", total, len(user_ids), context_key)
+        self.stdout.write(f"Wrote {total} aggregate completions for {len(user_ids)} users in {context_key}.")
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:24
+
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import opaque_keys.edx.django.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('completion', '0004_rename_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AggregateCompletion',
+            fields=[
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('context_key', opaque_keys.edx.django.models.LearningContextKeyField(db_column='course_key', max_length=255)),
+                ('aggregation_name', models.CharField(max_length=64)),
+                ('block_key', opaque_keys.edx.django.models.UsageKeyField(max_length=255)),
+                ('earned', models.FloatField()),
+                ('possible', models.FloatField()),
+                ('percent', models.FloatField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'context_key', 'block_key')},
+            },
+        ),
+    ]
@@ -3,20 +3,26 @@ Completion tracking and aggregation models.
 """
 
 import logging
+from collections import defaultdict
+from contextlib import nullcontext
+from functools import lru_cache
 
+from asgiref.sync import sync_to_async
 from opaque_keys.edx.django.models import LearningContextKeyField, UsageKeyField
+from opaque_keys.edx.keys import LearningContextKey
 
+from django.conf import settings
 from django.contrib import auth
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError, models, transaction
-from django.db.models import BigAutoField
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Avg, BigAutoField, Count, F, OuterRef, Q, Subquery, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
 from model_utils.models import TimeStampedModel
 
-from eventtracking import tracker
-
-from . import waffle
+from . import aggregation, caching, keys, tracking, waffle
 
 log = logging.getLogger(__name__)
 User = auth.get_user_model()
@@ -33,6 +39,45 @@ def validate_percent(value):
         raise ValidationError(_('{value} must be between 0.0 and 1.0').format(value=value))
 
 
+def completion_summaries_enabled():
+    """
+    Returns True if UserContextCompletionSummary records should be maintained.
+    """
+    return getattr(settings, 'COMPLETION_SUMMARIES_ENABLED', False)
+
+
+def completion_summary_reads_enabled():
+    """
+    Returns True if the latest completions should be read from the
+    UserContextCompletionSummary records.
+
+    This is a separate setting so that the summaries can be backfilled
+    while they are maintained, before they are relied on.
+    """
+    return completion_summaries_enabled() and getattr(settings, 'COMPLETION_SUMMARY_READS_ENABLED', False)
+
+
+@lru_cache(maxsize=None)
+def course_context_filter():
+    """
+    Returns a Q object that matches the context_key of course learning contexts.
+
+    Serialized course keys start with the namespace of their key type (e.g.
+    "course-v1:"), except for deprecated "org/course/run" keys, which have no
+    namespace at all, so courses can be told apart from libraries and other
+    learning contexts without deserializing their keys.
+    """
+    namespaces = sorted({
+        # pylint: disable=protected-access
+        extension.plugin.CANONICAL_NAMESPACE for extension in LearningContextKey._drivers()
+        if extension.plugin.is_course
+    })
+    course_filter = ~Q(context_key__contains=':')
+    for namespace in namespaces:
+        course_filter |= Q(context_key__startswith=f'{namespace}:')
+    return course_filter
+
+
 class BlockCompletionManager(models.Manager):
     """
     Custom manager for BlockCompletion model.
@@ -78,7 +123,71 @@ class BlockCompletionManager(models.Manager):
                 IntegrityError and OperationalError are relatively common
                 subclasses.
         """
+        self._validate_block_key(block_key)
+
+        if waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
+            # Aggregates and summaries are updated by the change in value, so when
+            # they are enabled the previous value is read with the row locked, and
+            # they are written in the same transaction as the completion.
+            derived = aggregation.aggregates_enabled() or completion_summaries_enabled()
+            with transaction.atomic() if derived else nullcontext():
+                if getattr(settings, 'COMPLETION_UPSERT_ENABLED', False) and self._supports_upsert():
+                    validate_percent(completion)
+                    previous = None
+                    if derived:
+                        previous = self.select_for_update().filter(
+                            user=user, context_key=block_key.context_key, block_key=block_key,
+                        ).values_list('completion', flat=True).first()
+                    obj, is_new, changed = self._upsert_completion(user, block_key, completion)
+                else:
+                    obj, is_new = self._get_or_create_completion(user, block_key, completion, lock=derived)
+
+                    previous = None if is_new else obj.completion
+                    changed = is_new or obj.completion != completion
+                    if not is_new and changed:
+                        obj.completion = completion
+                        obj.full_clean()
+                        obj.save(update_fields={'completion', 'modified'})
 
+                if changed:
+                    caching.invalidate_context_completions(
+                        [(obj.user_id, block_key.context_key)], using=router.db_for_write(self.model)
+                    )
+                    if derived and previous is None and not is_new:
+                        # The record was created by another process after the
+                        # locking read, so the change in value is not known.
+                        if aggregation.aggregates_enabled():
+                            AggregateCompletion.objects.rebuild(block_key.context_key, user_ids=[obj.user_id])
+                        if completion_summaries_enabled():
+                            UserContextCompletionSummary.objects.rebuild(
+                                user_ids=[obj.user_id], context_key=block_key.context_key
+                            )
+                    else:
+                        AggregateCompletion.objects.apply_deltas(
+                            obj.user_id, block_key.context_key, {block_key: completion - (previous or 0.0)}
+                        )
+                        UserContextCompletionSummary.objects.apply_changes(
+                            obj.user_id, block_key.context_key, [(obj, previous)]
+                        )
+            self._emit_tracking_log(obj, changed)
+        else:
+            # If the feature is not enabled, this method should not be called.
+            # Error out with a RuntimeError.
+            raise RuntimeError(
+                "BlockCompletion.objects.submit_completion should not be \
+                called when the feature is disabled."
+            )
+
+        return obj, is_new
+
+    @staticmethod
+    def _validate_block_key(block_key):
+        """
+        Raise a ValueError unless block_key is a UsageKey that can be stored as-is.
+
+        Return Value:
+            (LearningContextKey, str): The context key and block type of the block.
+        """
         try:
             context_key = block_key.context_key
             block_type = block_key.block_type
@@ -92,56 +201,286 @@ class BlockCompletionManager(models.Manager):
                 "submit_completion():\n"
                 "block_key = block_key.replace(course_key=modulestore().fill_in_run(block_key.course_key))"
             )
+        return context_key, block_type
 
-        if waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
-            try:
-                with transaction.atomic():
-                    obj, is_new = self.get_or_create(  # pylint: disable=unpacking-non-sequence
-                        user=user,
-                        context_key=context_key,
-                        block_key=block_key,
-                        defaults={
-                            'completion': completion,
-                            'block_type': block_type,
-                        },
-                    )
-            except IntegrityError:
-                # The completion was created concurrently by another process
-                log.info(
-                    "An IntegrityError was raised when trying to create a BlockCompletion for %s:%s:%s.  "
-                    "Falling back to get().",
-                    user,
-                    context_key,
-                    block_key,
-                )
-                obj = self.get(
-                    user=user,
-                    context_key=context_key,
+    def _get_or_create_completion(self, user, block_key, completion, lock=False):
+        """
+        Get the completion record for (user, block_key), creating it with the
+        given completion value if it does not exist yet.
+
+        `user` may be a User or a user id.  If `lock` is True, an existing
+        record is read with SELECT ... FOR UPDATE, which must be done inside a
+        transaction.
+
+        Return Value:
+            (BlockCompletion, bool): The record, and whether it was created.
+        """
+        user_filter = {'user': user} if isinstance(user, User) else {'user_id': user}
+        queryset = self.select_for_update() if lock else self
+        try:
+            with transaction.atomic():
+                obj, is_new = queryset.get_or_create(  # pylint: disable=unpacking-non-sequence
+                    context_key=block_key.context_key,
                     block_key=block_key,
+                    defaults={
+                        'completion': completion,
+                        'block_type': block_key.block_type,
+                    },
+                    **user_filter
                 )
-                is_new = False
+        except IntegrityError:
+            # The completion was created concurrently by another process
+            log.info(
+                "An IntegrityError was raised when trying to create a BlockCompletion for %s:%s:%s.  "
+                "Falling back to get().",
+                user,
+                block_key.context_key,
+                block_key,
+            )
+            obj = queryset.get(
+                context_key=block_key.context_key,
+                block_key=block_key,
+                **user_filter
+            )
+            is_new = False
+        return obj, is_new
 
-            if not is_new and obj.completion != completion:
-                obj.completion = completion
-                obj.full_clean()
-                obj.save(update_fields={'completion', 'modified'})
+    def _supports_upsert(self):
+        """
+        Whether the database backend can insert-or-update a row in a single statement.
+        """
+        connection = connections[router.db_for_write(self.model)]
+        return connection.features.supports_update_conflicts_with_target or connection.vendor == 'mysql'
 
-            obj.emit_tracking_log()
+    def _upsert_completion(self, user, block_key, completion):
+        """
+        Create or update the completion record for (user, block_key) with a
+        single INSERT ... ON CONFLICT (SQLite, PostgreSQL) or INSERT ... ON
+        DUPLICATE KEY UPDATE (MySQL) statement.
+
+        The unique key (context_key, block_key, user) is the conflict target,
+        so concurrent submissions never raise an IntegrityError.  Existing
+        rows are only rewritten when the completion value changes.  The record
+        is read back afterwards; it is new if its created timestamp is the one
+        written by this call.
+
+        Return Value:
+            (BlockCompletion, bool, bool): The record, whether it was created,
+            and whether it was created or changed.
+        """
+        alias = router.db_for_write(self.model)
+        connection = connections[alias]
+        meta = self.model._meta
+        quote_name = connection.ops.quote_name
+        user_id = getattr(user, 'id', user)
+        now = timezone.now()
+        values = {
+            'created': now,
+            'modified': now,
+            'user': user_id,
+            'context_key': block_key.context_key,
+            'block_key': block_key,
+            'block_type': block_key.block_type,
+            'completion': completion,
+        }
+        fields = [meta.get_field(name) for name in values]
+        columns = {field.name: quote_name(field.column) for field in fields}
+        table = quote_name(meta.db_table)
+        insert = 'INSERT INTO {table} ({columns}) VALUES ({placeholders})'.format(
+            table=table,
+            columns=', '.join(columns.values()),
+            placeholders=', '.join(['%s'] * len(fields)),
+        )
+        if connection.vendor == 'mysql':
+            # Assignments are evaluated left to right, so modified is compared
+            # against the old completion value before it is overwritten.
+            sql = (
+                '{insert} ON DUPLICATE KEY UPDATE '
+                '{modified} = IF({completion} <> VALUES({completion}), VALUES({modified}), {modified}), '
+                '{completion} = VALUES({completion})'
+            ).format(insert=insert, **columns)
         else:
-            # If the feature is not enabled, this method should not be called.
-            # Error out with a RuntimeError.
-            raise RuntimeError(
-                "BlockCompletion.objects.submit_completion should not be \
-                called when the feature is disabled."
+            sql = (
+                '{insert} ON CONFLICT ({conflict}) DO UPDATE SET '
+                '{completion} = excluded.{completion}, {modified} = excluded.{modified} '
+                'WHERE {table}.{completion} <> excluded.{completion}'
+            ).format(
+                insert=insert,
+                table=table,
+                conflict=', '.join(columns[name] for name in ('context_key', 'block_key', 'user')),
+                **columns
             )
+        params = [field.get_db_prep_save(values[field.name], connection) for field in fields]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
 
-        return obj, is_new
+        obj = self.using(alias).get(user_id=user_id, context_key=block_key.context_key, block_key=block_key)
+        return obj, obj.created == now, obj.modified == now
+
+    def _bulk_submit_completions(self, submissions, contexts=None):
+        """
+        Create or update the completion records for many submissions at once.
+
+        Existing records are fetched with a single query, missing records are
+        inserted with a single bulk_create, and records whose value changed are
+        written back with a single bulk_update, so the number of statements
+        does not depend on the number of submissions.  When the same
+        (user, block) is submitted more than once, the last value wins.
+
+        Parameters:
+            * submissions: An iterable of (user_id, UsageKey, completion)
+              tuples.  Block keys must already have their run filled in.
+            * contexts: An optional dict mapping (user_id, UsageKey) to the
+              tracker context, from tracking.capture_context(), to emit the
+              tracking log of that submission in.
+
+        Return Value:
+            A list of (BlockCompletion, bool, bool) tuples, one per distinct
+            (user, block) submitted, in submission order.  The booleans
+            indicate whether the record was newly created by this call, and
+            whether it was created or changed.
+
+        Raises:
+            The same exceptions as submit_completion.  Every submission is
+            validated before anything is written.
+        """
+        pending = {}
+        for user_id, block_key, completion in submissions:
+            self._validate_block_key(block_key)
+            validate_percent(completion)
+            pending[(user_id, block_key)] = completion
+        if not pending:
+            return []
+
+        # Aggregates and summaries are updated by the change in value, so the
+        # existing records are read with their rows locked, in the same
+        # transaction as the writes.
+        derived = aggregation.aggregates_enabled() or completion_summaries_enabled()
+        queryset = self.select_for_update() if derived else self.all()
+        with transaction.atomic():
+            existing = {
+                (obj.user_id, obj.full_block_key): obj
+                for obj in queryset.filter(
+                    user_id__in={user_id for user_id, _ in pending},
+                    context_key__in={block_key.context_key for _, block_key in pending},
+                    block_key__in={block_key for _, block_key in pending},
+                )
+            }
+
+            now = timezone.now()
+            results = {}
+            previous = {}
+            to_create = []
+            to_update = []
+            for (user_id, block_key), completion in pending.items():
+                obj = existing.get((user_id, block_key))
+                previous[(user_id, block_key)] = 0.0 if obj is None else obj.completion
+                if obj is None:
+                    obj = self.model(
+                        user_id=user_id,
+                        context_key=block_key.context_key,
+                        block_key=block_key,
+                        block_type=block_key.block_type,
+                        completion=completion,
+                    )
+                    to_create.append(obj)
+                    results[(user_id, block_key)] = (obj, True)
+                else:
+                    if obj.completion != completion:
+                        obj.completion = completion
+                        obj.modified = now
+                        to_update.append(obj)
+                    results[(user_id, block_key)] = (obj, False)
+
+            if to_create:
+                try:
+                    with transaction.atomic():
+                        self.bulk_create(to_create)
+                except IntegrityError:
+                    # Some of the completions were created concurrently by another process
+                    log.info(
+                        "An IntegrityError was raised when trying to bulk create %d BlockCompletions.  "
+                        "Falling back to get_or_create().",
+                        len(to_create),
+                    )
+                    for new_obj in to_create:
+                        key = (new_obj.user_id, new_obj.block_key)
+                        obj, is_new = self._get_or_create_completion(new_obj.user_id, new_obj.block_key,
+                                                                     new_obj.completion, lock=derived)
+                        if not is_new:
+                            previous[key] = obj.completion
+                        if not is_new and obj.completion != new_obj.completion:
+                            obj.completion = new_obj.completion
+                            obj.modified = now
+                            to_update.append(obj)
+                        results[key] = (obj, is_new)
+                else:
+                    self._fill_in_primary_keys(to_create)
+            if to_update:
+                self.bulk_update(to_update, ['completion', 'modified'])
+
+            updated = {id(obj) for obj in to_update}
+            submitted = [(obj, is_new, is_new or id(obj) in updated) for obj, is_new in results.values()]
+            if aggregation.aggregates_enabled():
+                deltas = defaultdict(dict)
+                for (user_id, block_key), (obj, _) in results.items():
+                    if obj.completion != previous[(user_id, block_key)]:
+                        deltas[(user_id, block_key.context_key)][block_key] = (
+                            obj.completion - previous[(user_id, block_key)]
+                        )
+                for (user_id, context_key), context_deltas in deltas.items():
+                    AggregateCompletion.objects.apply_deltas(user_id, context_key, context_deltas)
+            if completion_summaries_enabled():
+                changes = defaultdict(list)
+                for (user_id, block_key), (obj, is_new) in results.items():
+                    if is_new or id(obj) in updated:
+                        changes[(user_id, block_key.context_key)].append((obj, previous[(user_id, block_key)]))
+                for (user_id, context_key), context_changes in changes.items():
+                    UserContextCompletionSummary.objects.apply_changes(user_id, context_key, context_changes)
+
+        caching.invalidate_context_completions(
+            {(obj.user_id, obj.context_key) for obj, _, changed in submitted if changed},
+            using=router.db_for_write(self.model),
+        )
+        contexts = contexts or {}
+        for obj, _, changed in submitted:
+            self._emit_tracking_log(obj, changed, contexts.get((obj.user_id, obj.full_block_key)))
+        return submitted
+
+    @staticmethod
+    def _emit_tracking_log(obj, changed, context=None):
+        """
+        Emit the tracking log for a submitted completion, unless its value did
+        not change and COMPLETION_SUPPRESS_UNCHANGED_EVENTS is set.
+        """
+        if changed or not getattr(settings, 'COMPLETION_SUPPRESS_UNCHANGED_EVENTS', False):
+            obj.emit_tracking_log(context)
+
+    def _fill_in_primary_keys(self, objs):
+        """
+        Set the primary keys of freshly bulk-created records on database
+        backends that cannot return them from the insert (e.g. MySQL).
+        """
+        missing = {(obj.user_id, obj.block_key): obj for obj in objs if obj.pk is None}
+        if not missing:
+            return
+        for obj in self.filter(
+            user_id__in={user_id for user_id, _ in missing},
+            context_key__in={block_key.context_key for _, block_key in missing},
+            block_key__in={block_key for _, block_key in missing},
+        ).only('id', 'user_id', 'context_key', 'block_key'):
+            key = (obj.user_id, obj.full_block_key)
+            if key in missing:
+                missing[key].pk = obj.pk
 
-    @transaction.atomic()
     def submit_batch_completion(self, user, blocks):
         """
         Performs a batch insertion of completion objects.
 
+        Existing records are fetched, created and updated in bulk within a
+        single transaction, so the number of database queries does not grow
+        with the size of the batch.
+
         Parameters:
             * user (django.contrib.auth.models.User): The user for whom the
               completions are being submitted.
@@ -166,12 +505,111 @@ class BlockCompletionManager(models.Manager):
                 If there was a problem getting, creating, or updating the
                 BlockCompletion record in the database.
         """
+        if not waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
+            raise RuntimeError(
+                "BlockCompletion.objects.submit_batch_completion should not be called when the feature is disabled."
+            )
         block_completions = {}
-        for block, completion in blocks:
-            (block_completion, is_new) = self.submit_completion(user, block, completion)
+        for block_completion, is_new, _ in self._bulk_submit_completions(
+            (user.id, block, completion) for block, completion in blocks
+        ):
+            block_completion.user = user
             block_completions[block_completion] = is_new
         return block_completions
 
+    def submit_group_completion(self, user_ids, block_key, completion, chunk_size=None, summary=False):
+        """
+        Submit the same completion for one block and many users.
+
+        Users are processed in chunks of `chunk_size` (by default the
+        COMPLETION_GROUP_CHUNK_SIZE setting), each written in bulk in its own
+        transaction.  Users are referred to by id only; no User rows are loaded.
+
+        Parameters:
+            * user_ids ([int]): The ids of the users who completed the block.
+            * block_key (opaque_keys.edx.keys.UsageKey): The block, with its
+              run filled in for old mongo courses.
+            * completion (float in range [0.0, 1.0]): The completion value.
+            * chunk_size (int): The number of users written per transaction.
+            * summary (bool): Return counts instead of model instances.
+
+        Return Value:
+            A list of (BlockCompletion, bool) tuples, one per user, where the
+            boolean indicates whether the record was newly created by this call.
+
+            If `summary` is True, a dict with the number of records that were
+            'created', 'updated' and left 'unchanged' instead.
+
+        Raises:
+            The same exceptions as submit_completion.
+        """
+        if not waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
+            raise RuntimeError(
+                "BlockCompletion.objects.submit_group_completion should not be called when the feature is disabled."
+            )
+        self._validate_block_key(block_key)
+        validate_percent(completion)
+        chunk_size = chunk_size or getattr(settings, 'COMPLETION_GROUP_CHUNK_SIZE', 500)
+        user_ids = list(user_ids)
+
+        submitted = []
+        counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+        for start in range(0, len(user_ids), chunk_size):
+            for obj, is_new, changed in self._bulk_submit_completions(
+                (user_id, block_key, completion) for user_id in user_ids[start:start + chunk_size]
+            ):
+                if summary:
+                    counts['created' if is_new else 'updated' if changed else 'unchanged'] += 1
+                else:
+                    submitted.append((obj, is_new))
+        return counts if summary else submitted
+
+    def submit_bulk_completion(self, submissions):
+        """
+        Submit completions for many users and blocks at once.
+
+        Every submission is written in bulk in a single transaction.  Users
+        are referred to by id only; no User rows are loaded.
+
+        Parameters:
+            * submissions: An iterable of (user_id, UsageKey, completion)
+              tuples.  Block keys must have their run filled in for old mongo
+              courses.
+
+        Return Value:
+            A list of (BlockCompletion, bool) tuples, one per distinct (user,
+            block) submitted, where the boolean indicates whether the record
+            was newly created by this call.
+
+        Raises:
+            The same exceptions as submit_completion.  Every submission is
+            validated before anything is written.
+        """
+        if not waffle.ENABLE_COMPLETION_TRACKING_SWITCH.is_enabled():
+            raise RuntimeError(
+                "BlockCompletion.objects.submit_bulk_completion should not be called when the feature is disabled."
+            )
+        return [(obj, is_new) for obj, is_new, _ in self._bulk_submit_completions(submissions)]
+
+    async def asubmit_completion(self, user, block_key, completion):
+        """
+        Async version of submit_completion().
+
+        Django does not support transactions in async code, so the whole
+        submission runs in one thread-sensitive sync_to_async call rather
+        than one per query.
+        """
+        return await sync_to_async(self.submit_completion)(user, block_key, completion)
+
+    async def asubmit_batch_completion(self, user, blocks):
+        """
+        Async version of submit_batch_completion().
+
+        Like asubmit_completion(), the batch runs in a single sync_to_async call
+        so that it is still written in one transaction.
+        """
+        return await sync_to_async(self.submit_batch_completion)(user, blocks)
+
     @transaction.atomic()
     def clear_learning_context_completion(self, user, context_key):
         """
@@ -186,6 +624,12 @@ class BlockCompletionManager(models.Manager):
         Return Value: (int) The number of models deleted
         """
         total, _ = BlockCompletion.user_learning_context_completion_queryset(user, context_key).delete()
+        if aggregation.aggregates_enabled():
+            AggregateCompletion.objects.filter(user=user, context_key=context_key).delete()
+        if completion_summaries_enabled():
+            UserContextCompletionSummary.objects.filter(user=user, context_key=context_key).delete()
+        if total:
+            caching.invalidate_context_completions([(user.id, context_key)], using=router.db_for_write(self.model))
         return total
 
 
@@ -227,10 +671,7 @@ class BlockCompletion(TimeStampedModel, models.Model):
         This is only necessary for block keys from old mongo courses, which
         didn't include the run information in the block usage key.
         """
-        if self.block_key.context_key.is_course and self.block_key.run is None:  # pylint: disable=no-member
-            # pylint: disable=unexpected-keyword-arg, no-value-for-parameter
-            return self.block_key.replace(course_key=self.context_key)
-        return self.block_key
+        return keys.fill_in_run(self.block_key, self.context_key)
 
     @classmethod
     def get_learning_context_completions(cls, user, context_key):
@@ -238,11 +679,91 @@ class BlockCompletion(TimeStampedModel, models.Model):
         Returns a dictionary mapping BlockKeys to completion values for all
         BlockCompletion records for the given user and learning context key.
 
+        The result is read through the completion cache when
+        COMPLETION_CACHE_ENABLED is set.
+
         Return value:
             dict[BlockKey] = float
         """
+        def load():
+            user_completions = cls.user_learning_context_completion_queryset(user, context_key)
+            return cls.completion_by_block_key_values(
+                context_key, user_completions.values_list(keys.serialized('block_key'), 'completion')
+            )
+
+        if caching.completion_cache_enabled():
+            return caching.get_context_completions(getattr(user, 'id', user), context_key, load)
+        return load()
+
+    @classmethod
+    async def aget_learning_context_completions(cls, user, context_key):
+        """
+        Async version of get_learning_context_completions().
+        """
+        if caching.completion_cache_enabled():
+            return await sync_to_async(cls.get_learning_context_completions)(user, context_key)
         user_completions = cls.user_learning_context_completion_queryset(user, context_key)
-        return cls.completion_by_block_key(user_completions)
+        return cls.completion_by_block_key_values(
+            context_key,
+            [row async for row in user_completions.values_list(keys.serialized('block_key'), 'completion')],
+        )
+
+    @classmethod
+    def get_learning_context_stats(cls, context_key, threshold=1.0):
+        """
+        Returns completion statistics of every block in a learning context,
+        and of every block type, over the learners who have a completion
+        record for the block.
+
+        The statistics are computed by a single query grouped by block type
+        and block, which reads the (context_key, block_type, user) index in
+        order.  They are cached for COMPLETION_STATS_CACHE_TIMEOUT seconds, and
+        are not invalidated by writes to the learning context.
+
+        Parameters:
+            * context_key (LearningContextKey): The learning context.
+            * threshold (float): The completion at or above which a block
+              counts as completed.
+
+        Return value:
+            {
+                'blocks': {BlockKey: {'block_type': str, 'learners': int, 'completed': int, 'average': float}},
+                'block_types': {str: {'blocks': int, 'learners': int, 'completed': int, 'average': float}},
+            }
+        """
+        def load():
+            rows = cls.objects.filter(context_key=context_key).values(
+                'block_type', serialized_block_key=keys.serialized('block_key'),
+            ).annotate(
+                learners=Count('id'),
+                completed=Count('id', filter=Q(completion__gte=threshold)),
+                average=Avg('completion'),
+            ).order_by('block_type', 'serialized_block_key')
+
+            blocks = {}
+            block_types = {}
+            for row in rows:
+                block_key = keys.fill_in_run(keys.parse_usage_key(row['serialized_block_key']), context_key)
+                blocks[block_key] = {
+                    'block_type': row['block_type'],
+                    'learners': row['learners'],
+                    'completed': row['completed'],
+                    'average': row['average'],
+                }
+                totals = block_types.setdefault(
+                    row['block_type'], {'blocks': 0, 'learners': 0, 'completed': 0, 'average': 0.0}
+                )
+                totals['blocks'] += 1
+                totals['learners'] += row['learners']
+                totals['completed'] += row['completed']
+                totals['average'] += row['average'] * row['learners']
+            for totals in block_types.values():
+                totals['average'] /= totals['learners']
+            return {'blocks': blocks, 'block_types': block_types}
+
+        if caching.stats_cache_enabled():
+            return caching.get_context_stats(context_key, threshold, load)
+        return load()
 
     @classmethod
     def user_learning_context_completion_queryset(cls, user, context_key):
@@ -252,62 +773,53 @@ class BlockCompletion(TimeStampedModel, models.Model):
         return cls.objects.filter(user=user, context_key=context_key)
 
     @classmethod
-    def latest_blocks_completed_all_courses(cls, user):
+    def latest_blocks_completed_all_courses(cls, user, limit=None, ordering='-modified'):
         """
         Returns a dictionary mapping course_keys to a tuple containing
         the block_key and modified time of the most recently modified
         completion for the course.
 
         This only returns results for courses and not other learning context
-        types.
+        types; other contexts are filtered out by key prefix in the query.
+        When several completions of a course share the latest modified time,
+        the most recently created one is returned, and courses with the same
+        modified time are ordered by course key.
+
+        Parameters:
+            * user: The user, or the id of the user.
+            * limit (int): Only return this many courses.
+            * ordering (str): 'modified' or '-modified' (the default); the
+              order of the returned courses, and which ones are kept when
+              `limit` is given.
 
         Return value:
-            {course_key: (modified_date, block_key)}
-        """
-
-        # Per the Django docs, dictionary params are not supported with the SQLite backend;
-        # with this backend, you must pass parameters as a list. We use SQLite for unit tests,
-        # so the same parameter is included twice in the parameter list below, rather than
-        # including it in a dictionary once.
-        latest_completions_by_course = cls.objects.raw(
-            '''
-            SELECT
-                cbc.id AS id,
-                cbc.course_key AS course_key,
-                cbc.block_key AS block_key,
-                cbc.modified AS modified
-            FROM
-                completion_blockcompletion cbc
-            JOIN (
-                SELECT
-                     course_key,
-                     MAX(modified) AS modified
-                FROM
-                     completion_blockcompletion
-                WHERE
-                     user_id = %s
-                GROUP BY
-                     course_key
-            ) latest
-            ON
-                cbc.course_key = latest.course_key AND
-                cbc.modified = latest.modified
-            WHERE
-                user_id = %s
-            ;
-            ''',
-            [user.id, user.id]
-        )
-        try:
-            return {
-                completion.context_key: (completion.modified, completion.block_key)
-                for completion in latest_completions_by_course
-                if completion.context_key.is_course
-            }
-        except KeyError:
-            # Iteration of the queryset above will always fail
-            # with a KeyError if the queryset is empty
-            return {}
+            {course_key: (modified_date, block_key)}, in the requested order
+        """
+        if ordering not in ('modified', '-modified'):
+            raise ValueError(f"ordering must be 'modified' or '-modified'.  Got {ordering!r}")
+        descending = ordering.startswith('-')
+
+        if completion_summary_reads_enabled():
+            latest = UserContextCompletionSummary.objects.filter(
+                course_context_filter(), user=user,
+            ).order_by(
+                F('last_modified').desc() if descending else F('last_modified').asc(),
+                F('context_key').desc() if descending else F('context_key').asc(),
+            ).values_list('context_key', 'last_modified', 'last_block_key')
+        else:
+            latest = cls.objects.filter(course_context_filter(), user=user).annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F('context_key'),
+                    order_by=[F('modified').desc(), F('id').desc()],
+                ),
+            ).filter(rank=1).order_by(
+                F('modified').desc() if descending else F('modified').asc(),
+                F('context_key').desc() if descending else F('context_key').asc(),
+            ).values_list('context_key', 'modified', 'block_key')
+        if limit is not None:
+            latest = latest[:limit]
+        return {context_key: (modified, block_key) for context_key, modified, block_key in latest}
 
     @classmethod
     def get_latest_block_completed(cls, user, context_key):
@@ -315,9 +827,20 @@ class BlockCompletion(TimeStampedModel, models.Model):
         Returns a BlockCompletion Object for the last modified user/context_key mapping,
         or None if no such BlockCompletion exists.
 
+        When COMPLETION_SUMMARY_READS_ENABLED is set, the completion is found
+        through the UserContextCompletionSummary of the user and context.
+
         Return value:
             obj: block completion
         """
+        if completion_summary_reads_enabled():
+            summary = UserContextCompletionSummary.objects.select_related('last_completion').filter(
+                user=user, context_key=context_key
+            ).first()
+            if summary is None:
+                return None
+            if summary.last_completion is not None:
+                return summary.last_completion
         try:
             latest_block_completion = cls.user_learning_context_completion_queryset(user,
                                                                                     context_key).latest()  # pylint: disable=no-member
@@ -325,6 +848,24 @@ class BlockCompletion(TimeStampedModel, models.Model):
             return None
         return latest_block_completion
 
+    @classmethod
+    async def aget_latest_block_completed(cls, user, context_key):
+        """
+        Async version of get_latest_block_completed().
+        """
+        if completion_summary_reads_enabled():
+            summary = await UserContextCompletionSummary.objects.select_related('last_completion').filter(
+                user=user, context_key=context_key
+            ).afirst()
+            if summary is None:
+                return None
+            if summary.last_completion is not None:
+                return summary.last_completion
+        try:
+            return await cls.user_learning_context_completion_queryset(user, context_key).alatest()
+        except cls.DoesNotExist:
+            return None
+
     @staticmethod
     def completion_by_block_key(completion_iterable):
         """
@@ -335,6 +876,32 @@ class BlockCompletion(TimeStampedModel, models.Model):
         """
         return {completion.full_block_key: completion.completion for completion in completion_iterable}
 
+    @staticmethod
+    def completion_by_block_key_values(context_key, values):
+        """
+        Like completion_by_block_key(), but built from (block_key, completion)
+        tuples of a single learning context, without instantiating
+        BlockCompletion objects.  Block keys may be UsageKeys or the stored
+        strings, e.g. from .values_list(keys.serialized('block_key'),
+        'completion'), which are parsed through the key cache.
+
+        Whether block keys need their run filled in is decided once for the
+        learning context: only old mongo courses store block keys without it.
+
+        Return value:
+            dict[BlockKey] = float
+        """
+        parse = keys.parse_usage_key
+        completions = {
+            parse(block_key) if isinstance(block_key, str) else block_key: completion
+            for block_key, completion in values
+        }
+        if not (context_key.is_course and getattr(context_key, 'deprecated', False)):
+            return completions
+        return {
+            keys.fill_in_run(block_key, context_key): completion for block_key, completion in completions.items()
+        }
+
     class Meta:
         indexes = [
             models.Index(fields=("context_key", "block_type", "user")),
@@ -349,19 +916,342 @@ class BlockCompletion(TimeStampedModel, models.Model):
     def __unicode__(self):
         return f'BlockCompletion: {self.user.username}, {self.context_key}, {self.block_key}: {self.completion}'
 
-    def emit_tracking_log(self):
+    def emit_tracking_log(self, context=None):
         """
         Emit a tracking log when a block completion is created or updated.
+
+        The event is sent once the current transaction commits, together with
+        the other completion events of that transaction.  It is dropped if the
+        transaction is rolled back.  If a tracker `context` captured by
+        tracking.capture_context() is given, the event is sent in it.
         """
-        tracker.emit(
+        tracking.emit_on_commit(
             BLOCK_COMPLETION_CHANGED_EVENT_TYPE,
             {
-                'user_id': self.user.id,
+                'user_id': self.user_id,
                 'course_id': str(self.context_key),
                 'block_id': str(self.block_key),
                 'block_type': self.block_type,
                 'completion': self.completion,
                 'modified': self.modified,
                 'created': self.created,
-            }
+            },
+            using=router.db_for_write(type(self), instance=self),
+            context=context,
+        )
+
+
+class AggregateCompletionManager(models.Manager):
+    """
+    Custom manager for AggregateCompletion model.
+
+    Adds apply_deltas and rebuild methods.
+    """
+
+    def apply_deltas(self, user_id, context_key, deltas):
+        """
+        Update the aggregates of a user in a learning context after some of
+        their block completions changed.
+
+        Each aggregation block above a changed block is updated in place.  If
+        one of them has no record yet, all of the user's aggregates in the
+        learning context are rebuilt from their block completions instead.
+        Does nothing unless COMPLETION_AGGREGATES_ENABLED is set and the
+        structure of the learning context is known.
+
+        Parameters:
+            * user_id (int): The id of the user.
+            * context_key (LearningContextKey): The learning context.
+            * deltas (dict): Maps the UsageKeys of changed blocks to the change
+              in their completion value.
+        """
+        if not aggregation.aggregates_enabled():
+            return
+        structure = aggregation.get_course_structure(context_key)
+        if structure is None:
+            return
+
+        totals = defaultdict(float)
+        for block_key, delta in deltas.items():
+            for aggregation_key in structure.ancestors.get(block_key, ()):
+                totals[aggregation_key] += delta
+
+        now = timezone.now()
+        with transaction.atomic():
+            for aggregation_key, delta in totals.items():
+                if not delta:
+                    continue
+                # MySQL evaluates SET assignments left to right, so percent must
+                # be assigned before earned to see its value before this update.
+                updated = self.filter(user_id=user_id, context_key=context_key, block_key=aggregation_key).update(
+                    percent=(F('earned') + delta) / F('possible'),
+                    earned=F('earned') + delta,
+                    modified=now,
+                )
+                if not updated:
+                    self.rebuild(context_key, user_ids=[user_id], structure=structure)
+                    return
+
+    def rebuild(self, context_key, user_ids=None, structure=None):
+        """
+        Recompute the aggregates of a learning context from its block completions.
+
+        The existing aggregates are locked before the block completions are
+        read, so that a concurrent apply_deltas() waits for the rebuild and
+        then updates the new records, instead of being overwritten by them.
+
+        Parameters:
+            * context_key (LearningContextKey): The learning context.
+            * user_ids ([int]): Only rebuild the aggregates of these users.
+              By default the aggregates of every user are rebuilt.
+            * structure (CourseStructure): The structure of the learning
+              context, if the caller already has it.
+
+        Return Value: (int) The number of AggregateCompletion records written,
+        or None if the structure of the learning context is unknown.
+        """
+        structure = structure or aggregation.get_course_structure(context_key)
+        if structure is None:
+            return None
+
+        completions = BlockCompletion.objects.filter(context_key=context_key)
+        stale = self.filter(context_key=context_key)
+        if user_ids is not None:
+            completions = completions.filter(user_id__in=user_ids)
+            stale = stale.filter(user_id__in=user_ids)
+        with transaction.atomic():
+            list(stale.select_for_update().values_list('id', flat=True))
+            earned = defaultdict(float)
+            completed_user_ids = set()
+            for completion in completions.only('user_id', 'context_key', 'block_key', 'completion'):
+                completed_user_ids.add(completion.user_id)
+                for aggregation_key in structure.ancestors.get(completion.full_block_key, ()):
+                    earned[(completion.user_id, aggregation_key)] += completion.completion
+
+            aggregates = [
+                self.model(
+                    user_id=user_id,
+                    context_key=context_key,
+                    aggregation_name=aggregation_key.block_type,
+                    block_key=aggregation_key,
+                    earned=earned[(user_id, aggregation_key)],
+                    possible=possible,
+                    percent=earned[(user_id, aggregation_key)] / possible,
+                )
+                for user_id in sorted(completed_user_ids)
+                for aggregation_key, possible in structure.possible.items()
+            ]
+            stale.delete()
+            self.bulk_create(aggregates)
+        return len(aggregates)
+
+
+class AggregateCompletion(TimeStampedModel, models.Model):
+    """
+    The completion of an aggregation block (a course, chapter, sequential or
+    vertical) for a user.
+
+    `earned` is the sum of the completion values of the completable blocks
+    below the aggregation block, `possible` is the number of those blocks, and
+    `percent` is earned / possible.  Records are maintained from
+    BlockCompletion writes when COMPLETION_AGGREGATES_ENABLED is set, and can
+    be rebuilt with the rebuild_completion_aggregates management command.
+
+    .. no_pii:
+    """
+    id = BigAutoField(primary_key=True)  # pylint: disable=invalid-name
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    context_key = LearningContextKeyField(max_length=255, db_column="course_key")
+    aggregation_name = models.CharField(max_length=64)
+
+    # note: like BlockCompletion.block_key, this usage key may not have the
+    # run filled in for old mongo courses.
+    block_key = UsageKeyField(max_length=255)
+    earned = models.FloatField()
+    possible = models.FloatField()
+    percent = models.FloatField()
+
+    objects = AggregateCompletionManager()
+
+    @property
+    def full_block_key(self):
+        """
+        Returns the usage key value with the run filled in.
+        """
+        return keys.fill_in_run(self.block_key, self.context_key)
+
+    @classmethod
+    def get_learning_context_aggregates(cls, user, context_key, aggregation_names=None):
+        """
+        Returns a dictionary mapping the BlockKeys of aggregation blocks to the
+        AggregateCompletion records of a user in a learning context, with a
+        single query.
+
+        Parameters:
+            * user: The user, or the id of the user.
+            * context_key (LearningContextKey): The learning context.
+            * aggregation_names ([str]): Only return aggregates of these block
+              types, e.g. ['chapter', 'sequential'].
+
+        Return value:
+            dict[BlockKey] = AggregateCompletion
+        """
+        aggregates = cls.objects.filter(user=user, context_key=context_key)
+        if aggregation_names is not None:
+            aggregates = aggregates.filter(aggregation_name__in=aggregation_names)
+        return {aggregate.full_block_key: aggregate for aggregate in aggregates}
+
+    class Meta:
+        unique_together = [
+            ('user', 'context_key', 'block_key')
+        ]
+
+    def __str__(self):
+        return f'AggregateCompletion: {self.user_id}, {self.context_key}, {self.block_key}: {self.percent}'
+
+
+class UserContextCompletionSummaryManager(models.Manager):
+    """
+    Custom manager for UserContextCompletionSummary model.
+
+    Adds apply_changes and rebuild methods.
+    """
+
+    def apply_changes(self, user_id, context_key, changes):
+        """
+        Update the summary of a user in a learning context after some of
+        their block completions were created or changed.
+
+        The summary is updated in place.  If it does not exist yet, it is
+        built from the user's block completions in the learning context
+        instead.  Does nothing unless COMPLETION_SUMMARIES_ENABLED is set.
+
+        Parameters:
+            * user_id (int): The id of the user.
+            * context_key (LearningContextKey): The learning context.
+            * changes: A list of (BlockCompletion, previous) tuples, where
+              previous is the completion value before the change, or None if
+              the record was created.
+        """
+        if not completion_summaries_enabled() or not changes:
+            return
+        count_delta = sum(
+            int(obj.completion >= 1.0) - int((previous or 0.0) >= 1.0) for obj, previous in changes
         )
+        sum_delta = sum(obj.completion - (previous or 0.0) for obj, previous in changes)
+        last = max((obj for obj, _ in changes), key=lambda obj: (obj.modified, obj.pk or 0))
+        summaries = self.filter(user_id=user_id, context_key=context_key)
+
+        def update():
+            return summaries.update(
+                completed_count=F('completed_count') + count_delta,
+                completion_sum=F('completion_sum') + sum_delta,
+                last_completion_id=last.pk,
+                last_block_key=last.block_key,
+                last_modified=last.modified,
+                modified=timezone.now(),
+            )
+
+        with transaction.atomic():
+            if update():
+                return
+            try:
+                with transaction.atomic():
+                    self.rebuild(user_ids=[user_id], context_key=context_key)
+            except IntegrityError:
+                # The summary was created concurrently by another process,
+                # from completions that did not include these changes yet.
+                update()
+
+    def rebuild(self, user_ids=None, context_key=None):
+        """
+        Recompute summaries from block completions with a single grouped query.
+
+        The existing summaries are locked before the block completions are
+        read, so that a concurrent apply_changes() waits for the rebuild and
+        then updates the new records, instead of being overwritten by them.
+
+        Parameters:
+            * user_ids ([int]): Only rebuild the summaries of these users.
+            * context_key (LearningContextKey): Only rebuild the summaries of
+              this learning context.
+
+        Return Value: (int) The number of UserContextCompletionSummary records written.
+        """
+        completions = BlockCompletion.objects.all()
+        summaries = self.all()
+        if user_ids is not None:
+            completions = completions.filter(user_id__in=user_ids)
+            summaries = summaries.filter(user_id__in=user_ids)
+        if context_key is not None:
+            completions = completions.filter(context_key=context_key)
+            summaries = summaries.filter(context_key=context_key)
+
+        latest = BlockCompletion.objects.filter(
+            user_id=OuterRef('user_id'), context_key=OuterRef('context_key'),
+        ).order_by('-modified', '-id').values('id')[:1]
+        with transaction.atomic():
+            list(summaries.select_for_update().values_list('id', flat=True))
+            groups = list(completions.order_by().values('user_id', 'context_key').annotate(
+                completed_count=Count('id', filter=Q(completion__gte=1.0)),
+                completion_sum=Sum('completion'),
+                last_completion_id=Subquery(latest),
+            ))
+            last_completions = BlockCompletion.objects.only('id', 'block_key', 'modified').in_bulk(
+                [group['last_completion_id'] for group in groups]
+            )
+            records = []
+            for group in groups:
+                last = last_completions[group['last_completion_id']]
+                records.append(self.model(
+                    user_id=group['user_id'],
+                    context_key=group['context_key'],
+                    last_completion_id=last.pk,
+                    last_block_key=last.block_key,
+                    last_modified=last.modified,
+                    completed_count=group['completed_count'],
+                    completion_sum=group['completion_sum'],
+                ))
+            summaries.delete()
+            self.bulk_create(records)
+        return len(records)
+
+
+class UserContextCompletionSummary(TimeStampedModel, models.Model):
+    """
+    A summary of the completions of a user in a learning context.
+
+    Records the most recently modified completion, so that the resume block
+    and the latest completion of each course can be read without scanning
+    the user's completions, along with the number of complete blocks and the
+    sum of all completion values.  Records are maintained from
+    BlockCompletion writes when COMPLETION_SUMMARIES_ENABLED is set, and can
+    be backfilled with the backfill_completion_summaries management command.
+
+    .. no_pii:
+    """
+    id = BigAutoField(primary_key=True)  # pylint: disable=invalid-name
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    context_key = LearningContextKeyField(max_length=255, db_column="course_key")
+
+    # The constraint is left out so that completions can still be deleted
+    # in bulk; the summary is rebuilt or deleted along with them.
+    last_completion = models.ForeignKey(
+        BlockCompletion, null=True, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+    )
+    # note: like BlockCompletion.block_key, this usage key may not have the
+    # run filled in for old mongo courses.
+    last_block_key = UsageKeyField(max_length=255)
+    last_modified = models.DateTimeField()
+    completed_count = models.IntegerField(default=0)
+    completion_sum = models.FloatField(default=0.0)
+
+    objects = UserContextCompletionSummaryManager()
+
+    class Meta:
+        unique_together = [
+            ('user', 'context_key')
+        ]
+
+    def __str__(self):
+        return f'UserContextCompletionSummary: {self.user_id}, {self.context_key}: {self.last_block_key}'
@@ -0,0 +1,134 @@
+"""
+A process-wide registry of how each XBlock type takes part in completion.
+
+Looking up a block's class and inspecting its completion attributes on every
+score signal and every page render adds up.  The answers only change when the
+installed XBlocks change, so they are computed once per block type (or block
+class) and kept until clear_block_policies() is called.
+"""
+
+import logging
+import threading
+from collections import namedtuple
+
+from xblock.completable import XBlockCompletionMode
+from xblock.core import XBlock
+
+log = logging.getLogger(__name__)
+
+_POLICY_ATTRIBUTES = ('completion_mode', 'has_custom_completion', 'has_score')
+_POLICY_ATTRIBUTES_SET = frozenset(_POLICY_ATTRIBUTES)
+
+_policies_by_type = {}
+_policies_by_class = {}
+_lock = threading.Lock()
+
+
+class BlockCompletionPolicy(namedtuple('BlockCompletionPolicy', [
+    'completable', 'aggregator', 'custom_completion', 'scorable', 'dynamic',
+])):
+    """
+    How blocks of one XBlock class take part in completion.
+
+    * completable: blocks are completed individually.
+    * aggregator: blocks are complete when their children are.
+    * custom_completion: blocks submit their own completion values.
+    * scorable: blocks are completed by being scored.
+    * dynamic: one of the attributes above is defined per instance (for
+      example as an XBlock field), so the class-level values can't be trusted
+      for individual blocks.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_block(cls, block):
+        """
+        Compute the policy for an XBlock class or instance.
+        """
+        values = [getattr(block, name, None) for name in _POLICY_ATTRIBUTES]
+        mode = XBlockCompletionMode.get_mode(block)
+        return cls(
+            completable=mode == XBlockCompletionMode.COMPLETABLE,
+            aggregator=mode == XBlockCompletionMode.AGGREGATOR,
+            custom_completion=bool(getattr(block, 'has_custom_completion', False)),
+            scorable=bool(getattr(block, 'has_score', False)),
+            dynamic=not all(value is None or isinstance(value, (bool, str)) for value in values),
+        )
+
+    @property
+    def can_mark_complete_on_view(self):
+        """
+        True if blocks can be marked complete as soon as they are viewed.
+        """
+        return self.completable and not self.custom_completion and not self.scorable
+
+
+def get_block_policy(block_type):
+    """
+    Returns the BlockCompletionPolicy of the XBlock class registered for `block_type`.
+
+    Raises PluginMissingError if no XBlock is registered for the type.
+    """
+    try:
+        return _policies_by_type[block_type]
+    except KeyError:
+        pass
+    policy = get_class_policy(XBlock.load_class(block_type))
+    with _lock:
+        _policies_by_type[block_type] = policy
+    return policy
+
+
+def get_class_policy(block_cls):
+    """
+    Returns the BlockCompletionPolicy of an XBlock class.
+    """
+    try:
+        return _policies_by_class[block_cls]
+    except KeyError:
+        pass
+    policy = BlockCompletionPolicy.from_block(block_cls)
+    with _lock:
+        _policies_by_class[block_cls] = policy
+    return policy
+
+
+def get_instance_policy(block):
+    """
+    Returns the BlockCompletionPolicy of an XBlock instance.
+
+    The policy of the block's class is used unless the block overrides one of
+    the completion attributes itself.
+    """
+    policy = get_class_policy(type(block))
+    if policy.dynamic or not _POLICY_ATTRIBUTES_SET.isdisjoint(getattr(block, '__dict__', ())):
+        return BlockCompletionPolicy.from_block(block)
+    return policy
+
+
+def warm_block_policies():
+    """
+    Compute the policy of every installed XBlock type.
+
+    Types that can't be loaded are skipped and left to fail on first use.
+
+    Return Value: (int) The number of block types registered.
+    """
+    count = 0
+    for block_type, _ in XBlock.load_classes(fail_silently=True):
+        try:
+            get_block_policy(block_type)
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Unable to compute the completion policy of XBlock type %r", block_type, exc_info=True)
+        else:
+            count += 1
+    return count
+
+
+def clear_block_policies():
+    """
+    Forget every computed policy, for use in tests or after XBlocks are reloaded.
+    """
+    with _lock:
+        _policies_by_type.clear()
+        _policies_by_class.clear()
@@ -4,10 +4,12 @@ Runtime service for communicating completion information to the xblock system.
 
 from django.conf import settings
 from django.contrib import auth
-from xblock.completable import XBlockCompletionMode
 
-from .models import BlockCompletion
-from . import waffle
+from .buffer import write_buffer, write_buffer_enabled
+from .caching import completion_cache_enabled
+from .models import AggregateCompletion, BlockCompletion
+from .policies import get_instance_policy
+from . import keys, waffle
 
 User = auth.get_user_model()
 
@@ -20,14 +22,34 @@ class CompletionService:
 
     * self.completion_tracking_enabled() -> bool
     * self.get_completions(candidates)
+    * self.aget_completions(candidates)
     * self.vertical_is_complete(vertical_item)
+    * self.verticals_are_complete(vertical_items)
+    * self.get_aggregate_completions(aggregation_names)
+    * self.prefetch()
 
-    Constructor takes a user object and context_key as arguments.
+    Constructor takes a user object and context_key as arguments.  Pass
+    prefetch=True to load all of the user's completions in the context up
+    front (see prefetch()).
     """
 
-    def __init__(self, user, context_key):
+    def __init__(self, user, context_key, prefetch=False):
         self._user = user
         self._context_key = context_key
+        self._prefetched = None
+        if prefetch:
+            self.prefetch()
+
+    def prefetch(self):
+        """
+        Load all of the user's completions in the learning context with a
+        single query, and answer later get_completions() calls from memory.
+
+        Completions submitted through this service are applied to the
+        prefetched values.  Call prefetch() again to pick up completions
+        written elsewhere.
+        """
+        self._prefetched = BlockCompletion.get_learning_context_completions(self._user, self._context_key)
 
     def completion_tracking_enabled(self):
         """
@@ -47,7 +69,8 @@ class CompletionService:
 
         If a completion is not found for a given block in the current context,
         0.0 is returned.  The service does not attempt to verify that the block
-        exists within the learning context.
+        exists within the learning context.  Completions waiting in the write
+        buffer take precedence over the stored values.
 
         Parameters:
 
@@ -60,19 +83,78 @@ class CompletionService:
 
             dict[BlockKey] -> float: Mapping blocks to their completion value.
         """
-        queryset = BlockCompletion.user_learning_context_completion_queryset(self._user, self._context_key).filter(
+        context_completions = self._prefetched
+        if context_completions is None and completion_cache_enabled():
+            context_completions = BlockCompletion.get_learning_context_completions(self._user, self._context_key)
+        if context_completions is not None:
+            completions = self._select_completions(context_completions, candidates)
+        else:
+            completions = BlockCompletion.completion_by_block_key_values(
+                self._context_key, self._completions_queryset(candidates)
+            )
+        return self._add_missing_completions(completions, candidates)
+
+    async def aget_completions(self, candidates):
+        """
+        Async version of get_completions().
+        """
+        context_completions = self._prefetched
+        if context_completions is None and completion_cache_enabled():
+            context_completions = await BlockCompletion.aget_learning_context_completions(
+                self._user, self._context_key
+            )
+        if context_completions is not None:
+            completions = self._select_completions(context_completions, candidates)
+        else:
+            completions = BlockCompletion.completion_by_block_key_values(
+                self._context_key, [row async for row in self._completions_queryset(candidates)]
+            )
+        return self._add_missing_completions(completions, candidates)
+
+    def _completions_queryset(self, candidates):
+        """
+        Returns a queryset of the (block_key, completion) tuples of the stored
+        completions of the given blocks.
+        """
+        return BlockCompletion.user_learning_context_completion_queryset(self._user, self._context_key).filter(
             # pylint: disable=no-member
             block_key__in=candidates
-        )
-        completions = BlockCompletion.completion_by_block_key(queryset)
+        ).values_list(keys.serialized('block_key'), 'completion')
 
-        def fill_in_run(block_key):
-            """ Add run information to the block usage keys, if it's missing (old mongo keys) """
-            if block_key.context_key.is_course and block_key.context_key.run is None:
-                return block_key.replace(course_key=self._context_key)
-            return block_key
+    def _select_completions(self, context_completions, candidates):
+        """
+        Returns the entries of `context_completions` for the given candidates.
+        """
+        completions = {}
+        for candidate in candidates:
+            candidate = self._fill_in_run(candidate)
+            if candidate in context_completions:
+                completions[candidate] = context_completions[candidate]
+        return completions
+
+    def _fill_in_run(self, block_key):
+        """ Add run information to the block usage keys, if it's missing (old mongo keys) """
+        return keys.fill_in_run(block_key, self._context_key)
 
-        candidates_with_runs = [fill_in_run(candidate) for candidate in candidates]
+    def _update_prefetched(self, block_key, completion):
+        """
+        Apply a completion submitted through this service to the prefetched completions.
+        """
+        block_key = self._fill_in_run(block_key)
+        if self._prefetched is not None and block_key.context_key == self._context_key:
+            self._prefetched[block_key] = completion
+
+    def _add_missing_completions(self, completions, candidates):
+        """
+        Overlay buffered completions on the stored `completions`, and add 0.0
+        for every candidate that has no completion.
+        """
+        candidates_with_runs = [self._fill_in_run(candidate) for candidate in candidates]
+        if write_buffer_enabled():
+            pending = write_buffer.pending_completions(self._user, self._context_key)
+            completions.update(
+                (candidate, pending[candidate]) for candidate in candidates_with_runs if candidate in pending
+            )
         for candidate in candidates_with_runs:
             if candidate not in completions:
                 completions[candidate] = 0.0
@@ -91,15 +173,15 @@ class CompletionService:
         account so the proper blocks are shown for this user.
         """
         user_children = []
-        mode = XBlockCompletionMode.get_mode(node)
-        if mode == XBlockCompletionMode.AGGREGATOR:
+        policy = get_instance_policy(node)
+        if policy.aggregator:
             # TODO: `get_child_descriptors` will be renamed to `get_child_blocks` in the Redwood release.
             node_children = ((hasattr(node, 'get_child_descriptors') and node.get_child_descriptors())
                              or (hasattr(node, 'get_child_blocks') and node.get_child_blocks())
                              or (hasattr(node, 'get_children') and node.get_children()))
             for child in node_children:
                 user_children.extend(self.get_completable_children(child))
-        elif node and mode == XBlockCompletionMode.COMPLETABLE:
+        elif node and policy.completable:
             user_children = [node]
         return user_children
 
@@ -111,19 +193,63 @@ class CompletionService:
         for parent blocks (right now it just stores completion for leaves-
         problems, HTML, video, etc.).
         """
-        if item.scope_ids.block_type != 'vertical':
-            raise ValueError('The passed in xblock is not a vertical type!')
+        return self.verticals_are_complete([item])[item.scope_ids.usage_id]
+
+    def verticals_are_complete(self, items):
+        """
+        Calculates whether each of several verticals is complete, using the
+        same logic as vertical_is_complete(), with a single completion lookup
+        for the completable children of all of them.
+
+        Return value:
+
+            dict[UsageKey] -> bool: Mapping each vertical's usage key to whether
+            it is complete, or to None if completion tracking is disabled.
+        """
+        items = list(items)
+        for item in items:
+            if item.scope_ids.block_type != 'vertical':
+                raise ValueError('The passed in xblock is not a vertical type!')
 
         if not self.completion_tracking_enabled():
-            return None
+            return {item.scope_ids.usage_id: None for item in items}
 
         # this is temporary local logic and will be removed when the whole course tree is included in completion
-        child_locations = [child.scope_ids.usage_id for child in self.get_completable_children(item)]
-        completions = self.get_completions(child_locations)
-        for child_location in child_locations:
-            if completions[child_location] < 1.0:
-                return False
-        return True
+        child_locations = {
+            item.scope_ids.usage_id: [child.scope_ids.usage_id for child in self.get_completable_children(item)]
+            for item in items
+        }
+        completions = self.get_completions({
+            child_location for locations in child_locations.values() for child_location in locations
+        })
+        return {
+            usage_id: all(completions[child_location] >= 1.0 for child_location in locations)
+            for usage_id, locations in child_locations.items()
+        }
+
+    def get_aggregate_completions(self, aggregation_names=None):
+        """
+        Returns the stored completion percent of the aggregation blocks
+        (e.g. chapters and sequentials) of the learning context, read with a
+        single query.
+
+        Aggregates are only stored when COMPLETION_AGGREGATES_ENABLED is set.
+        Aggregation blocks the user has not started are left out.
+
+        Parameters:
+
+            aggregation_names: optional collection of block types to return, e.g. ['chapter', 'sequential'].
+
+        Return value:
+
+            dict[BlockKey] -> float: Mapping aggregation blocks to their completion percent, from 0.0 to 1.0.
+        """
+        return {
+            block_key: aggregate.percent
+            for block_key, aggregate in AggregateCompletion.get_learning_context_aggregates(
+                self._user, self._context_key, aggregation_names
+            ).items()
+        }
 
     def get_complete_on_view_delay_ms(self):
         """
@@ -137,10 +263,7 @@ class CompletionService:
         Returns True if the xblock can be marked complete on view.
         This is true of any non-customized, non-scorable, completable block.
         """
-        return (XBlockCompletionMode.get_mode(block) == XBlockCompletionMode.COMPLETABLE
-                and not getattr(block, 'has_custom_completion', False)
-                and not getattr(block, 'has_score', False)
-                )
+        return get_instance_policy(block).can_mark_complete_on_view
 
     def blocks_to_mark_complete_on_view(self, blocks):
         """
@@ -150,38 +273,57 @@ class CompletionService:
         completions = self.get_completions({block.scope_ids.usage_id for block in blocks})
         return [block for block in blocks if completions.get(block.scope_ids.usage_id, 0) < 1.0]
 
-    def submit_group_completion(self, block_key, completion, users=None, user_ids=None):
+    def submit_group_completion(self, block_key, completion, users=None, user_ids=None, chunk_size=None,
+                                summary=False):
         """
         Submit a completion for a group of users.
 
+        The completions are written in bulk, in chunks of `chunk_size` users
+        (by default the COMPLETION_GROUP_CHUNK_SIZE setting).
+
         Arguments:
 
             block_key (opaque_key.edx.keys.UsageKey): The block to submit completions for.
             completion (float): A value in the range [0.0, 1.0]
             users ([django.contrib.auth.models.User]): An optional iterable of Users that completed the block.
             user_ids ([int]): An optional iterable of ids of Users that completed the block.
+            chunk_size (int): An optional number of users to write per transaction.
+            summary (bool): Return counts instead of model instances.
 
         Returns a list of (BlockCompletion, bool) where the boolean indicates
-        whether the given BlockCompletion was newly created.
+        whether the given BlockCompletion was newly created.  If `summary` is
+        True, returns a dict with the number of completions that were
+        'created', 'updated' and left 'unchanged' instead.
         """
-        if users is None:
-            users = []
-        if user_ids is None:
-            user_ids = []
-        more_users = User.objects.filter(id__in=user_ids)
-        if len(more_users) < len(user_ids):
-            found_ids = {u.id for u in more_users}
-            not_found_ids = [pk for pk in user_ids if pk not in found_ids]
+        users = list(users or [])
+        user_ids = list(user_ids or [])
+        if not users and not user_ids:
+            return {'created': 0, 'updated': 0, 'unchanged': 0} if summary else []
+        chunk_size = chunk_size or getattr(settings, 'COMPLETION_GROUP_CHUNK_SIZE', 500)
+
+        found_ids = set()
+        for start in range(0, len(user_ids), chunk_size):
+            found_ids.update(
+                User.objects.filter(id__in=user_ids[start:start + chunk_size]).values_list('id', flat=True)
+            )
+        not_found_ids = [pk for pk in user_ids if pk not in found_ids]
+        if not_found_ids:
             raise User.DoesNotExist(f"User not found with id(s): {not_found_ids}")
-        users.extend(more_users)
-
-        submitted = []
-        for user in users:
-            submitted.append(BlockCompletion.objects.submit_completion(
-                user=user,
-                block_key=block_key,
-                completion=completion
-            ))
+
+        users_by_id = {user.id: user for user in users}
+        submitted = BlockCompletion.objects.submit_group_completion(
+            list(users_by_id) + [pk for pk in user_ids if pk not in users_by_id],
+            block_key,
+            completion,
+            chunk_size=chunk_size,
+            summary=summary,
+        )
+        if self._user.id in users_by_id or self._user.id in user_ids:
+            self._update_prefetched(block_key, completion)
+        if not summary:
+            for block_completion, _ in submitted:
+                if block_completion.user_id in users_by_id:
+                    block_completion.user = users_by_id[block_completion.user_id]
         return submitted
 
     def submit_completion(self, block_key, completion):
@@ -191,8 +333,10 @@ class CompletionService:
         Returns a (BlockCompletion, bool) where the boolean indicates
         whether the given BlockCompletion was newly created.
         """
-        return BlockCompletion.objects.submit_completion(
+        block_completion, is_new = BlockCompletion.objects.submit_completion(
             user=self._user,
             block_key=block_key,
             completion=completion
         )
+        self._update_prefetched(block_completion.full_block_key, block_completion.completion)
+        return block_completion, is_new
@@ -40,3 +40,73 @@ def plugin_settings(settings):  # pylint: disable=unused-argument
     # Once a user has watched this percentage of a video, mark it as complete:
     # (0.0 = 0%, 1.0 = 100%)
     settings.COMPLETION_VIDEO_COMPLETE_PERCENTAGE = 0.95
+    # Write each submit_completion call with a single INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE statement
+    # instead of get_or_create() followed by save():
+    settings.COMPLETION_UPSERT_ENABLED = False
+    # Coalesce completion submissions from the score handler in memory and write them in bulk.  Pending submissions
+    # are written when the buffer holds COMPLETION_WRITE_BUFFER_MAX_SIZE entries, when the oldest one has waited
+    # COMPLETION_WRITE_BUFFER_FLUSH_INTERVAL seconds (checked on submission and by a background timer), at the end
+    # of every request and when the process exits.  Submissions that cannot be written are retried by the timer and
+    # dropped after COMPLETION_WRITE_BUFFER_MAX_ATTEMPTS failed writes.  Once the buffer holds
+    # COMPLETION_WRITE_BUFFER_MAX_PENDING submissions, new ones are written right away:
+    settings.COMPLETION_WRITE_BUFFER_ENABLED = False
+    settings.COMPLETION_WRITE_BUFFER_MAX_SIZE = 1000
+    settings.COMPLETION_WRITE_BUFFER_FLUSH_INTERVAL = 5
+    settings.COMPLETION_WRITE_BUFFER_MAX_PENDING = 10000
+    settings.COMPLETION_WRITE_BUFFER_MAX_ATTEMPTS = 3
+    # Do not emit edx.completion.block_completion.changed events for submissions that leave the stored value unchanged:
+    settings.COMPLETION_SUPPRESS_UNCHANGED_EVENTS = False
+    # Send completion tracking logs on the request thread ('sync') or from a pool of background threads ('thread').
+    # When the pool's queue is full, new events either wait ('block'), replace the oldest queued event
+    # ('drop_oldest'), or are kept one in COMPLETION_EVENT_DISPATCH_SAMPLE_RATE times ('sample'):
+    settings.COMPLETION_EVENT_DISPATCH = 'sync'
+    settings.COMPLETION_EVENT_DISPATCH_WORKERS = 2
+    settings.COMPLETION_EVENT_DISPATCH_QUEUE_SIZE = 10000
+    settings.COMPLETION_EVENT_DISPATCH_OVERFLOW = 'block'
+    settings.COMPLETION_EVENT_DISPATCH_SAMPLE_RATE = 10
+    # The number of users whose completions are written per transaction by submit_group_completion:
+    settings.COMPLETION_GROUP_CHUNK_SIZE = 500
+    # The largest number of (username, course_key) batches accepted in one v2 completion-batch request:
+    settings.COMPLETION_BATCH_MAX_GROUPS = 1000
+    # Seconds to keep the user ids of usernames and the active enrollments looked up for completion batches in process
+    # (0 looks them up for every batch).  Unknown usernames and missing enrollments are not kept, and other processes
+    # only see renames and ended enrollments once their entries expire, so keep this short (e.g. 30):
+    settings.COMPLETION_LOOKUP_CACHE_TIMEOUT = 0
+    # How the score-changed handler submits completions: right away in the grading request ('inline'), or after the
+    # grading transaction commits, on a local pool of worker threads ('pool') or through the callable at the dotted
+    # path COMPLETION_SCORE_HANDLER_EXECUTOR ('executor'), which is called as executor(func, **kwargs).
+    # Deferred submissions are retried COMPLETION_SCORE_HANDLER_RETRIES times after a DatabaseError, waiting
+    # COMPLETION_SCORE_HANDLER_RETRY_DELAY seconds before the first retry and twice as long before each later one:
+    settings.COMPLETION_SCORE_HANDLER_DISPATCH = 'inline'
+    settings.COMPLETION_SCORE_HANDLER_EXECUTOR = None
+    settings.COMPLETION_SCORE_HANDLER_RETRIES = 3
+    settings.COMPLETION_SCORE_HANDLER_RETRY_DELAY = 0.1
+    settings.COMPLETION_SCORE_HANDLER_WORKERS = 2
+    settings.COMPLETION_SCORE_HANDLER_QUEUE_SIZE = 1000
+    # Seconds to keep the value of the completion tracking waffle switch in process, beyond the current request.
+    # 0 looks the switch up again in every request:
+    settings.COMPLETION_TRACKING_SWITCH_CACHE_TIMEOUT = 5
+    # Cache the completions of each (user, learning context) in the Django cache named by COMPLETION_CACHE_ALIAS for
+    # COMPLETION_CACHE_TIMEOUT seconds.  Writes replace a version stamp in the same cache, so it must be shared by
+    # every process that writes completions:
+    settings.COMPLETION_CACHE_ENABLED = False
+    settings.COMPLETION_CACHE_ALIAS = 'default'
+    settings.COMPLETION_CACHE_TIMEOUT = 300
+    # Maintain AggregateCompletion records for the COMPLETION_AGGREGATION_BLOCK_TYPES blocks of each learning context.
+    # COMPLETION_AGGREGATE_STRUCTURE_PROVIDER is the dotted path of a callable that takes a LearningContextKey and
+    # returns a dict mapping each block key with children to the list of its children's keys.  The structure is
+    # cached for COMPLETION_AGGREGATE_STRUCTURE_TIMEOUT seconds:
+    settings.COMPLETION_AGGREGATES_ENABLED = False
+    settings.COMPLETION_AGGREGATE_STRUCTURE_PROVIDER = None
+    settings.COMPLETION_AGGREGATE_STRUCTURE_TIMEOUT = 3600
+    settings.COMPLETION_AGGREGATION_BLOCK_TYPES = ['course', 'chapter', 'sequential', 'vertical']
+    # Maintain a UserContextCompletionSummary record per (user, learning context).  Run the
+    # backfill_completion_summaries management command after turning this on, and only then turn on
+    # COMPLETION_SUMMARY_READS_ENABLED to read the latest completions from the summaries:
+    settings.COMPLETION_SUMMARIES_ENABLED = False
+    settings.COMPLETION_SUMMARY_READS_ENABLED = False
+    # The number of parsed usage keys, learning context keys and run-filled usage keys each kept in process:
+    settings.COMPLETION_KEY_CACHE_SIZE = 10000
+    # Cache the per-block completion statistics of each learning context in the COMPLETION_CACHE_ALIAS cache for this
+    # many seconds (0 turns the cache off).  Writes do not invalidate the statistics, so keep this short (e.g. 60):
+    settings.COMPLETION_STATS_CACHE_TIMEOUT = 0
@@ -37,6 +37,31 @@ def submit_completions_for_testing(user, block_keys):
         )
 
 
+def bulk_create_completions_for_testing(
+    users, context_key, count=None, block_keys=None, completion=1.0, batch_size=None,
+):
+    """
+    Creates a completion for every user and block in a single bulk insert.
+
+    The blocks are the given block_keys, or otherwise `count` html blocks of
+    the learning context.  `completion` may be a callable taking the user and
+    the index of the block.
+    """
+    if block_keys is None:
+        block_keys = [context_key.make_usage_key('html', str(number)) for number in range(count)]
+    return BlockCompletion.objects.bulk_create((
+        BlockCompletion(
+            user=user,
+            context_key=context_key,
+            block_key=block_key,
+            block_type=block_key.block_type,
+            completion=completion(user, number) if callable(completion) else completion,
+        )
+        for user in users
+        for number, block_key in enumerate(block_keys)
+    ), batch_size=batch_size)
+
+
 # pylint: disable=consider-using-f-string
 class UserFactory(DjangoModelFactory):
     """
@@ -0,0 +1,256 @@
+"""
+Tests of the materialized aggregate completions.
+"""
+
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from opaque_keys.edx.keys import CourseKey
+
+from ..aggregation import CourseStructure, clear_course_structure, get_course_structure
+from ..models import AggregateCompletion, BlockCompletion
+from ..services import CompletionService
+from ..test_utils import CompletionSetUpMixin, UserFactory
+
+COURSE_KEY = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+
+
+def _key(block_type, block_id):
+    return COURSE_KEY.make_usage_key(block_type, block_id)
+
+
+COURSE = _key('course', 'course')
+CHAPTER = _key('chapter', 'chapter')
+SEQUENTIALS = [_key('sequential', str(number)) for number in range(2)]
+VERTICALS = [_key('vertical', str(number)) for number in range(3)]
+LIBRARY = _key('library_content', 'library')
+LEAVES = [_key('html', str(number)) for number in range(5)]
+EMPTY_VERTICAL = _key('vertical', 'empty')
+
+# course > chapter > sequential 0 > vertical 0 > html 0, html 1
+#                                 > vertical 1 > html 2, library > html 3
+#                  > sequential 1 > vertical 2 > html 4
+#                                 > empty vertical
+STRUCTURE = {
+    COURSE: [CHAPTER],
+    CHAPTER: SEQUENTIALS,
+    SEQUENTIALS[0]: VERTICALS[:2],
+    SEQUENTIALS[1]: [VERTICALS[2], EMPTY_VERTICAL],
+    VERTICALS[0]: LEAVES[:2],
+    VERTICALS[1]: [LEAVES[2], LIBRARY],
+    LIBRARY: [LEAVES[3]],
+    VERTICALS[2]: [LEAVES[4]],
+    EMPTY_VERTICAL: [],
+}
+
+
+def get_structure(context_key):
+    """
+    The structure provider used by these tests.
+    """
+    return STRUCTURE if context_key == COURSE_KEY else None
+
+
+class CourseStructureTestCase(TestCase):
+    """
+    Test that course structures are reduced to aggregation ancestors and leaf counts.
+    """
+
+    def test_from_children(self):
+        structure = CourseStructure.from_children(STRUCTURE)
+        self.assertEqual(set(structure.ancestors), set(LEAVES))
+        self.assertEqual(set(structure.ancestors[LEAVES[3]]), {VERTICALS[1], SEQUENTIALS[0], CHAPTER, COURSE})
+        self.assertEqual(structure.possible, {
+            COURSE: 5, CHAPTER: 5, SEQUENTIALS[0]: 4, SEQUENTIALS[1]: 1,
+            VERTICALS[0]: 2, VERTICALS[1]: 2, VERTICALS[2]: 1,
+        })
+
+    @override_settings(COMPLETION_AGGREGATE_STRUCTURE_PROVIDER='completion.tests.test_aggregation.get_structure')
+    def test_structure_is_cached(self):
+        cache.clear()
+        with patch('completion.tests.test_aggregation.get_structure', wraps=get_structure) as provider:
+            get_course_structure(COURSE_KEY)
+            get_course_structure(COURSE_KEY)
+            self.assertEqual(provider.call_count, 1)
+            clear_course_structure(COURSE_KEY)
+            get_course_structure(COURSE_KEY)
+            self.assertEqual(provider.call_count, 2)
+        self.assertIsNone(get_course_structure(CourseKey.from_string('course-v1:edX+Unknown+2049_T2')))
+
+    def test_no_provider(self):
+        self.assertIsNone(get_course_structure(COURSE_KEY))
+
+
+@override_settings(
+    COMPLETION_AGGREGATES_ENABLED=True,
+    COMPLETION_AGGREGATE_STRUCTURE_PROVIDER='completion.tests.test_aggregation.get_structure',
+)
+class AggregateCompletionTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that aggregates are maintained from block completion writes.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def _percents(self, user=None):
+        return {
+            block_key: aggregate.percent
+            for block_key, aggregate in AggregateCompletion.get_learning_context_aggregates(
+                user or self.user, COURSE_KEY
+            ).items()
+        }
+
+    def _rebuilt_percents(self):
+        """
+        Rebuild the aggregates from scratch and return the user's percents.
+        """
+        AggregateCompletion.objects.rebuild(COURSE_KEY)
+        return self._percents()
+
+    def test_first_submission_builds_aggregates(self):
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        self.assertEqual(self._percents(), {
+            COURSE: 0.2, CHAPTER: 0.2, SEQUENTIALS[0]: 0.25, SEQUENTIALS[1]: 0.0,
+            VERTICALS[0]: 0.5, VERTICALS[1]: 0.0, VERTICALS[2]: 0.0,
+        })
+
+    def test_incremental_updates(self):
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        with patch.object(AggregateCompletion.objects, 'rebuild') as rebuild:
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[3], 0.5)
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[3], 1.0)
+            BlockCompletion.objects.submit_batch_completion(self.user, [(LEAVES[1], 1.0), (LEAVES[4], 1.0)])
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[4], 0.0)
+        rebuild.assert_not_called()
+        percents = self._percents()
+        self.assertEqual(percents[VERTICALS[0]], 1.0)
+        self.assertEqual(percents[VERTICALS[1]], 0.5)
+        self.assertEqual(percents[VERTICALS[2]], 0.0)
+        self.assertEqual(percents[COURSE], 0.6)
+        self.assertEqual(percents, self._rebuilt_percents())
+
+    def test_single_submission_queries(self):
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        # In one transaction: get_or_create (select and insert in savepoints), then one update per
+        # aggregation ancestor (vertical, sequential, chapter, course) in a savepoint
+        with self.assertNumQueries(14):
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[1], 1.0)
+
+    def test_percent_is_assigned_before_earned(self):
+        """
+        MySQL evaluates SET assignments left to right, so percent must not see the updated earned.
+        """
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        with CaptureQueriesContext(connection) as queries:
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[1], 1.0)
+        updates = [
+            query['sql'] for query in queries if query['sql'].startswith('UPDATE "completion_aggregatecompletion"')
+        ]
+        self.assertEqual(len(updates), 4)
+        for sql in updates:
+            self.assertLess(sql.index('"percent" ='), sql.index('"earned" ='))
+
+    def test_existing_rows_are_locked(self):
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        with patch.object(
+            BlockCompletion.objects, 'select_for_update', wraps=BlockCompletion.objects.select_for_update
+        ) as select_for_update:
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 0.5)
+            BlockCompletion.objects.submit_batch_completion(self.user, [(LEAVES[0], 1.0)])
+            with override_settings(COMPLETION_UPSERT_ENABLED=True):
+                BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 0.5)
+        self.assertEqual(select_for_update.call_count, 3)
+        self.assertEqual(self._percents()[VERTICALS[0]], 0.25)
+
+    @override_settings(COMPLETION_UPSERT_ENABLED=True)
+    def test_upsert_after_concurrent_insert(self):
+        """
+        Simulate another process creating the record, and applying its own
+        delta, between the locking read and the upsert.
+        """
+        upsert = BlockCompletion.objects._upsert_completion  # pylint: disable=protected-access
+
+        def racing_upsert(user, block_key, completion):
+            with patch.object(BlockCompletion.objects, '_upsert_completion', upsert):
+                BlockCompletion.objects.submit_completion(user, block_key, 0.5)
+            return upsert(user, block_key, completion)
+
+        with patch.object(BlockCompletion.objects, '_upsert_completion', racing_upsert):
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        self.assertEqual(self._percents()[VERTICALS[0]], 0.5)
+        self.assertEqual(self._percents(), self._rebuilt_percents())
+
+    @override_settings(COMPLETION_UPSERT_ENABLED=True)
+    def test_upsert(self):
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 0.5)
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 0.5)
+        self.assertEqual(self._percents()[VERTICALS[0]], 0.25)
+        self.assertEqual(self._percents(), self._rebuilt_percents())
+
+    def test_group_completion(self):
+        other_user = UserFactory()
+        BlockCompletion.objects.submit_group_completion([self.user.id, other_user.id], LEAVES[2], 1.0)
+        self.assertEqual(self._percents()[VERTICALS[1]], 0.5)
+        self.assertEqual(self._percents(other_user)[VERTICALS[1]], 0.5)
+
+    def test_clear(self):
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        BlockCompletion.objects.clear_learning_context_completion(self.user, COURSE_KEY)
+        self.assertEqual(self._percents(), {})
+
+    def test_unknown_structure(self):
+        other_course_key = CourseKey.from_string('course-v1:edX+Unknown+2049_T2')
+        BlockCompletion.objects.submit_completion(self.user, other_course_key.make_usage_key('html', 'x'), 1.0)
+        self.assertFalse(AggregateCompletion.objects.exists())
+
+    def test_disabled(self):
+        with override_settings(COMPLETION_AGGREGATES_ENABLED=False):
+            BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        self.assertFalse(AggregateCompletion.objects.exists())
+
+    def test_read_api(self):
+        BlockCompletion.objects.submit_batch_completion(self.user, [(LEAVES[0], 1.0), (LEAVES[1], 1.0)])
+        service = CompletionService(self.user, COURSE_KEY)
+        with self.assertNumQueries(1):
+            percents = service.get_aggregate_completions(['sequential', 'vertical'])
+        self.assertEqual(percents, {
+            SEQUENTIALS[0]: 0.5, SEQUENTIALS[1]: 0.0, VERTICALS[0]: 1.0, VERTICALS[1]: 0.0, VERTICALS[2]: 0.0,
+        })
+
+    def test_rebuild_locks_aggregates_first(self):
+        BlockCompletion.objects.submit_completion(self.user, LEAVES[0], 1.0)
+        with patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update) as lock:
+            with CaptureQueriesContext(connection) as queries:
+                AggregateCompletion.objects.rebuild(COURSE_KEY, user_ids=[self.user.id])
+        self.assertEqual([call.args[0].model for call in lock.call_args_list], [AggregateCompletion])
+        tables = [
+            table for query in queries for table in ('aggregatecompletion', 'blockcompletion')
+            if query['sql'].startswith('SELECT') and f'FROM "completion_{table}"' in query['sql']
+        ]
+        self.assertEqual(tables, ['aggregatecompletion', 'blockcompletion'])
+
+    def test_rebuild_command(self):
+        other_user = UserFactory()
+        with override_settings(COMPLETION_AGGREGATES_ENABLED=False):
+            BlockCompletion.objects.submit_batch_completion(self.user, [(key, 1.0) for key in LEAVES])
+            BlockCompletion.objects.submit_completion(other_user, LEAVES[4], 1.0)
+        AggregateCompletion.objects.create(
+            user=UserFactory(), context_key=COURSE_KEY, aggregation_name='course', block_key=COURSE,
+            earned=1.0, possible=5.0, percent=0.2,
+        )
+        out = StringIO()
+        call_command('rebuild_completion_aggregates', str(COURSE_KEY), '--batch-size', '1', stdout=out)
+        self.assertIn('Wrote 14 aggregate completions for 2 users', out.getvalue())
+        self.assertEqual(set(self._percents().values()), {1.0})
+        self.assertEqual(self._percents(other_user)[SEQUENTIALS[1]], 1.0)
+        self.assertEqual(AggregateCompletion.objects.count(), 14)
@@ -0,0 +1,222 @@
+"""
+Tests of the submission of many (user, learning context) groups at once.
+"""
+
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from opaque_keys.edx.keys import CourseKey
+
+from .. import batch, lookups
+from ..batch import submit_completion_groups
+from ..models import BlockCompletion
+from ..test_utils import CompletionSetUpMixin, UserFactory
+
+
+class SubmitCompletionGroupsTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that groups are validated and written together, with a report for each group.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        lookups.clear()
+        self.addCleanup(lookups.clear)
+        self.other_user = UserFactory()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.other_course_key = CourseKey.from_string('course-v1:edX+Other+2049_T2')
+        self.enrollments = {
+            (self.user.id, self.course_key),
+            (self.user.id, self.other_course_key),
+            (self.other_user.id, self.course_key),
+        }
+        self.enrollment_lookups = []
+
+    def get_enrolled(self, course_user_ids):
+        self.enrollment_lookups.append(course_user_ids)
+        return course_user_ids & self.enrollments
+
+    def _group(self, user, course_key, *block_ids, completion=1.0):
+        return {
+            'username': user if isinstance(user, str) else user.username,
+            'course_key': str(course_key),
+            'blocks': {str(course_key.make_usage_key('html', block_id)): completion for block_id in block_ids},
+        }
+
+    def _completions(self, user, course_key):
+        return {
+            str(block_key): completion
+            for block_key, completion in BlockCompletion.get_learning_context_completions(user, course_key).items()
+        }
+
+    def test_groups(self):
+        groups = [
+            self._group(self.user, self.course_key, 'a', 'b'),
+            self._group(self.user, self.other_course_key, 'a'),
+            self._group(self.other_user, self.course_key, 'a', completion=0.5),
+        ]
+        # The users, the existing completions and a single insert, with the savepoints around it.
+        with self.assertNumQueries(7):
+            reports = submit_completion_groups(groups, self.get_enrolled)
+        self.assertEqual([report['status'] for report in reports], [200, 200, 200])
+        self.assertEqual(reports[0], {
+            'username': self.user.username, 'course_key': str(self.course_key), 'status': 200, 'detail': 'ok',
+        })
+        self.assertEqual(self._completions(self.user, self.course_key), groups[0]['blocks'])
+        self.assertEqual(self._completions(self.user, self.other_course_key), groups[1]['blocks'])
+        self.assertEqual(self._completions(self.other_user, self.course_key), groups[2]['blocks'])
+        self.assertEqual(len(self.enrollment_lookups), 1)
+
+    def test_errors_are_reported_per_group(self):
+        groups = [
+            self._group(self.user, self.course_key, 'a'),
+            {'username': self.user.username, 'course_key': str(self.course_key)},
+            self._group(self.user, self.course_key, 'b', completion=2.0),
+            {'username': self.user.username, 'course_key': 'not a key', 'blocks': {}},
+            self._group('nobody', self.course_key, 'a'),
+            self._group(self.other_user, self.other_course_key, 'a'),
+            {
+                'username': self.user.username,
+                'course_key': str(self.course_key),
+                'blocks': {str(self.other_course_key.make_usage_key('html', 'a')): 1.0},
+            },
+            'not a group',
+        ]
+        reports = submit_completion_groups(groups, self.get_enrolled)
+        self.assertEqual([report['status'] for report in reports], [200, 400, 400, 400, 404, 400, 400, 400])
+        self.assertEqual(reports[1]['detail'], "Key 'blocks' not found.")
+        self.assertEqual(reports[4]['detail'], 'User nobody does not exist.')
+        self.assertEqual(reports[5]['detail'], 'User is not enrolled in course.')
+        self.assertEqual(reports[7], {
+            'username': None, 'course_key': None, 'status': 400, 'detail': 'Each batch must be an object.',
+        })
+        self.assertEqual(BlockCompletion.objects.count(), 1)
+
+    def test_username_and_course_key_must_be_strings(self):
+        groups = [
+            {**self._group(self.user, self.course_key, 'a'), 'username': [self.user.username]},
+            {**self._group(self.user, self.course_key, 'a'), 'username': ''},
+            {**self._group(self.user, self.course_key, 'a'), 'course_key': [str(self.course_key)]},
+            self._group(self.user, self.course_key, 'a'),
+        ]
+        reports = submit_completion_groups(groups, self.get_enrolled)
+        self.assertEqual([report['status'] for report in reports], [400, 400, 400, 200])
+        self.assertEqual(reports[0]['detail'], "'username' must be a non-empty string.")
+        self.assertEqual(reports[2]['detail'], "'course_key' must be a non-empty string.")
+
+    def test_usernames_are_matched_like_the_database(self):
+        """
+        A case-insensitive collation returns the stored username for a
+        differently cased one, which must still be found.
+        """
+        rows = [(self.user.username, self.user.id)]
+        with patch.object(get_user_model().objects, 'filter') as filter_users:
+            filter_users.return_value.values_list.return_value = rows
+            user_ids = batch._load_user_ids({self.user.username.upper(), 'nobody'})  # pylint: disable=protected-access
+        self.assertEqual(user_ids, {self.user.username.upper(): self.user.id})
+
+    def test_other_users_are_forbidden(self):
+        reports = submit_completion_groups(
+            [self._group(self.user, self.course_key, 'a'), self._group(self.other_user, self.course_key, 'a')],
+            self.get_enrolled,
+            username=self.user.username,
+        )
+        self.assertEqual([report['status'] for report in reports], [200, 403])
+        self.assertEqual(self._completions(self.other_user, self.course_key), {})
+
+    def test_libraries_skip_enrollment(self):
+        group = {
+            'username': self.user.username, 'course_key': 'lib:edX:library', 'blocks': {'lb:edX:library:html:a': 1.0},
+        }
+        reports = submit_completion_groups([group], self.get_enrolled)
+        self.assertEqual(reports[0]['status'], 200)
+        self.assertEqual(self.enrollment_lookups, [])
+
+    def test_database_error(self):
+        with patch.object(BlockCompletion.objects, 'submit_bulk_completion', side_effect=DatabaseError('down')):
+            reports = submit_completion_groups(
+                [self._group(self.user, self.course_key, 'a'), self._group('nobody', self.course_key, 'a')],
+                self.get_enrolled,
+            )
+        self.assertEqual([(report['status'], report['detail']) for report in reports], [
+            (500, 'down'), (404, 'User nobody does not exist.'),
+        ])
+
+    @override_settings(COMPLETION_BATCH_MAX_GROUPS=2)
+    def test_too_many_groups(self):
+        with self.assertRaises(ValidationError):
+            submit_completion_groups([self._group(self.user, self.course_key, 'a')] * 3, self.get_enrolled)
+
+
+class SubmitCompletionGroupsDisabledTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that nothing is submitted when completion tracking is disabled.
+    """
+    COMPLETION_SWITCH_ENABLED = False
+
+    def test_disabled(self):
+        with self.assertRaises(ValidationError):
+            submit_completion_groups([], set)
+
+
+class SubmitCompletionGroupsQueriesTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Compare the queries of submitting many small batches one request at a
+    time, the way the v1 view handles them, with submitting them as groups of
+    a single request.
+
+    The views need edx-platform to be imported, so the work each one does per
+    request is compared instead.  The enrollment check of the v1 view, which
+    is a query per request, is stood in for by a query of the users table.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+    LEARNERS = 10
+    COURSES = 2
+    BLOCKS = 3
+
+    def setUp(self):
+        super().setUp()
+        lookups.clear()
+        self.addCleanup(lookups.clear)
+        self.users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'learner-{number}') for number in range(self.LEARNERS)
+        )
+        self.course_keys = [CourseKey.from_string(f'course-v1:edX+MOOC{number}+run') for number in range(self.COURSES)]
+        self.groups = [
+            {
+                'username': user.username,
+                'course_key': str(course_key),
+                'blocks': {str(course_key.make_usage_key('html', str(number))): 1.0 for number in range(self.BLOCKS)},
+            }
+            for user in self.users
+            for course_key in self.course_keys
+        ]
+
+    def _submit_one_request_per_group(self):
+        for group in self.groups:
+            user = get_user_model().objects.get(username=group['username'])
+            context_key = CourseKey.from_string(group['course_key'])
+            get_user_model().objects.filter(id=user.id).exists()
+            BlockCompletion.objects.submit_batch_completion(
+                user, [(context_key.make_usage_key('html', key.split('@')[-1]), value)
+                       for key, value in group['blocks'].items()]
+            )
+
+    def test_queries(self):
+        with CaptureQueriesContext(connection) as per_request:
+            self._submit_one_request_per_group()
+        self.assertGreaterEqual(len(per_request), 4 * len(self.groups))
+        BlockCompletion.objects.all().delete()
+
+        # The same queries as for a single group: the users, the existing
+        # completions and a single insert, with the savepoints around it.
+        with self.assertNumQueries(7):
+            reports = submit_completion_groups(self.groups, lambda course_user_ids: course_user_ids)
+
+        self.assertEqual({report['status'] for report in reports}, {200})
+        self.assertEqual(BlockCompletion.objects.count(), self.LEARNERS * self.COURSES * self.BLOCKS)
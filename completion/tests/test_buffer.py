@@ -0,0 +1,246 @@
+"""
+Tests of the completion write buffer.
+"""
+
+from unittest.mock import patch
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.signals import request_finished
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from eventtracking import tracker
+from eventtracking.django import DjangoTracker
+from opaque_keys.edx.keys import CourseKey, UsageKey
+
+from ..buffer import CompletionWriteBuffer, flush_write_buffer, write_buffer
+from ..models import BlockCompletion
+from ..services import CompletionService
+from ..test_utils import IN_MEMORY_BACKEND_CONFIG, CompletionSetUpMixin, EventTrackingTestCase, UserFactory
+
+
+@override_settings(COMPLETION_WRITE_BUFFER_ENABLED=True)
+class CompletionWriteBufferTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test that the write buffer coalesces submissions and writes them in bulk.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.block_keys = [self.course_key.make_usage_key('html', str(number)) for number in range(5)]
+        self.buffer = CompletionWriteBuffer(max_size=100, flush_interval=3600)
+
+    def _count_writes(self, submit):
+        """
+        Run submit() and return the number of INSERT and UPDATE statements it executed.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            submit()
+        return len([query for query in queries.captured_queries if query['sql'].startswith(('INSERT', 'UPDATE'))])
+
+    def test_coalesces_submissions(self):
+        self.buffer.submit_completion(self.user, self.block_keys[0], 0.5)
+        self.buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.buffer.submit_completion(self.user, self.block_keys[1], 0.25)
+        self.assertEqual(len(self.buffer), 2)
+        self.assertFalse(BlockCompletion.objects.exists())
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(
+            BlockCompletion.get_learning_context_completions(self.user, self.course_key),
+            {self.block_keys[0]: 1.0, self.block_keys[1]: 0.25},
+        )
+
+    def test_flushes_at_max_size(self):
+        buffer = CompletionWriteBuffer(max_size=3, flush_interval=3600)
+        for block_key in self.block_keys[:2]:
+            buffer.submit_completion(self.user, block_key, 1.0)
+        self.assertFalse(BlockCompletion.objects.exists())
+        buffer.submit_completion(self.user, self.block_keys[2], 1.0)
+        self.assertEqual(BlockCompletion.objects.count(), 3)
+        self.assertEqual(len(buffer), 0)
+
+    def test_flushes_after_interval(self):
+        buffer = CompletionWriteBuffer(max_size=100, flush_interval=0)
+        buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.assertEqual(BlockCompletion.objects.count(), 1)
+
+    def test_flushes_at_request_end(self):
+        write_buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.addCleanup(write_buffer.flush)
+        self.assertFalse(BlockCompletion.objects.exists())
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(BlockCompletion.objects.count(), 1)
+
+    def test_flushes_at_exit(self):
+        with patch('atexit.register') as register:
+            apps.get_app_config('completion').ready()
+        register.assert_called_once_with(flush_write_buffer)
+        write_buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.addCleanup(write_buffer.flush)
+        flush_write_buffer()
+        self.assertEqual(BlockCompletion.objects.count(), 1)
+
+    def test_failed_flush_is_retried(self):
+        self.buffer.submit_completion(self.user, self.block_keys[0], 0.5)
+        self.buffer.submit_completion(self.user, self.block_keys[1], 0.5)
+        with patch.object(BlockCompletion.objects, '_bulk_submit_completions', side_effect=DatabaseError):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(self.buffer), 2)
+        self.assertEqual(
+            self.buffer.pending_completions(self.user, self.course_key),
+            {self.block_keys[0]: 0.5, self.block_keys[1]: 0.5},
+        )
+
+        # A newer submission for the same block takes precedence over the retried one.
+        self.buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(
+            BlockCompletion.get_learning_context_completions(self.user, self.course_key),
+            {self.block_keys[0]: 1.0, self.block_keys[1]: 0.5},
+        )
+
+    def test_failing_entry_is_written_alone_and_dropped(self):
+        buffer = CompletionWriteBuffer(max_size=100, flush_interval=3600, max_attempts=2)
+        bulk_submit = BlockCompletion.objects._bulk_submit_completions  # pylint: disable=protected-access
+
+        def fail_on_second_block(submissions, contexts=None):
+            submissions = list(submissions)
+            if any(block_key == self.block_keys[1] for _, block_key, _ in submissions):
+                raise DatabaseError
+            return bulk_submit(submissions, contexts)
+
+        for block_key in self.block_keys[:3]:
+            buffer.submit_completion(self.user, block_key, 1.0)
+        with patch.object(BlockCompletion.objects, '_bulk_submit_completions', side_effect=fail_on_second_block):
+            self.assertEqual(buffer.flush(), 2)
+            self.assertEqual(buffer.pending_completions(self.user, self.course_key), {self.block_keys[1]: 1.0})
+            with self.assertLogs('completion.buffer', 'ERROR'):
+                self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(
+            set(BlockCompletion.get_learning_context_completions(self.user, self.course_key)),
+            {self.block_keys[0], self.block_keys[2]},
+        )
+
+    def test_failed_flush_is_not_retried_by_submissions(self):
+        buffer = CompletionWriteBuffer(max_size=2, flush_interval=3600)
+        buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        with patch.object(BlockCompletion.objects, '_bulk_submit_completions', side_effect=DatabaseError) as submit:
+            buffer.submit_completion(self.user, self.block_keys[1], 1.0)
+            self.assertEqual(submit.call_count, 3)
+            buffer.submit_completion(self.user, self.block_keys[2], 1.0)
+            self.assertEqual(submit.call_count, 3)
+        self.assertEqual(len(buffer), 3)
+        self.assertEqual(buffer.flush(), 3)
+
+    def test_full_buffer_writes_immediately(self):
+        buffer = CompletionWriteBuffer(max_size=100, flush_interval=3600, max_pending=2)
+        for block_key in self.block_keys[:2]:
+            self.assertIsNone(buffer.submit_completion(self.user, block_key, 0.5))
+        self.assertIsNone(buffer.submit_completion(self.user, self.block_keys[0], 1.0))
+        _, is_new = buffer.submit_completion(self.user, self.block_keys[2], 1.0)
+        self.assertTrue(is_new)
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual(BlockCompletion.objects.get().block_key, self.block_keys[2])
+
+        with patch.object(BlockCompletion.objects, '_bulk_submit_completions', side_effect=DatabaseError):
+            buffer.flush()
+        buffer.submit_completion(self.user, self.block_keys[3], 1.0)
+        buffer.submit_completion(self.user, self.block_keys[4], 1.0)
+        self.assertEqual(len(buffer), 2)
+
+    def test_events_are_emitted_in_submission_context(self):
+        other_user = UserFactory()
+        with self.tracker.context('request', {'username': self.user.username, 'ip': '10.0.0.1'}):
+            self.buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        with self.tracker.context('request', {'username': other_user.username, 'ip': '10.0.0.2'}):
+            self.buffer.submit_completion(other_user, self.block_keys[0], 1.0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.buffer.flush()
+
+        events = self.tracker.backends['mem'].events
+        self.assertEqual(
+            {(event['data']['user_id'], event['context']['username'], event['context']['ip']) for event in events},
+            {(self.user.id, self.user.username, '10.0.0.1'), (other_user.id, other_user.username, '10.0.0.2')},
+        )
+
+    def test_validates_on_submit(self):
+        with self.assertRaises(ValidationError):
+            self.buffer.submit_completion(self.user, self.block_keys[0], 1.2)
+        with self.assertRaises(ValueError):
+            self.buffer.submit_completion(self.user, UsageKey.from_string('i4x://edX/MOOC101/video/0'), 1.0)
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_disabled_buffer_writes_immediately(self):
+        with override_settings(COMPLETION_WRITE_BUFFER_ENABLED=False):
+            completion, is_new = self.buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.assertTrue(is_new)
+        self.assertEqual(completion.completion, 1.0)
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_service_reads_pending_completions(self):
+        other_user = UserFactory()
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 0.5)
+        write_buffer.submit_completion(self.user, self.block_keys[0], 1.0)
+        write_buffer.submit_completion(self.user, self.block_keys[1], 0.75)
+        write_buffer.submit_completion(other_user, self.block_keys[2], 1.0)
+        self.addCleanup(write_buffer.flush)
+
+        service = CompletionService(self.user, self.course_key)
+        self.assertEqual(
+            service.get_completions(self.block_keys[:3]),
+            {self.block_keys[0]: 1.0, self.block_keys[1]: 0.75, self.block_keys[2]: 0.0},
+        )
+
+    def test_database_writes(self):
+        """
+        Compare database writes for repeated submissions with the buffer on and off.
+        """
+        def submit_repeatedly(buffer):
+            for _ in range(10):
+                for block_key in self.block_keys:
+                    buffer.submit_completion(self.user, block_key, 1.0)
+            buffer.flush()
+
+        with override_settings(COMPLETION_WRITE_BUFFER_ENABLED=False):
+            unbuffered_writes = self._count_writes(lambda: submit_repeatedly(self.buffer))
+        BlockCompletion.objects.all().delete()
+        buffered_writes = self._count_writes(lambda: submit_repeatedly(self.buffer))
+
+        self.assertEqual(unbuffered_writes, len(self.block_keys))
+        self.assertEqual(buffered_writes, 1)
+        self.assertEqual(BlockCompletion.objects.filter(user=self.user, completion=1.0).count(), len(self.block_keys))
+
+
+@override_settings(COMPLETION_WRITE_BUFFER_ENABLED=True, EVENT_TRACKING_BACKENDS=IN_MEMORY_BACKEND_CONFIG)
+class CompletionWriteBufferTimerTestCase(CompletionSetUpMixin, TransactionTestCase):
+    """
+    Test that pending submissions are written by the background timer.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        tracker.register_tracker(DjangoTracker())
+        self.block_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2').make_usage_key('html', 'intro')
+
+    def test_flushes_on_timer(self):
+        buffer = CompletionWriteBuffer(max_size=100, flush_interval=0.1)
+        buffer.submit_completion(self.user, self.block_key, 1.0)
+        timer = buffer._timer  # pylint: disable=protected-access
+        timer.join(5)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(BlockCompletion.objects.get(user=self.user).completion, 1.0)
+
+    def test_flush_cancels_timer(self):
+        buffer = CompletionWriteBuffer(max_size=100, flush_interval=3600)
+        buffer.submit_completion(self.user, self.block_key, 1.0)
+        timer = buffer._timer  # pylint: disable=protected-access
+        self.assertEqual(buffer.flush(), 1)
+        timer.join(5)
+        self.assertFalse(timer.is_alive())
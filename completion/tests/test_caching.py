@@ -0,0 +1,229 @@
+"""
+Tests of the learning context completion cache.
+"""
+
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase
+from django.test.utils import override_settings
+from freezegun import freeze_time
+from opaque_keys.edx.keys import CourseKey
+
+from .. import caching
+from ..models import BlockCompletion
+from ..services import CompletionService
+from ..test_utils import CompletionSetUpMixin, EventTrackingTestCase, UserFactory, bulk_create_completions_for_testing
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'completion': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'completion'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, COMPLETION_CACHE_ENABLED=True, COMPLETION_CACHE_ALIAS='completion')
+class LearningContextCompletionCacheTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test that learning context completions are read through the cache and invalidated by writes.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        caches['completion'].clear()
+        caching.reset_stats()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.block_keys = [self.course_key.make_usage_key('html', str(number)) for number in range(10)]
+        BlockCompletion.objects.submit_batch_completion(self.user, [(key, 1.0) for key in self.block_keys[:5]])
+
+    def _completions(self, user=None):
+        return BlockCompletion.get_learning_context_completions(user or self.user, self.course_key)
+
+    def test_read_through(self):
+        with self.assertNumQueries(1):
+            first = self._completions()
+        with self.assertNumQueries(0):
+            second = self._completions()
+        self.assertEqual(first, second)
+        self.assertEqual(first, {key: 1.0 for key in self.block_keys[:5]})
+        self.assertEqual(caching.stats(), {'hits': 1, 'misses': 1})
+
+    def test_submit_completion_invalidates(self):
+        self._completions()
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 0.5)
+        self.assertEqual(self._completions()[self.block_keys[0]], 0.5)
+
+    def test_batch_completion_invalidates(self):
+        self._completions()
+        BlockCompletion.objects.submit_batch_completion(self.user, [(self.block_keys[9], 1.0)])
+        self.assertEqual(self._completions()[self.block_keys[9]], 1.0)
+
+    def test_unchanged_submission_keeps_cache(self):
+        self._completions()
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        with self.assertNumQueries(0):
+            self._completions()
+
+    def test_clear_invalidates(self):
+        self._completions()
+        BlockCompletion.objects.clear_learning_context_completion(self.user, self.course_key)
+        self.assertEqual(self._completions(), {})
+
+    def test_other_users_are_unaffected(self):
+        other_user = UserFactory()
+        self._completions()
+        self._completions(other_user)
+        BlockCompletion.objects.submit_completion(other_user, self.block_keys[0], 1.0)
+        with self.assertNumQueries(0):
+            self._completions()
+        self.assertEqual(self._completions(other_user), {self.block_keys[0]: 1.0})
+
+    def test_invalidated_again_on_commit(self):
+        self._completions()
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 0.5)
+                # Stands in for a reader in another process, which caches the map it sees before the commit.
+                self._completions()
+                with self.assertNumQueries(0):
+                    self._completions()
+        with self.assertNumQueries(1):
+            self._completions()
+
+    def test_service_uses_cache(self):
+        service = CompletionService(self.user, self.course_key)
+        service.get_completions(self.block_keys)
+        with self.assertNumQueries(0):
+            completions = service.get_completions(self.block_keys)
+        self.assertEqual(completions, {key: 1.0 if index < 5 else 0.0 for index, key in enumerate(self.block_keys)})
+
+    async def test_async_service_uses_cache(self):
+        service = CompletionService(self.user, self.course_key)
+        await service.aget_completions(self.block_keys)
+        completions = await service.aget_completions(self.block_keys)
+        self.assertEqual(caching.stats(), {'hits': 1, 'misses': 1})
+        self.assertEqual(completions, {key: 1.0 if index < 5 else 0.0 for index, key in enumerate(self.block_keys)})
+
+    def test_repeated_reads(self):
+        """
+        Compare the queries of repeated reads with and without the cache.
+        """
+        def read_repeatedly():
+            for _ in range(50):
+                self._completions()
+
+        with override_settings(COMPLETION_CACHE_ENABLED=False):
+            with self.assertNumQueries(50):
+                read_repeatedly()
+        with self.assertNumQueries(1):
+            read_repeatedly()
+        self.assertEqual(caching.stats(), {'hits': 49, 'misses': 1})
+
+
+@override_settings(CACHES=LOCMEM_CACHES, COMPLETION_STATS_CACHE_TIMEOUT=300, COMPLETION_CACHE_ALIAS='completion')
+class LearningContextStatsCacheTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that the statistics of a learning context are cached until they expire.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        caches['completion'].clear()
+        caching.reset_stats()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.block_keys = [self.course_key.make_usage_key('html', str(number)) for number in range(10)]
+        BlockCompletion.objects.submit_batch_completion(self.user, [(key, 1.0) for key in self.block_keys[:5]])
+
+    def _stats(self, threshold=1.0, course_key=None):
+        return BlockCompletion.get_learning_context_stats(course_key or self.course_key, threshold)
+
+    def test_read_through(self):
+        with self.assertNumQueries(1):
+            first = self._stats()
+        with self.assertNumQueries(0):
+            second = self._stats()
+        self.assertEqual(first, second)
+        self.assertEqual(first['block_types']['html']['completed'], 5)
+        self.assertEqual(caching.stats(), {'hits': 1, 'misses': 1})
+
+    def test_thresholds_are_cached_separately(self):
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[9], 0.5)
+        self.assertEqual(self._stats()['block_types']['html']['completed'], 5)
+        self.assertEqual(self._stats(0.5)['block_types']['html']['completed'], 6)
+        with self.assertNumQueries(0):
+            self._stats()
+            self._stats(0.5)
+
+    def test_writes_do_not_invalidate(self):
+        other_user = UserFactory()
+        with freeze_time('2049-01-01 00:00:00') as frozen_time:
+            self._stats()
+            BlockCompletion.objects.submit_completion(other_user, self.block_keys[0], 1.0)
+            BlockCompletion.objects.submit_batch_completion(other_user, [(self.block_keys[1], 1.0)])
+            with self.assertNumQueries(0):
+                self.assertEqual(self._stats()['blocks'][self.block_keys[0]]['learners'], 1)
+            frozen_time.tick(301)
+            stats = self._stats()
+        self.assertEqual(stats['blocks'][self.block_keys[0]]['learners'], 2)
+        self.assertEqual(stats['blocks'][self.block_keys[1]]['learners'], 2)
+
+    def test_other_contexts_are_unaffected(self):
+        other_course_key = CourseKey.from_string('course-v1:edX+Other+2049_T2')
+        self._stats()
+        BlockCompletion.objects.submit_completion(self.user, other_course_key.make_usage_key('html', 'x'), 1.0)
+        with self.assertNumQueries(0):
+            self._stats()
+        self.assertEqual(self._stats(course_key=other_course_key)['block_types']['html']['learners'], 1)
+
+    @override_settings(COMPLETION_STATS_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self._stats()
+        with self.assertNumQueries(1):
+            self._stats()
+
+
+@override_settings(CACHES=LOCMEM_CACHES, COMPLETION_STATS_CACHE_TIMEOUT=300, COMPLETION_CACHE_ALIAS='completion')
+class LearningContextStatsAggregationTestCase(TestCase):
+    """
+    Test that the statistics computed in SQL match those computed in Python
+    from every row, with a single query, and are then read from the cache.
+    """
+    LEARNERS = 20
+    BLOCKS = 10
+
+    def setUp(self):
+        super().setUp()
+        caches['completion'].clear()
+        self.course_key = CourseKey.from_string('course-v1:edX+Large+run')
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'learner-{number}') for number in range(self.LEARNERS)
+        )
+        block_keys = [
+            self.course_key.make_usage_key('problem' if number % 5 else 'video', str(number))
+            for number in range(self.BLOCKS)
+        ]
+        bulk_create_completions_for_testing(
+            users, self.course_key, block_keys=block_keys, completion=lambda user, number: (user.id * number % 5) / 4,
+        )
+
+    def _stats_in_python(self):
+        completed = defaultdict(int)
+        for block_key, completion in BlockCompletion.objects.filter(context_key=self.course_key).values_list(
+            'block_key', 'completion'
+        ):
+            completed[block_key] += completion >= 1.0
+        return completed
+
+    def test_stats(self):
+        with self.assertNumQueries(1):
+            stats = BlockCompletion.get_learning_context_stats(self.course_key)
+        with self.assertNumQueries(0):
+            cached = BlockCompletion.get_learning_context_stats(self.course_key)
+
+        self.assertEqual(cached, stats)
+        self.assertEqual(len(stats['blocks']), self.BLOCKS)
+        self.assertEqual(sum(block['learners'] for block in stats['blocks'].values()), self.LEARNERS * self.BLOCKS)
+        self.assertEqual({key: block['completed'] for key, block in stats['blocks'].items()}, self._stats_in_python())
@@ -0,0 +1,199 @@
+"""
+Tests of the streaming completion export.
+"""
+
+import csv
+import datetime
+import json
+import tracemalloc
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from freezegun import freeze_time
+from opaque_keys.edx.keys import CourseKey
+from pytz import UTC
+
+from ..export import (EXPORT_FIELDS, MATRIX_FIELDS, iter_completion_matrix, iter_context_completions, iter_csv,
+                      iter_ndjson)
+from ..models import BlockCompletion
+from ..test_utils import CompletionSetUpMixin, UserFactory, bulk_create_completions_for_testing
+
+
+class ExportSetUpMixin(CompletionSetUpMixin):
+    """
+    Completions of two users in a course, and of one user in another course.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.other_user = UserFactory()
+        self.blocks = [self.course_key.make_usage_key('html', str(number)) for number in range(3)]
+        self.problems = [self.course_key.make_usage_key('problem', str(number)) for number in range(2)]
+        with freeze_time(datetime.datetime(2050, 1, 1, tzinfo=UTC)):
+            for user in (self.user, self.other_user):
+                BlockCompletion.objects.submit_batch_completion(
+                    user, [(block_key, 1.0) for block_key in self.blocks + self.problems]
+                )
+        with freeze_time(datetime.datetime(2050, 1, 2, tzinfo=UTC)):
+            BlockCompletion.objects.submit_completion(self.user, self.problems[0], 0.5)
+        BlockCompletion.objects.submit_completion(
+            self.user, CourseKey.from_string('course-v1:edX+Other+2049_T2').make_usage_key('html', 'x'), 1.0
+        )
+
+
+class ExportTestCase(ExportSetUpMixin, TestCase):
+    """
+    Test that the completions of a learning context are exported page by page.
+    """
+
+    def _expected(self, **filters):
+        return sorted(
+            (completion.user_id, str(completion.block_key), completion.block_type, completion.completion,
+             completion.modified)
+            for completion in BlockCompletion.objects.filter(context_key=self.course_key, **filters)
+        )
+
+    def test_export_pages(self):
+        for batch_size in (1, 3, 10, 1000):
+            rows = list(iter_context_completions(self.course_key, batch_size=batch_size))
+            self.assertEqual(len(rows), 10)
+            self.assertEqual(sorted(rows), self._expected())
+
+    def test_pages_are_single_queries(self):
+        with self.assertNumQueries(4):
+            list(iter_context_completions(self.course_key, batch_size=3))
+
+    def test_filters(self):
+        rows = list(iter_context_completions(self.course_key, block_types=['problem'], batch_size=1))
+        self.assertEqual(sorted(rows), self._expected(block_type='problem'))
+        rows = list(iter_context_completions(
+            self.course_key,
+            modified_after=datetime.datetime(2050, 1, 2, tzinfo=UTC),
+            modified_before=datetime.datetime(2050, 1, 3, tzinfo=UTC),
+        ))
+        self.assertEqual(rows, [
+            (self.user.id, str(self.problems[0]), 'problem', 0.5, datetime.datetime(2050, 1, 2, tzinfo=UTC)),
+        ])
+
+    def test_formats(self):
+        rows = list(iter_context_completions(self.course_key, block_types=['problem']))
+        records = [json.loads(line) for line in iter_ndjson(rows)]
+        self.assertEqual(records[0], dict(zip(EXPORT_FIELDS, rows[0][:4] + (rows[0][4].isoformat(),))))
+        lines = list(csv.reader(''.join(iter_csv(rows)).splitlines()))
+        self.assertEqual(lines[0], list(EXPORT_FIELDS))
+        self.assertEqual(len(lines), len(rows) + 1)
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'export_completions', str(self.course_key), '--format', 'csv', '--block-type', 'problem',
+            '--modified-after', '2050-01-02T00:00:00', '--batch-size', '1', stdout=out,
+        )
+        self.assertEqual(out.getvalue().splitlines(), [
+            ','.join(EXPORT_FIELDS),
+            f'{self.user.id},{self.problems[0]},problem,0.5,2050-01-02T00:00:00+00:00',
+        ])
+
+
+class CompletionMatrixTestCase(ExportSetUpMixin, TestCase):
+    """
+    Test that every learner's completions in a learning context are streamed page by page.
+    """
+
+    def test_matrix(self):
+        rows = list(iter_completion_matrix(self.course_key, batch_size=3))
+        self.assertEqual(sorted(rows), sorted(
+            (completion.user.username, str(completion.block_key), completion.completion)
+            for completion in BlockCompletion.objects.filter(context_key=self.course_key)
+        ))
+        rows = list(iter_completion_matrix(self.course_key, block_types=['problem']))
+        self.assertEqual(rows, [
+            (self.user.username, str(self.problems[0]), 0.5),
+            (self.user.username, str(self.problems[1]), 1.0),
+            (self.other_user.username, str(self.problems[0]), 1.0),
+            (self.other_user.username, str(self.problems[1]), 1.0),
+        ])
+
+    def test_first_row_is_one_query(self):
+        rows = iter_completion_matrix(self.course_key, batch_size=2)
+        with self.assertNumQueries(1):
+            next(rows)
+            next(rows)
+
+    def test_formats(self):
+        rows = list(iter_completion_matrix(self.course_key, block_types=['problem']))
+        self.assertEqual(json.loads(next(iter_ndjson(rows, MATRIX_FIELDS))), {
+            'username': self.user.username, 'block_key': str(self.problems[0]), 'completion': 0.5,
+        })
+        lines = list(csv.reader(''.join(iter_csv(rows, MATRIX_FIELDS)).splitlines()))
+        self.assertEqual(lines[:2], [list(MATRIX_FIELDS), [self.user.username, str(self.problems[0]), '0.5']])
+
+
+class ExportMemoryTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that the memory used by an export does not grow with the size of the learning context.
+
+    A million-row course would take too long to create here, so exports of two
+    courses, one ten times larger than the other, are compared instead.
+    """
+    BATCH_SIZE = 500
+
+    def _create_course(self, name, rows):
+        course_key = CourseKey.from_string(f'course-v1:edX+{name}+run')
+        bulk_create_completions_for_testing([self.user], course_key, rows)
+        return course_key
+
+    def _peak_memory(self, course_key):
+        """
+        Return the peak memory allocated while exporting a course as NDJSON.
+        """
+        tracemalloc.start()
+        try:
+            for _ in iter_ndjson(iter_context_completions(course_key, batch_size=self.BATCH_SIZE)):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_memory_is_flat(self):
+        small = self._create_course('Small', 2000)
+        large = self._create_course('Large', 20000)
+        self._peak_memory(small)  # warm up
+        self.assertLess(self._peak_memory(large), self._peak_memory(small) * 1.5)
+
+
+class CompletionMatrixMemoryTestCase(TestCase):
+    """
+    Test that the memory used by the completion matrix does not grow with the number of learners.
+    """
+    BLOCKS = 10
+
+    def _create_course(self, name, learners):
+        course_key = CourseKey.from_string(f'course-v1:edX+{name}+run')
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'{name}-{number}') for number in range(learners)
+        )
+        bulk_create_completions_for_testing(users, course_key, self.BLOCKS)
+        return course_key
+
+    def _peak_memory(self, course_key):
+        """
+        Return the peak memory allocated while streaming the matrix of a course as CSV.
+        """
+        tracemalloc.start()
+        try:
+            for _ in iter_csv(iter_completion_matrix(course_key, batch_size=500), MATRIX_FIELDS):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_memory_is_flat(self):
+        small = self._create_course('Small', 200)
+        large = self._create_course('Large', 2000)
+        self._peak_memory(small)  # warm up
+        self.assertLess(self._peak_memory(large), self._peak_memory(small) * 1.5)
@@ -0,0 +1,150 @@
+"""
+Tests of the score-changed signal handler.
+"""
+
+from unittest.mock import patch
+
+import ddt
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError
+from django.test import TestCase
+from django.test.utils import override_settings
+from opaque_keys.edx.keys import CourseKey
+from xblock.completable import XBlockCompletionMode
+from xblock.core import XBlock
+
+from .. import handlers
+from ..models import BlockCompletion
+from ..policies import clear_block_policies
+from ..test_utils import CompletionSetUpMixin, EventTrackingTestCase
+from ..workers import BoundedWorkerPool
+
+_executed = []
+
+
+def record_executor(func, **kwargs):
+    """
+    A stand-in for a task queue's submit function.
+    """
+    _executed.append(kwargs)
+    func(**kwargs)
+
+
+class ScorableBlock(XBlock):
+    """
+    A block that is completed by being scored.
+    """
+    completion_mode = XBlockCompletionMode.COMPLETABLE
+    has_score = True
+
+
+@ddt.ddt
+class ScoreHandlerTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test that scoring a block submits a completion in each dispatch mode.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.block_key = self.course_key.make_usage_key('problem', 'answer')
+        load_class = patch.object(XBlock, 'load_class', return_value=ScorableBlock)
+        self.load_class = load_class.start()
+        self.addCleanup(load_class.stop)
+        clear_block_policies()
+        self.addCleanup(clear_block_policies)
+        _executed.clear()
+
+    def _score(self, **kwargs):
+        handlers.scorable_block_completion(
+            sender=None,
+            user_id=self.user.id,
+            course_id=str(self.course_key),
+            usage_id=str(self.block_key),
+            **kwargs
+        )
+
+    def _completion(self):
+        return BlockCompletion.objects.get(user=self.user, block_key=self.block_key).completion
+
+    def test_inline(self):
+        self._score()
+        self.assertEqual(self._completion(), 1.0)
+        self._score(score_deleted=True)
+        self.assertEqual(self._completion(), 0.0)
+
+    def test_block_type_is_loaded_once(self):
+        for _ in range(50):
+            self._score()
+        self.load_class.assert_called_once_with('problem')
+
+    def test_grader_response_is_ignored(self):
+        self._score(grader_response=True)
+        self.assertFalse(BlockCompletion.objects.exists())
+
+    @override_settings(COMPLETION_SCORE_HANDLER_DISPATCH='pool')
+    def test_pool_waits_for_commit(self):
+        pool = BoundedWorkerPool('test-scores', workers=1)
+        self.addCleanup(pool.drain)
+        with patch.object(handlers, 'get_handler_pool', return_value=pool):
+            with patch.object(handlers, '_submit_on_worker') as submit_on_worker:
+                with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                    self._score()
+                    submit_on_worker.assert_not_called()
+                pool.join()
+        self.assertEqual(len(callbacks), 1)
+        submit_on_worker.assert_called_once_with({
+            'user_id': self.user.id,
+            'course_id': str(self.course_key),
+            'usage_id': str(self.block_key),
+            'score_deleted': False,
+        })
+
+    @override_settings(COMPLETION_SCORE_HANDLER_DISPATCH='pool')
+    def test_pool_full_runs_in_process(self):
+        with patch.object(handlers, 'get_handler_pool') as get_handler_pool:
+            get_handler_pool.return_value.submit.return_value = False
+            with self.captureOnCommitCallbacks(execute=True):
+                self._score()
+        self.assertEqual(self._completion(), 1.0)
+
+    @override_settings(
+        COMPLETION_SCORE_HANDLER_DISPATCH='executor',
+        COMPLETION_SCORE_HANDLER_EXECUTOR='completion.tests.test_handlers.record_executor',
+    )
+    def test_executor(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._score()
+            self.assertEqual(_executed, [])
+        self.assertEqual(len(_executed), 1)
+        self.assertEqual(_executed[0]['retries'], 3)
+        self.assertEqual(self._completion(), 1.0)
+
+    @ddt.data(None, 'completion.tests.test_handlers.missing_executor')
+    @override_settings(COMPLETION_SCORE_HANDLER_DISPATCH='executor')
+    def test_invalid_executor_fails_at_startup(self, executor):
+        with override_settings(COMPLETION_SCORE_HANDLER_EXECUTOR=executor):
+            with self.assertRaises(ImproperlyConfigured):
+                apps.get_app_config('completion').ready()
+
+    @patch.object(handlers, 'close_old_connections')
+    @patch('time.sleep')
+    def test_retries_database_errors(self, sleep, close_old_connections):
+        with patch.object(BlockCompletion.objects, 'submit_completion', side_effect=[OperationalError, None]) as mock:
+            handlers.submit_score_completion(self.user.id, str(self.course_key), str(self.block_key), retries=1)
+        self.assertEqual(mock.call_count, 2)
+        close_old_connections.assert_called_once_with()
+        sleep.assert_called_once_with(0.1)
+
+    @override_settings(COMPLETION_SCORE_HANDLER_RETRY_DELAY=0.5)
+    @patch.object(handlers, 'close_old_connections')
+    @patch('time.sleep')
+    def test_gives_up_after_retries(self, sleep, close_old_connections):
+        with patch.object(BlockCompletion.objects, 'submit_completion', side_effect=OperationalError) as mock:
+            with self.assertRaises(OperationalError):
+                handlers.submit_score_completion(self.user.id, str(self.course_key), str(self.block_key), retries=2)
+        self.assertEqual(mock.call_count, 3)
+        self.assertEqual(close_old_connections.call_count, 2)
+        self.assertEqual([call.args for call in sleep.call_args_list], [(0.5,), (1.0,)])
@@ -0,0 +1,128 @@
+"""
+Tests of the key interning caches.
+"""
+
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from opaque_keys import InvalidKeyError
+from opaque_keys.edx.keys import CourseKey, UsageKey
+
+from .. import keys
+from ..models import BlockCompletion
+from ..test_utils import CompletionSetUpMixin, bulk_create_completions_for_testing
+
+
+class KeyCacheTestCase(TestCase):
+    """
+    Test that parsed keys are interned in bounded LRU caches.
+    """
+
+    def setUp(self):
+        super().setUp()
+        keys.clear()
+        self.addCleanup(keys.clear)
+
+    def test_interning(self):
+        serialized = 'block-v1:edX+MOOC101+2049_T2+type@html+block@1'
+        parsed = keys.parse_usage_key(serialized)
+        self.assertEqual(parsed, UsageKey.from_string(serialized))
+        self.assertIs(keys.parse_usage_key(serialized), parsed)
+        self.assertEqual(keys.parse_context_key('course-v1:edX+MOOC101+2049_T2'), parsed.context_key)
+        self.assertEqual(keys.stats()['usage_keys'], {'hits': 1, 'misses': 1, 'size': 1})
+        self.assertEqual(keys.stats()['context_keys'], {'hits': 0, 'misses': 1, 'size': 1})
+
+    def test_fill_in_run(self):
+        course_key = CourseKey.from_string('edX/MOOC101/2050_T2')
+        block_key = UsageKey.from_string('i4x://edX/MOOC101/video/1')
+        full_block_key = keys.fill_in_run(block_key, course_key)
+        self.assertEqual(full_block_key, block_key.replace(course_key=course_key))
+        self.assertIs(keys.fill_in_run(block_key, course_key), full_block_key)
+        self.assertIs(keys.fill_in_run(full_block_key, course_key), full_block_key)
+        self.assertEqual(keys.stats()['full_block_keys'], {'hits': 1, 'misses': 1, 'size': 1})
+
+    def test_invalid_keys_are_not_cached(self):
+        for _ in range(2):
+            with self.assertRaises(InvalidKeyError):
+                keys.parse_usage_key('not a key')
+        self.assertEqual(keys.stats()['usage_keys'], {'hits': 0, 'misses': 2, 'size': 0})
+
+    @override_settings(COMPLETION_KEY_CACHE_SIZE=2)
+    def test_least_recently_used_keys_are_evicted(self):
+        first, second, third = (f'course-v1:edX+MOOC{number}+run' for number in range(3))
+        keys.parse_context_key(first)
+        keys.parse_context_key(second)
+        keys.parse_context_key(first)
+        keys.parse_context_key(third)
+        keys.parse_context_key(first)
+        keys.parse_context_key(second)
+        self.assertEqual(keys.stats()['context_keys'], {'hits': 2, 'misses': 4, 'size': 2})
+
+    @override_settings(COMPLETION_KEY_CACHE_SIZE=0)
+    def test_disabled(self):
+        keys.parse_context_key('course-v1:edX+MOOC101+2049_T2')
+        keys.parse_context_key('course-v1:edX+MOOC101+2049_T2')
+        self.assertEqual(keys.stats()['context_keys'], {'hits': 0, 'misses': 2, 'size': 0})
+
+    @override_settings(COMPLETION_KEY_CACHE_SIZE=50)
+    def test_threads(self):
+        serialized = [f'block-v1:edX+MOOC101+2049_T2+type@html+block@{number}' for number in range(100)]
+        results = []
+
+        def parse():
+            results.append([keys.parse_usage_key(key) for key in serialized * 5])
+
+        threads = [threading.Thread(target=parse) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = keys.stats()['usage_keys']
+        self.assertEqual(stats['hits'] + stats['misses'], 8 * 500)
+        self.assertEqual(stats['size'], 50)
+        for parsed in results:
+            self.assertEqual([str(key) for key in parsed], serialized * 5)
+
+
+class KeyCacheReuseTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that keys parsed once are not parsed again with a warm cache.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+    BLOCKS = 500
+    BATCH = 100
+
+    def setUp(self):
+        super().setUp()
+        keys.clear()
+        self.addCleanup(keys.clear)
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.serialized = [str(self.course_key.make_usage_key('html', str(number))) for number in range(self.BLOCKS)]
+        # pylint: disable=protected-access
+        patcher = patch.object(keys._usage_keys, '_load', wraps=UsageKey.from_string)
+        self.parse = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batch(self):
+        def parse_batch():
+            return [keys.parse_usage_key(key) for key in self.serialized[:self.BATCH]]
+
+        parsed = parse_batch()
+        self.assertEqual(self.parse.call_count, self.BATCH)
+        warm_parsed = parse_batch()
+        self.assertEqual(self.parse.call_count, self.BATCH)
+        self.assertEqual(keys.stats()['usage_keys'], {'hits': self.BATCH, 'misses': self.BATCH, 'size': self.BATCH})
+        self.assertTrue(all(warm is cold for warm, cold in zip(warm_parsed, parsed)))
+
+    def test_course_map(self):
+        bulk_create_completions_for_testing([self.user], self.course_key, self.BLOCKS)
+        completions = BlockCompletion.get_learning_context_completions(self.user, self.course_key)
+        self.assertEqual(keys.stats()['usage_keys']['misses'], self.BLOCKS)
+        self.assertEqual(self.parse.call_count, self.BLOCKS)
+        warm_completions = BlockCompletion.get_learning_context_completions(self.user, self.course_key)
+        self.assertEqual(keys.stats()['usage_keys']['hits'], self.BLOCKS)
+        self.assertEqual(self.parse.call_count, self.BLOCKS)
+        self.assertEqual(warm_completions, completions)
+        self.assertEqual(len(completions), self.BLOCKS)
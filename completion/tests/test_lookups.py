@@ -0,0 +1,123 @@
+"""
+Tests of the memoized user and enrollment lookups of completion batches.
+"""
+
+import datetime
+from unittest.mock import Mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from freezegun import freeze_time
+from opaque_keys.edx.keys import CourseKey
+
+from .. import handlers, lookups
+from ..batch import submit_completion_groups
+from ..test_utils import CompletionSetUpMixin, UserFactory
+
+
+@override_settings(COMPLETION_LOOKUP_CACHE_TIMEOUT=30)
+class LookupCacheTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that repeated batches do not look up the same users and enrollments again.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        lookups.clear()
+        self.addCleanup(lookups.clear)
+        self.other_user = UserFactory()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.enrollments = {(self.user.id, self.course_key), (self.other_user.id, self.course_key)}
+        self.enrollment_lookups = []
+
+    def load_enrolled(self, course_user_ids):
+        self.enrollment_lookups.append(course_user_ids)
+        return course_user_ids & self.enrollments
+
+    def _submit(self, *users, completion=1.0):
+        groups = [
+            {
+                'username': user if isinstance(user, str) else user.username,
+                'course_key': str(self.course_key),
+                'blocks': {str(self.course_key.make_usage_key('html', 'intro')): completion},
+            }
+            for user in users
+        ]
+        return [report['status'] for report in submit_completion_groups(groups, self.load_enrolled)]
+
+    def test_repeated_batch(self):
+        # Queries of the users and the existing completions, and a single insert, with the savepoints around it.
+        with self.assertNumQueries(7):
+            self.assertEqual(self._submit(self.user, self.other_user), [200, 200])
+        # The users are not looked up again.
+        with self.assertNumQueries(4):
+            self.assertEqual(self._submit(self.user, self.other_user, completion=0.5), [200, 200])
+        with self.assertNumQueries(3):
+            self.assertEqual(self._submit(self.user, self.other_user, completion=0.5), [200, 200])
+        self.assertEqual(self.enrollment_lookups, [self.enrollments])
+
+    def test_only_missing_entries_are_looked_up(self):
+        self._submit(self.user)
+        third_user = UserFactory()
+        self.enrollments.add((third_user.id, self.course_key))
+        self._submit(self.user, third_user)
+        self.assertEqual(self.enrollment_lookups, [
+            {(self.user.id, self.course_key)}, {(third_user.id, self.course_key)},
+        ])
+        self.assertEqual(lookups.get_user_ids({self.user.username, third_user.username}, Mock()), {
+            self.user.username: self.user.id, third_user.username: third_user.id,
+        })
+
+    def test_misses_are_not_cached(self):
+        self.enrollments.clear()
+        self.assertEqual(self._submit(self.user, 'nobody'), [400, 404])
+        new_user = UserFactory(username='nobody')
+        self.enrollments.update({(self.user.id, self.course_key), (new_user.id, self.course_key)})
+        self.assertEqual(self._submit(self.user, 'nobody'), [200, 200])
+
+    def test_invalidate_enrollment(self):
+        self._submit(self.user)
+        self.enrollments.clear()
+        self.assertEqual(self._submit(self.user), [200])
+        handlers.enrollment_status_changed(None, event='edx.course.enrollment.deactivated', user=self.user,
+                                           course_id=self.course_key)
+        self.assertEqual(self._submit(self.user), [400])
+
+    def test_invalidate_usernames(self):
+        self._submit(self.user)
+        self.user.__class__.objects.filter(pk=self.user.pk).update(username='renamed')
+        self.assertEqual(self._submit(self.user.username), [200])
+        lookups.invalidate_usernames(self.user.username)
+        self.assertEqual(self._submit(self.user.username), [404])
+
+    def test_rename(self):
+        old_username = self.user.username
+        self._submit(self.user)
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self._submit(old_username), [404])
+        reused = UserFactory(username=old_username)
+        self.enrollments.add((reused.id, self.course_key))
+        self.assertEqual(self._submit(old_username, 'renamed'), [200, 200])
+        self.assertEqual(lookups.get_user_ids({old_username, 'renamed'}, Mock()), {
+            old_username: reused.id, 'renamed': self.user.id,
+        })
+
+    def test_expiry(self):
+        with freeze_time(datetime.datetime(2050, 1, 1)):
+            self._submit(self.user)
+        with freeze_time(datetime.datetime(2050, 1, 1, 0, 0, 29)):
+            self._submit(self.user)
+        self.assertEqual(len(self.enrollment_lookups), 1)
+        with freeze_time(datetime.datetime(2050, 1, 1, 0, 0, 31)):
+            with self.assertNumQueries(4):
+                self._submit(self.user)
+        self.assertEqual(len(self.enrollment_lookups), 2)
+
+    @override_settings(COMPLETION_LOOKUP_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        self._submit(self.user)
+        with self.assertNumQueries(4):
+            self._submit(self.user)
+        self.assertEqual(len(self.enrollment_lookups), 2)
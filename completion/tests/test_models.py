@@ -2,19 +2,38 @@
 Test models, managers, and validators.
 """
 
+import asyncio
 import datetime
+from io import StringIO
 from random import randint
+from unittest.mock import patch
 from uuid import uuid4
 from pytz import UTC
 
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 
+import ddt
+
+from asgiref.sync import sync_to_async
+from eventtracking import tracker
+from eventtracking.django import DjangoTracker
 from freezegun import freeze_time
 from opaque_keys.edx.keys import CourseKey, UsageKey
 
 from .. import models
-from ..test_utils import CompletionSetUpMixin, EventTrackingTestCase, UserFactory, submit_completions_for_testing
+from ..test_utils import (
+    IN_MEMORY_BACKEND_CONFIG,
+    CompletionSetUpMixin,
+    EventTrackingTestCase,
+    UserFactory,
+    bulk_create_completions_for_testing,
+    submit_completions_for_testing,
+)
 
 
 class PercentValidatorTestCase(TestCase):
@@ -43,7 +62,7 @@ class SubmitCompletionTestCase(CompletionSetUpMixin, EventTrackingTestCase, Test
         self.set_up_completion()
 
     def test_changed_value(self):
-        with self.assertNumQueries(7):  # 2 * Get, update, 2 * savepoints, 2 * exists checks
+        with self.assertNumQueries(6):  # Get, update, 2 * savepoints, 2 * exists checks
             completion, isnew = models.BlockCompletion.objects.submit_completion(
                 user=self.user,
                 block_key=self.block_key,
@@ -55,7 +74,7 @@ class SubmitCompletionTestCase(CompletionSetUpMixin, EventTrackingTestCase, Test
         self.assertEqual(models.BlockCompletion.objects.count(), 1)
 
     def test_unchanged_value(self):
-        with self.assertNumQueries(4):  # 2 * Get + 2 * savepoints
+        with self.assertNumQueries(3):  # Get + 2 * savepoints
             completion, isnew = models.BlockCompletion.objects.submit_completion(
                 user=self.user,
                 block_key=self.block_key,
@@ -118,6 +137,247 @@ class SubmitCompletionTestCase(CompletionSetUpMixin, EventTrackingTestCase, Test
         self.assertEqual(model.completion, 1.0)
 
 
+@override_settings(COMPLETION_UPSERT_ENABLED=True)
+class SubmitCompletionUpsertTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test submit_completion when completions are written with a single upsert statement.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.set_up_completion()
+
+    def _submit(self, user, block_key, completion):
+        """
+        Submit a completion, returning its result and the SQL statements that were executed.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            result = models.BlockCompletion.objects.submit_completion(
+                user=user,
+                block_key=block_key,
+                completion=completion,
+            )
+        return result, [query['sql'] for query in queries.captured_queries]
+
+    def _writes(self, statements):
+        return [sql for sql in statements if sql.startswith(('INSERT', 'UPDATE'))]
+
+    def test_changed_value(self):
+        (completion, isnew), statements = self._submit(self.user, self.block_key, 0.9)
+        self.assertFalse(isnew)
+        self.assertEqual(completion.completion, 0.9)
+        self.assertGreater(completion.modified, self.completion.modified)
+        self.assertEqual(models.BlockCompletion.objects.get(pk=self.completion.pk).completion, 0.9)
+        self.assertEqual(len(statements), 2)  # upsert, get
+        self.assertEqual(len(self._writes(statements)), 1)
+
+    def test_unchanged_value(self):
+        (completion, isnew), _ = self._submit(self.user, self.block_key, 0.5)
+        self.assertFalse(isnew)
+        self.assertEqual(completion.modified, self.completion.modified)
+        self.assertEqual(models.BlockCompletion.objects.count(), 1)
+
+    def test_new_block(self):
+        newblock = UsageKey.from_string('block-v1:edx+test+run+type@video+block@puppers')
+        (completion, isnew), statements = self._submit(self.user, newblock, 1.0)
+        self.assertTrue(isnew)
+        self.assertEqual(completion.block_key, newblock)
+        self.assertEqual(completion.block_type, 'video')
+        self.assertEqual(completion.context_key, newblock.context_key)
+        self.assertEqual(models.BlockCompletion.objects.count(), 2)
+        self.assertEqual(len(statements), 2)  # upsert, get
+
+    def test_old_mongo_block_key(self):
+        course_key = CourseKey.from_string('edX/MOOC101/2050_T2')
+        block_key = UsageKey.from_string('i4x://edX/MOOC101/video/0').replace(course_key=course_key)
+        (_, isnew), _ = self._submit(self.user, block_key, 0.5)
+        self.assertTrue(isnew)
+        (_, isnew), _ = self._submit(self.user, block_key, 1.0)
+        self.assertFalse(isnew)
+        self.assertEqual(
+            models.BlockCompletion.get_learning_context_completions(self.user, course_key),
+            {block_key: 1.0},
+        )
+
+    def test_invalid_completion(self):
+        with self.assertRaises(ValidationError):
+            self._submit(self.user, self.block_key, 1.2)
+        self.assertEqual(models.BlockCompletion.objects.get(pk=self.completion.pk).completion, 0.5)
+
+    def test_emits_tracking_log(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._submit(self.user, self.block_key, 1.0)
+        events = self.tracker.backends['mem'].events
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['data']['completion'], 1.0)
+
+    def test_contention_does_not_fall_back(self):
+        """
+        Simulate another process creating the row after get_or_create looked
+        for it, which is what happens under concurrent grading.
+        """
+        newblock = UsageKey.from_string('block-v1:edx+test+run+type@video+block@puppers')
+
+        def racing_get_or_create(*args, **kwargs):
+            raise IntegrityError('Duplicate entry')
+
+        statements = {}
+        for upsert_enabled in (False, True):
+            models.BlockCompletion.objects.filter(block_key=newblock).delete()
+            models.BlockCompletion.objects.create(
+                user=self.user, context_key=newblock.context_key, block_key=newblock, block_type='video',
+                completion=0.0,
+            )
+            with override_settings(COMPLETION_UPSERT_ENABLED=upsert_enabled):
+                with patch.object(models.BlockCompletionManager, 'get_or_create', racing_get_or_create):
+                    with patch.object(models.log, 'info') as log_info:
+                        (_, isnew), statements[upsert_enabled] = self._submit(self.user, newblock, 1.0)
+            self.assertFalse(isnew)
+            self.assertEqual(models.BlockCompletion.objects.get(block_key=newblock).completion, 1.0)
+            self.assertEqual(log_info.called, not upsert_enabled)
+        self.assertLess(len(statements[True]), len(statements[False]))
+
+
+@ddt.ddt
+class SubmitBatchCompletionTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test that BlockCompletion.objects.submit_batch_completion writes in bulk.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.set_up_completion()
+
+    def _make_blocks(self, count):
+        return [
+            UsageKey.from_string(f'block-v1:edx+test+run+type@problem+block@{uuid4().hex}')
+            for _ in range(count)
+        ]
+
+    def test_returns_new_and_existing_completions(self):
+        new_block = self._make_blocks(1)[0]
+        result = models.BlockCompletion.objects.submit_batch_completion(
+            self.user, [(self.block_key, 1.0), (new_block, 0.25)]
+        )
+        self.assertEqual(
+            {(completion.block_key, completion.completion): is_new for completion, is_new in result.items()},
+            {(self.block_key, 1.0): False, (new_block, 0.25): True},
+        )
+        self.assertTrue(all(completion.pk for completion in result))
+        self.assertEqual(models.BlockCompletion.objects.get(block_key=self.block_key).completion, 1.0)
+        self.assertEqual(models.BlockCompletion.objects.get(block_key=new_block).completion, 0.25)
+        self.assertEqual(models.BlockCompletion.objects.count(), 2)
+
+    def test_unchanged_value_is_not_updated(self):
+        modified = models.BlockCompletion.objects.get(block_key=self.block_key).modified
+        models.BlockCompletion.objects.submit_batch_completion(self.user, [(self.block_key, 0.5)])
+        self.assertEqual(models.BlockCompletion.objects.get(block_key=self.block_key).modified, modified)
+
+    def test_last_submission_for_a_block_wins(self):
+        new_block = self._make_blocks(1)[0]
+        result = models.BlockCompletion.objects.submit_batch_completion(
+            self.user, [(new_block, 0.25), (new_block, 0.75)]
+        )
+        self.assertEqual(len(result), 1)
+        self.assertEqual(models.BlockCompletion.objects.get(block_key=new_block).completion, 0.75)
+
+    def test_old_mongo_block_keys(self):
+        course_key = CourseKey.from_string('edX/MOOC101/2050_T2')
+        block_key = UsageKey.from_string('i4x://edX/MOOC101/video/0').replace(course_key=course_key)
+        models.BlockCompletion.objects.submit_batch_completion(self.user, [(block_key, 0.5)])
+        result = models.BlockCompletion.objects.submit_batch_completion(self.user, [(block_key, 1.0)])
+        self.assertEqual(list(result.values()), [False])
+        self.assertEqual(
+            models.BlockCompletion.get_learning_context_completions(self.user, course_key),
+            {block_key: 1.0},
+        )
+
+    def test_invalid_completion_writes_nothing(self):
+        new_block = self._make_blocks(1)[0]
+        with self.assertRaises(ValidationError):
+            models.BlockCompletion.objects.submit_batch_completion(
+                self.user, [(new_block, 1.0), (self.block_key, 1.2)]
+            )
+        self.assertEqual(models.BlockCompletion.objects.count(), 1)
+        self.assertEqual(models.BlockCompletion.objects.get(block_key=self.block_key).completion, 0.5)
+
+    def test_emits_tracking_log_per_block(self):
+        blocks = self._make_blocks(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            models.BlockCompletion.objects.submit_batch_completion(self.user, [(block, 1.0) for block in blocks])
+        events = self.tracker.backends['mem'].events
+        self.assertEqual(
+            {event['data']['block_id'] for event in events},
+            {str(block) for block in blocks},
+        )
+        self.assertTrue(all(event['data']['user_id'] == self.user.id for event in events))
+
+    @ddt.data(1, 10, 100)
+    def test_query_count_is_constant(self, batch_size):
+        existing_blocks = self._make_blocks(batch_size)
+        models.BlockCompletion.objects.submit_batch_completion(self.user, [(block, 0.5) for block in existing_blocks])
+        blocks = [(block, 1.0) for block in existing_blocks] + [(block, 1.0) for block in self._make_blocks(batch_size)]
+        # savepoint, select, savepoint, insert, release, update, release
+        with self.assertNumQueries(7):
+            models.BlockCompletion.objects.submit_batch_completion(self.user, blocks)
+        self.assertEqual(models.BlockCompletion.objects.filter(user=self.user, completion=1.0).count(), 2 * batch_size)
+
+
+class AsyncCompletionTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test the async versions of the BlockCompletion read and write methods.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+    LEARNERS = 20
+
+    def setUp(self):
+        super().setUp()
+        self.set_up_completion()
+
+    async def test_asubmit_completion(self):
+        completion, is_new = await models.BlockCompletion.objects.asubmit_completion(self.user, self.block_key, 1.0)
+        self.assertFalse(is_new)
+        self.assertEqual(completion.completion, 1.0)
+        self.assertEqual(
+            await models.BlockCompletion.aget_learning_context_completions(self.user, self.context_key),
+            {self.block_key: 1.0},
+        )
+
+    async def test_asubmit_batch_completion(self):
+        new_block = UsageKey.from_string('block-v1:edx+test+run+type@video+block@puppers')
+        result = await models.BlockCompletion.objects.asubmit_batch_completion(
+            self.user, [(self.block_key, 1.0), (new_block, 0.5)]
+        )
+        self.assertEqual(sorted(result.values()), [False, True])
+        self.assertEqual(
+            await models.BlockCompletion.aget_learning_context_completions(self.user, self.context_key),
+            {self.block_key: 1.0, new_block: 0.5},
+        )
+
+    async def test_aget_latest_block_completed(self):
+        latest = await models.BlockCompletion.aget_latest_block_completed(self.user, self.context_key)
+        self.assertEqual(latest.block_key, self.block_key)
+        other_course = CourseKey.from_string('course-v1:edx+other+run')
+        self.assertIsNone(await models.BlockCompletion.aget_latest_block_completed(self.user, other_course))
+
+    async def test_concurrent_learners(self):
+        """
+        Run many simulated learners, each writing and then reading its completions, concurrently.
+        """
+        users = [await sync_to_async(UserFactory)() for _ in range(self.LEARNERS)]
+        blocks = [self.context_key.make_usage_key('html', str(number)) for number in range(5)]
+
+        async def learner(user):
+            for block in blocks:
+                await models.BlockCompletion.objects.asubmit_completion(user, block, 1.0)
+            return await models.BlockCompletion.aget_learning_context_completions(user, self.context_key)
+
+        results = await asyncio.gather(*(learner(user) for user in users))
+        self.assertEqual(results, [dict.fromkeys(blocks, 1.0)] * self.LEARNERS)
+
+
 class CompletionDisabledTestCase(CompletionSetUpMixin, TestCase):
     """
     Test that completion is not track when the feature switch is disabled.
@@ -218,6 +478,351 @@ class CompletionFetchingTestCase(CompletionSetUpMixin, TestCase):
             }
         )
 
+    def test_latest_blocks_completed_excludes_libraries(self):
+        library_block_key = UsageKey.from_string('lb:edX:library:html:1')
+        legacy_library_block_key = UsageKey.from_string('lib-block-v1:edX+library+type@html+block@1')
+        with freeze_time(datetime.datetime(2050, 2, 1, tzinfo=UTC)):
+            submit_completions_for_testing(self.user_one, [library_block_key, legacy_library_block_key])
+        self.assertEqual(
+            set(models.BlockCompletion.latest_blocks_completed_all_courses(self.user_one)),
+            {self.course_key_one, self.course_key_two},
+        )
+
+    def test_latest_blocks_completed_ordering_and_limit(self):
+        self.assertEqual(
+            list(models.BlockCompletion.latest_blocks_completed_all_courses(self.user_one)),
+            [self.course_key_two, self.course_key_one],
+        )
+        self.assertEqual(
+            list(models.BlockCompletion.latest_blocks_completed_all_courses(self.user_one, ordering='modified')),
+            [self.course_key_one, self.course_key_two],
+        )
+        self.assertEqual(
+            models.BlockCompletion.latest_blocks_completed_all_courses(self.user_one, limit=1),
+            {self.course_key_two: (datetime.datetime(2050, 1, 10, tzinfo=UTC), self.block_keys_two[2])},
+        )
+        self.assertEqual(models.BlockCompletion.latest_blocks_completed_all_courses(self.user_two.id, limit=0), {})
+        with self.assertRaises(ValueError):
+            models.BlockCompletion.latest_blocks_completed_all_courses(self.user_one, ordering='block_key')
+
+    def test_latest_blocks_completed_breaks_ties(self):
+        with freeze_time(datetime.datetime(2050, 1, 3, tzinfo=UTC)):
+            models.BlockCompletion.objects.submit_completion(self.user_one, self.block_keys_one[4], 1.0)
+            models.BlockCompletion.objects.submit_completion(self.user_one, self.block_keys_one[3], 1.0)
+        for _ in range(3):
+            self.assertEqual(
+                models.BlockCompletion.latest_blocks_completed_all_courses(self.user_one)[self.course_key_one],
+                (datetime.datetime(2050, 1, 3, tzinfo=UTC), self.block_keys_one[3]),
+            )
+
+
+@override_settings(COMPLETION_SUMMARIES_ENABLED=True, COMPLETION_SUMMARY_READS_ENABLED=True)
+class CompletionSummaryFetchingTestCase(CompletionFetchingTestCase):
+    """
+    Run the fetching tests against the completion summaries.
+    """
+
+    def test_latest_reads_are_single_queries(self):
+        with self.assertNumQueries(1):
+            models.BlockCompletion.get_latest_block_completed(self.user_one, self.course_key_one)
+        with self.assertNumQueries(1):
+            models.BlockCompletion.latest_blocks_completed_all_courses(self.user_one)
+
+    async def test_aget_latest_block_completed(self):
+        latest = await models.BlockCompletion.aget_latest_block_completed(self.user_one, self.course_key_one)
+        self.assertEqual(latest.block_key, self.block_keys_one[2])
+        self.assertIsNone(await models.BlockCompletion.aget_latest_block_completed(self.user_two, self.course_key_two))
+
+
+@override_settings(COMPLETION_SUMMARIES_ENABLED=True)
+class CompletionSummaryTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that completion summaries are maintained from block completion writes.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.context_key = CourseKey.from_string("course-v1:edX+MOOC202+2049_T2")
+        self.block_keys = [self.context_key.make_usage_key('html', str(number)) for number in range(4)]
+
+    def _summary(self, user=None):
+        return models.UserContextCompletionSummary.objects.get(user=user or self.user, context_key=self.context_key)
+
+    def _assert_summary(self, completed_count, completion_sum, last_block_key):
+        """
+        Assert the summary of self.user, and that a rebuild produces the same one.
+        """
+        for _ in range(2):
+            summary = self._summary()
+            self.assertEqual(summary.completed_count, completed_count)
+            self.assertAlmostEqual(summary.completion_sum, completion_sum)
+            self.assertEqual(summary.last_block_key, last_block_key)
+            self.assertEqual(summary.last_completion.block_key, last_block_key)
+            self.assertEqual(summary.last_modified, summary.last_completion.modified)
+            models.UserContextCompletionSummary.objects.rebuild(user_ids=[self.user.id])
+
+    def test_submit_completion(self):
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        self._assert_summary(1, 1.0, self.block_keys[0])
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[1], 0.5)
+        self._assert_summary(1, 1.5, self.block_keys[1])
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 0.25)
+        self._assert_summary(0, 0.75, self.block_keys[0])
+
+    def test_rebuild_locks_summaries_first(self):
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        with patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=QuerySet.select_for_update) as lock:
+            with CaptureQueriesContext(connection) as queries:
+                models.UserContextCompletionSummary.objects.rebuild(user_ids=[self.user.id])
+        self.assertEqual([call.args[0].model for call in lock.call_args_list], [models.UserContextCompletionSummary])
+        tables = [
+            table for query in queries for table in ('usercontextcompletionsummary', 'blockcompletion')
+            if query['sql'].startswith('SELECT') and f'FROM "completion_{table}"' in query['sql']
+        ]
+        self.assertEqual(tables[:2], ['usercontextcompletionsummary', 'blockcompletion'])
+
+    def test_unchanged_submission(self):
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[1], 1.0)
+        with patch.object(models.UserContextCompletionSummary.objects, 'apply_changes') as apply_changes:
+            models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        apply_changes.assert_not_called()
+        self._assert_summary(2, 2.0, self.block_keys[1])
+
+    @override_settings(COMPLETION_UPSERT_ENABLED=True)
+    def test_upsert(self):
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 0.5)
+        self._assert_summary(0, 0.5, self.block_keys[0])
+
+    def test_batch_and_group_completion(self):
+        other_user = UserFactory()
+        models.BlockCompletion.objects.submit_batch_completion(
+            self.user, [(self.block_keys[0], 1.0), (self.block_keys[1], 0.5), (self.block_keys[2], 1.0)]
+        )
+        self._assert_summary(2, 2.5, self.block_keys[2])
+        models.BlockCompletion.objects.submit_group_completion([self.user.id, other_user.id], self.block_keys[3], 1.0)
+        self._assert_summary(3, 3.5, self.block_keys[3])
+        self.assertEqual(self._summary(other_user).completed_count, 1)
+
+    def test_clear(self):
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        models.BlockCompletion.objects.clear_learning_context_completion(self.user, self.context_key)
+        self.assertFalse(models.UserContextCompletionSummary.objects.exists())
+        self.assertIsNone(models.BlockCompletion.get_latest_block_completed(self.user, self.context_key))
+
+    def test_disabled(self):
+        with override_settings(COMPLETION_SUMMARIES_ENABLED=False):
+            models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.assertFalse(models.UserContextCompletionSummary.objects.exists())
+
+    def test_reads_wait_for_backfill(self):
+        """
+        Completions written before summaries were maintained are still found
+        until summary reads are turned on.
+        """
+        with override_settings(COMPLETION_SUMMARIES_ENABLED=False):
+            models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        latest = models.BlockCompletion.get_latest_block_completed(self.user, self.context_key)
+        self.assertEqual(latest.block_key, self.block_keys[0])
+        self.assertEqual(list(models.BlockCompletion.latest_blocks_completed_all_courses(self.user)), [self.context_key])
+        with override_settings(COMPLETION_SUMMARY_READS_ENABLED=True):
+            self.assertIsNone(models.BlockCompletion.get_latest_block_completed(self.user, self.context_key))
+
+    def test_backfill_command(self):
+        other_user = UserFactory()
+        other_context_key = CourseKey.from_string("course-v1:edX+MOOC303+2049_T2")
+        with override_settings(COMPLETION_SUMMARIES_ENABLED=False):
+            models.BlockCompletion.objects.submit_batch_completion(
+                self.user, [(self.block_keys[0], 1.0), (self.block_keys[1], 0.5)]
+            )
+            models.BlockCompletion.objects.submit_completion(
+                other_user, other_context_key.make_usage_key('html', 'x'), 1.0
+            )
+        models.UserContextCompletionSummary.objects.create(
+            user=UserFactory(), context_key=self.context_key, last_block_key=self.block_keys[0],
+            last_modified=datetime.datetime(2050, 1, 1, tzinfo=UTC),
+        )
+        out = StringIO()
+        call_command('backfill_completion_summaries', '--batch-size', '1', stdout=out)
+        self.assertIn('Wrote 2 completion summaries for 2 users', out.getvalue())
+        self.assertEqual(models.UserContextCompletionSummary.objects.count(), 2)
+        self._assert_summary(1, 1.5, self.block_keys[1])
+
+
+@ddt.ddt
+@override_settings(COMPLETION_SUMMARIES_ENABLED=True, EVENT_TRACKING_BACKENDS=IN_MEMORY_BACKEND_CONFIG)
+class CompletionSummaryRollbackTestCase(CompletionSetUpMixin, TransactionTestCase):
+    """
+    Test that a completion is not written without its summary update.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        tracker.register_tracker(DjangoTracker())
+        self.context_key = CourseKey.from_string("course-v1:edX+MOOC202+2049_T2")
+        self.block_keys = [self.context_key.make_usage_key('html', str(number)) for number in range(2)]
+        models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+
+    def _assert_unchanged(self):
+        self.assertEqual(
+            models.BlockCompletion.get_learning_context_completions(self.user, self.context_key),
+            {self.block_keys[0]: 1.0},
+        )
+        summary = models.UserContextCompletionSummary.objects.get(user=self.user, context_key=self.context_key)
+        self.assertEqual((summary.completed_count, summary.completion_sum), (1, 1.0))
+
+    @ddt.data(False, True)
+    def test_submit_completion(self, upsert):
+        with override_settings(COMPLETION_UPSERT_ENABLED=upsert):
+            with patch.object(
+                models.UserContextCompletionSummary.objects, 'apply_changes', side_effect=IntegrityError
+            ):
+                with self.assertRaises(IntegrityError):
+                    models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 0.5)
+                with self.assertRaises(IntegrityError):
+                    models.BlockCompletion.objects.submit_completion(self.user, self.block_keys[1], 1.0)
+        self._assert_unchanged()
+
+    def test_submit_batch_completion(self):
+        with patch.object(models.UserContextCompletionSummary.objects, 'apply_changes', side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                models.BlockCompletion.objects.submit_batch_completion(
+                    self.user, [(self.block_keys[0], 0.5), (self.block_keys[1], 1.0)]
+                )
+        self._assert_unchanged()
+
+
+class LatestBlocksCompletedSummaryTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that latest_blocks_completed_all_courses reads the summaries, when
+    enabled, with the same result and a single query.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+    COURSES = 45
+    LIBRARIES = 5
+    BLOCKS_PER_CONTEXT = 3
+
+    def setUp(self):
+        super().setUp()
+        context_keys = [
+            CourseKey.from_string(f'course-v1:edX+Course{number}+run') for number in range(self.COURSES)
+        ] + [
+            CourseKey.from_string(f'library-v1:edX+Library{number}') for number in range(self.LIBRARIES)
+        ]
+        for context_key in context_keys:
+            bulk_create_completions_for_testing([self.user], context_key, self.BLOCKS_PER_CONTEXT)
+        models.UserContextCompletionSummary.objects.rebuild(user_ids=[self.user.id])
+
+    def _latest(self, **kwargs):
+        """
+        Return the result of a call, and the SQL of its single query.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            latest = models.BlockCompletion.latest_blocks_completed_all_courses(self.user, **kwargs)
+        self.assertEqual(len(queries), 1)
+        return latest, queries[0]['sql']
+
+    def test_summaries(self):
+        all_courses, sql = self._latest()
+        self.assertNotIn('completion_usercontextcompletionsummary', sql)
+        self.assertEqual(len(all_courses), self.COURSES)
+        self.assertEqual(len(self._latest(limit=10)[0]), 10)
+        with override_settings(COMPLETION_SUMMARIES_ENABLED=True):
+            self.assertNotIn('completion_usercontextcompletionsummary', self._latest()[1])
+        with override_settings(COMPLETION_SUMMARIES_ENABLED=True, COMPLETION_SUMMARY_READS_ENABLED=True):
+            summarized, sql = self._latest()
+            self.assertIn('completion_usercontextcompletionsummary', sql)
+            self.assertEqual(len(self._latest(limit=10)[0]), 10)
+        self.assertEqual(summarized, all_courses)
+
+
+class CompletionReadTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that a course's completions are read from tuples without instantiating models.
+    """
+    ROWS = 100
+
+    def test_tuples(self):
+        course_key = CourseKey.from_string('course-v1:edX+Course+run')
+        bulk_create_completions_for_testing([self.user], course_key, self.ROWS)
+        completions = models.BlockCompletion.user_learning_context_completion_queryset(self.user, course_key)
+
+        with patch.object(models.BlockCompletion, 'from_db', wraps=models.BlockCompletion.from_db) as from_db:
+            with self.assertNumQueries(1):
+                from_models = models.BlockCompletion.completion_by_block_key(completions)
+            self.assertEqual(from_db.call_count, self.ROWS)
+            from_db.reset_mock()
+            with self.assertNumQueries(1):
+                from_tuples = models.BlockCompletion.completion_by_block_key_values(
+                    course_key, completions.values_list('block_key', 'completion')
+                )
+            from_db.assert_not_called()
+
+        self.assertEqual(len(from_tuples), self.ROWS)
+        self.assertEqual(from_tuples, from_models)
+
+
+class LearningContextStatsTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test the per-block completion statistics of a learning context.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.html = self.course_key.make_usage_key('html', 'intro')
+        self.problem = self.course_key.make_usage_key('problem', 'quiz')
+        self.other_user = UserFactory()
+        models.BlockCompletion.objects.submit_batch_completion(self.user, [(self.html, 1.0), (self.problem, 0.5)])
+        models.BlockCompletion.objects.submit_batch_completion(self.other_user, [(self.html, 0.5)])
+        models.BlockCompletion.objects.submit_completion(
+            self.user, CourseKey.from_string('course-v1:edX+Other+2049_T2').make_usage_key('html', 'intro'), 1.0
+        )
+
+    def test_stats(self):
+        with self.assertNumQueries(1):
+            stats = models.BlockCompletion.get_learning_context_stats(self.course_key)
+        self.assertEqual(stats, {
+            'blocks': {
+                self.html: {'block_type': 'html', 'learners': 2, 'completed': 1, 'average': 0.75},
+                self.problem: {'block_type': 'problem', 'learners': 1, 'completed': 0, 'average': 0.5},
+            },
+            'block_types': {
+                'html': {'blocks': 1, 'learners': 2, 'completed': 1, 'average': 0.75},
+                'problem': {'blocks': 1, 'learners': 1, 'completed': 0, 'average': 0.5},
+            },
+        })
+
+    def test_threshold(self):
+        stats = models.BlockCompletion.get_learning_context_stats(self.course_key, threshold=0.5)
+        self.assertEqual(stats['blocks'][self.html]['completed'], 2)
+        self.assertEqual(stats['block_types']['problem']['completed'], 1)
+
+    def test_block_type_average_is_weighted_by_learners(self):
+        models.BlockCompletion.objects.submit_completion(
+            self.other_user, self.course_key.make_usage_key('html', 'outro'), 0.0
+        )
+        stats = models.BlockCompletion.get_learning_context_stats(self.course_key)
+        self.assertEqual(stats['block_types']['html'], {'blocks': 2, 'learners': 3, 'completed': 1, 'average': 0.5})
+
+    def test_empty_context(self):
+        self.assertEqual(
+            models.BlockCompletion.get_learning_context_stats(CourseKey.from_string('course-v1:edX+Empty+run')),
+            {'blocks': {}, 'block_types': {}},
+        )
+
+    def test_old_mongo_course(self):
+        course_key = CourseKey.from_string('edX/MOOC101/2050_T2')
+        block_key = UsageKey.from_string('i4x://edX/MOOC101/video/1').replace(course_key=course_key)
+        models.BlockCompletion.objects.submit_completion(self.user, block_key, 1.0)
+        stats = models.BlockCompletion.get_learning_context_stats(course_key)
+        self.assertEqual(list(stats['blocks']), [block_key])
+        self.assertEqual(list(stats['blocks'])[0].run, '2050_T2')
+
 
 class CompletionClearingTestCase(CompletionSetUpMixin, TestCase):
     """
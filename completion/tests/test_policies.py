@@ -0,0 +1,114 @@
+"""
+Tests of the block completion policy registry.
+"""
+
+from unittest.mock import Mock, patch
+
+import ddt
+from django.test import SimpleTestCase
+from xblock.completable import XBlockCompletionMode
+from xblock.core import XBlock
+from xblock.field_data import DictFieldData
+from xblock.fields import Boolean, ScopeIds
+
+from .. import policies
+
+
+class CompletableBlock(XBlock):
+    """
+    A block that is completed by being viewed.
+    """
+    completion_mode = XBlockCompletionMode.COMPLETABLE
+
+
+class AggregatorBlock(XBlock):
+    """
+    A block that is complete when its children are.
+    """
+    completion_mode = XBlockCompletionMode.AGGREGATOR
+
+
+class CustomCompletionBlock(XBlock):
+    """
+    A block that submits its own completions.
+    """
+    has_custom_completion = True
+
+
+class ScoredBlock(XBlock):
+    """
+    A block that is completed by being scored.
+    """
+    has_score = True
+
+
+class OptionallyScoredBlock(XBlock):
+    """
+    A block that decides whether it is scored per instance.
+    """
+    has_score = Boolean(default=False)
+
+
+@ddt.ddt
+class BlockPolicyTestCase(SimpleTestCase):
+    """
+    Test that policies are computed correctly and only once.
+    """
+
+    def setUp(self):
+        super().setUp()
+        policies.clear_block_policies()
+        self.addCleanup(policies.clear_block_policies)
+
+    @ddt.data(
+        (CompletableBlock, True, False, False, False),
+        (AggregatorBlock, False, True, False, False),
+        (CustomCompletionBlock, True, False, True, False),
+        (ScoredBlock, True, False, False, True),
+    )
+    @ddt.unpack
+    def test_class_policy(self, block_cls, completable, aggregator, custom_completion, scorable):
+        policy = policies.get_class_policy(block_cls)
+        self.assertEqual(
+            (policy.completable, policy.aggregator, policy.custom_completion, policy.scorable, policy.dynamic),
+            (completable, aggregator, custom_completion, scorable, False),
+        )
+        self.assertEqual(policy.can_mark_complete_on_view, block_cls is CompletableBlock)
+
+    def test_block_type_is_loaded_once(self):
+        with patch.object(XBlock, 'load_class', return_value=ScoredBlock) as load_class:
+            for _ in range(10):
+                policy = policies.get_block_policy('problem')
+        load_class.assert_called_once_with('problem')
+        self.assertTrue(policy.scorable)
+
+    def test_clear(self):
+        with patch.object(XBlock, 'load_class', return_value=ScoredBlock):
+            policies.get_block_policy('problem')
+        policies.clear_block_policies()
+        with patch.object(XBlock, 'load_class', return_value=CompletableBlock):
+            self.assertFalse(policies.get_block_policy('problem').scorable)
+
+    def test_warm(self):
+        with patch.object(XBlock, 'load_classes', return_value=[('html', None), ('broken', None)]):
+            with patch.object(XBlock, 'load_class', side_effect=[CompletableBlock, ImportError]):
+                self.assertEqual(policies.warm_block_policies(), 1)
+        with patch.object(XBlock, 'load_class') as load_class:
+            self.assertTrue(policies.get_block_policy('html').completable)
+        load_class.assert_not_called()
+
+    def test_instance_overrides(self):
+        block = CompletableBlock(Mock(), scope_ids=Mock(spec=ScopeIds))
+        self.assertTrue(policies.get_instance_policy(block).can_mark_complete_on_view)
+        block.has_score = True
+        self.assertFalse(policies.get_instance_policy(block).can_mark_complete_on_view)
+        self.assertTrue(policies.get_class_policy(CompletableBlock).can_mark_complete_on_view)
+
+    def test_dynamic_class(self):
+        self.assertTrue(policies.get_class_policy(OptionallyScoredBlock).dynamic)
+        for has_score in (False, True):
+            block = OptionallyScoredBlock(
+                Mock(), field_data=DictFieldData({'has_score': has_score}), scope_ids=Mock(spec=ScopeIds)
+            )
+            self.assertEqual(policies.get_instance_policy(block).scorable, has_score)
+
@@ -13,7 +13,7 @@ from xblock.core import XBlock
 from xblock.fields import ScopeIds
 
 from ..models import BlockCompletion
-from ..services import CompletionService
+from ..services import CompletionService, User
 from ..test_utils import CompletionSetUpMixin, UserFactory
 
 
@@ -69,6 +69,11 @@ class CompletionServiceTestCase(CompletionSetUpMixin, TestCase):
         expected_completions = dict(zip(self.block_keys, [1.0, 0.8, 0.6, 0.0, 0.0]))
         self.assertEqual(expected_completions, actual_completions)
 
+    async def test_aget_completions(self):
+        actual_completions = await self.completion_service.aget_completions(self.block_keys)
+        expected_completions = dict(zip(self.block_keys, [1.0, 0.8, 0.6, 0.0, 0.0]))
+        self.assertEqual(expected_completions, actual_completions)
+
     def test_submit_completion(self):
         completable_block = XBlock(Mock(), scope_ids=Mock(spec=ScopeIds))
         completable_block.location = UsageKey.from_string("i4x://edX/100/a/1").replace(course_key=self.course_key)
@@ -122,6 +127,60 @@ class CompletionServiceTestCase(CompletionSetUpMixin, TestCase):
         self.assertTrue(all(bc.completion == 0.25 for bc in completions))
         self.assertEqual({bc.user for bc in completions}, {self.other_user, third_user})
 
+    def test_submit_group_completion_unknown_user_ids(self):
+        block_key = UsageKey.from_string("i4x://edX/100/a/1").replace(course_key=self.course_key)
+        with self.assertRaises(User.DoesNotExist):
+            self.completion_service.submit_group_completion(
+                block_key=block_key,
+                completion=0.25,
+                user_ids=[self.other_user.id, 9999],
+            )
+        self.assertFalse(BlockCompletion.objects.filter(block_key=block_key).exists())
+
+    def test_submit_group_completion_empty_group(self):
+        block_key = UsageKey.from_string("i4x://edX/100/a/1").replace(course_key=self.course_key)
+        with self.override_completion_switch(False):
+            with self.assertNumQueries(0):
+                self.assertEqual(self.completion_service.submit_group_completion(block_key, 1.0), [])
+                self.assertEqual(
+                    self.completion_service.submit_group_completion(block_key, 1.0, user_ids=[], summary=True),
+                    {'created': 0, 'updated': 0, 'unchanged': 0},
+                )
+
+    def test_submit_group_completion_summary(self):
+        users = [UserFactory.create() for _ in range(4)]
+        block_key = UsageKey.from_string("i4x://edX/100/a/1").replace(course_key=self.course_key)
+        BlockCompletion.objects.submit_completion(users[0], block_key, 0.5)
+        BlockCompletion.objects.submit_completion(users[1], block_key, 1.0)
+        summary = self.completion_service.submit_group_completion(
+            block_key=block_key,
+            completion=1.0,
+            user_ids=[user.id for user in users],
+            summary=True,
+        )
+        self.assertEqual(summary, {'created': 2, 'updated': 1, 'unchanged': 1})
+        self.assertEqual(BlockCompletion.objects.filter(block_key=block_key, completion=1.0).count(), 4)
+
+    @ddt.data(5, 50)
+    def test_submit_group_completion_query_count(self, group_size):
+        """
+        The number of queries depends on the number of chunks, not the number of users.
+        """
+        users = [UserFactory.create() for _ in range(group_size)]
+        block_key = UsageKey.from_string("i4x://edX/100/a/1").replace(course_key=self.course_key)
+        BlockCompletion.objects.submit_completion(users[0], block_key, 0.5)
+        # Per chunk: user ids, existing completions, 2 * savepoint, insert, 2 * release,
+        # and an update in the chunk with the existing completion
+        with self.assertNumQueries(15):
+            submitted = self.completion_service.submit_group_completion(
+                block_key=block_key,
+                completion=1.0,
+                user_ids=[user.id for user in users],
+                chunk_size=group_size // 2 + 1,
+            )
+        self.assertEqual([completion.user_id for completion, _ in submitted], [user.id for user in users])
+        self.assertEqual([is_new for _, is_new in submitted], [False] + [True] * (group_size - 1))
+
     def test_get_completions_block_keys_missing_run(self):
         candidates = [
             UsageKey.from_string(f"i4x://edX/MOOC101/video/{number}") for number in range(5)
@@ -218,3 +277,147 @@ class CompletionDelayTestCase(CompletionSetUpMixin, TestCase):
         service = CompletionService(self.user, self.context_key)
         with override_settings(COMPLETION_BY_VIEWING_DELAY_MS=delay):
             self.assertEqual(service.get_complete_on_view_delay_ms(), delay)
+
+
+def make_block(usage_key, mode=XBlockCompletionMode.COMPLETABLE, children=()):
+    """
+    Returns an XBlock at `usage_key` with the given completion mode and children.
+    """
+    block = XBlock(Mock(), scope_ids=Mock(spec=ScopeIds))
+    block.scope_ids.usage_id = usage_key
+    block.scope_ids.block_type = usage_key.block_type
+    block.completion_mode = mode
+    block.get_children = lambda: list(children)
+    return block
+
+
+def make_vertical(usage_key, children):
+    """
+    Returns a vertical XBlock containing `children`.
+    """
+    return make_block(usage_key, XBlockCompletionMode.AGGREGATOR, children)
+
+
+class CompletionServicePrefetchTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that a prefetching CompletionService answers every lookup from one query.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+    UNITS = 40
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.verticals = []
+        for unit in range(self.UNITS):
+            children = [
+                make_block(self.course_key.make_usage_key(block_type, f'{unit}-{block_type}'))
+                for block_type in ('html', 'video', 'problem')
+            ]
+            self.verticals.append(make_vertical(self.course_key.make_usage_key('vertical', str(unit)), children))
+        BlockCompletion.objects.submit_batch_completion(self.user, [
+            (child.scope_ids.usage_id, 1.0)
+            for vertical in self.verticals[:self.UNITS // 2]
+            for child in vertical.get_children()
+        ])
+
+    def _render_sequence(self, service):
+        """
+        Make the completion lookups of a sequence render.
+        """
+        complete = [service.vertical_is_complete(vertical) for vertical in self.verticals]
+        for vertical in self.verticals:
+            service.blocks_to_mark_complete_on_view(vertical.get_children())
+        return complete
+
+    def test_sequence_render_costs_one_query(self):
+        expected = [unit < self.UNITS // 2 for unit in range(self.UNITS)]
+        self.assertEqual(self._render_sequence(CompletionService(self.user, self.course_key)), expected)
+        with self.assertNumQueries(1):
+            service = CompletionService(self.user, self.course_key, prefetch=True)
+            self.assertEqual(self._render_sequence(service), expected)
+
+    def test_prefetch_method(self):
+        service = CompletionService(self.user, self.course_key)
+        with self.assertNumQueries(1):
+            service.prefetch()
+            for vertical in self.verticals:
+                service.vertical_is_complete(vertical)
+
+    def test_local_writes_update_prefetched_completions(self):
+        service = CompletionService(self.user, self.course_key, prefetch=True)
+        vertical = self.verticals[-1]
+        for child in vertical.get_children():
+            service.submit_completion(child.scope_ids.usage_id, 1.0)
+        with self.assertNumQueries(0):
+            self.assertTrue(service.vertical_is_complete(vertical))
+
+        block_key = self.course_key.make_usage_key('html', 'group')
+        service.submit_group_completion(block_key, 0.5, users=[self.user, UserFactory()])
+        with self.assertNumQueries(0):
+            self.assertEqual(service.get_completions([block_key]), {block_key: 0.5})
+
+
+class VerticalsAreCompleteTestCase(CompletionSetUpMixin, TestCase):
+    """
+    Test that verticals_are_complete matches vertical_is_complete with a single query.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.service = CompletionService(self.user, self.course_key)
+        self.done = self._block('html', 'done')
+        self.started = self._block('video', 'started')
+        self.library_done = self._block('problem', 'library-done')
+        self.excluded = self._block('discussion', 'excluded', XBlockCompletionMode.EXCLUDED)
+        BlockCompletion.objects.submit_batch_completion(self.user, [
+            (self.done.scope_ids.usage_id, 1.0),
+            (self.started.scope_ids.usage_id, 0.5),
+            (self.library_done.scope_ids.usage_id, 1.0),
+        ])
+        library = make_block(
+            self.course_key.make_usage_key('library_content', 'library'),
+            XBlockCompletionMode.AGGREGATOR,
+            [self.library_done],
+        )
+        split_test = make_block(
+            self.course_key.make_usage_key('split_test', 'split'),
+            XBlockCompletionMode.AGGREGATOR,
+            [make_block(self.course_key.make_usage_key('vertical', 'group'), XBlockCompletionMode.AGGREGATOR, [
+                self.started,
+            ])],
+        )
+        self.verticals = [
+            self._vertical('complete', [self.done, self.excluded]),
+            self._vertical('incomplete', [self.done, self.started]),
+            self._vertical('library', [library, self.done]),
+            self._vertical('split_test', [split_test]),
+            self._vertical('empty', []),
+        ]
+
+    def _block(self, block_type, block_id, mode=XBlockCompletionMode.COMPLETABLE):
+        return make_block(self.course_key.make_usage_key(block_type, block_id), mode)
+
+    def _vertical(self, block_id, children):
+        return make_vertical(self.course_key.make_usage_key('vertical', block_id), children)
+
+    def test_matches_vertical_is_complete(self):
+        expected = {vertical.scope_ids.usage_id: self.service.vertical_is_complete(vertical)
+                    for vertical in self.verticals}
+        with self.assertNumQueries(1):
+            actual = self.service.verticals_are_complete(self.verticals)
+        self.assertEqual(actual, expected)
+        self.assertEqual(list(actual.values()), [True, False, True, False, True])
+
+    def test_rejects_other_block_types(self):
+        with self.assertRaises(ValueError):
+            self.service.verticals_are_complete(self.verticals + [self.done])
+
+    def test_disabled(self):
+        with self.override_completion_switch(False):
+            self.assertEqual(
+                self.service.verticals_are_complete(self.verticals),
+                {vertical.scope_ids.usage_id: None for vertical in self.verticals},
+            )
@@ -0,0 +1,137 @@
+"""
+Tests of deferred tracking log emission.
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from opaque_keys.edx.keys import CourseKey
+
+from .. import tracking
+from ..models import BLOCK_COMPLETION_CHANGED_EVENT_TYPE, BlockCompletion
+from ..test_utils import CompletionSetUpMixin, EventTrackingTestCase, InMemoryBackend
+
+
+class DeferredTrackingLogTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test that completion events are sent in one batch after the transaction commits.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+    BATCH_SIZE = 200
+
+    def setUp(self):
+        super().setUp()
+        course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        self.block_keys = [course_key.make_usage_key('problem', str(number)) for number in range(self.BATCH_SIZE)]
+
+    @property
+    def events(self):
+        return self.tracker.backends['mem'].events
+
+    def test_events_wait_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            BlockCompletion.objects.submit_batch_completion(self.user, [(key, 1.0) for key in self.block_keys])
+            BlockCompletion.objects.submit_completion(self.user, self.block_key, 1.0)
+            self.assertEqual(self.events, [])
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        self.assertEqual(len(self.events), self.BATCH_SIZE + 1)
+        self.assertTrue(all(event['name'] == BLOCK_COMPLETION_CHANGED_EVENT_TYPE for event in self.events))
+
+    def test_rolled_back_events_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    BlockCompletion.objects.submit_batch_completion(self.user, [(key, 1.0) for key in self.block_keys])
+                    raise RuntimeError('Roll back')
+            except RuntimeError:
+                pass
+            BlockCompletion.objects.submit_completion(self.user, self.block_key, 1.0)
+        self.assertEqual([event['data']['block_id'] for event in self.events], [str(self.block_key)])
+
+    def test_backend_calls_per_batch(self):
+        blocks = [(key, 1.0) for key in self.block_keys]
+        with self.captureOnCommitCallbacks(execute=True):
+            BlockCompletion.objects.submit_batch_completion(self.user, blocks)
+        self.assertEqual(len(self.events), self.BATCH_SIZE)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BlockCompletion.objects.submit_batch_completion(self.user, blocks)
+        self.assertEqual(len(self.events), 2 * self.BATCH_SIZE)
+
+        with override_settings(COMPLETION_SUPPRESS_UNCHANGED_EVENTS=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                BlockCompletion.objects.submit_batch_completion(self.user, blocks)
+            self.assertEqual(len(self.events), 2 * self.BATCH_SIZE)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                BlockCompletion.objects.submit_batch_completion(self.user, blocks[:10] + [(self.block_key, 1.0)])
+                BlockCompletion.objects.submit_batch_completion(self.user, [(key, 0.5) for key in self.block_keys[:5]])
+            self.assertEqual(len(self.events), 2 * self.BATCH_SIZE + 6)
+
+
+class SlowBackend(InMemoryBackend):
+    """
+    A tracking backend that takes a while to send each event, and records the
+    thread it was sent from.
+    """
+    DELAY = 0.05
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def send(self, event):
+        time.sleep(self.DELAY)
+        self.threads.append(threading.current_thread())
+        super().send(event)
+
+
+@override_settings(
+    EVENT_TRACKING_BACKENDS={'slow': {'ENGINE': 'completion.tests.test_tracking.SlowBackend'}},
+    COMPLETION_EVENT_DISPATCH='thread',
+    COMPLETION_EVENT_DISPATCH_WORKERS=2,
+)
+class ThreadedTrackingLogTestCase(CompletionSetUpMixin, EventTrackingTestCase, TestCase):
+    """
+    Test that events are sent from the worker pool instead of the request thread.
+    """
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        tracking.reset_event_dispatcher()
+        self.addCleanup(tracking.reset_event_dispatcher)
+
+    def test_events_are_sent_from_workers(self):
+        course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        blocks = [(course_key.make_usage_key('problem', str(number)), 1.0) for number in range(5)]
+        with self.tracker.context('request', {'username': self.user.username}):
+            with self.captureOnCommitCallbacks(execute=True):
+                BlockCompletion.objects.submit_batch_completion(self.user, blocks)
+
+        tracking.get_event_dispatcher().join()
+        backend = self.tracker.backends['slow']
+        events = backend.events
+        self.assertEqual(len(events), len(blocks))
+        self.assertNotIn(threading.current_thread(), backend.threads)
+        self.assertTrue(all(event['context']['username'] == self.user.username for event in events))
+        self.assertEqual(tracking.get_event_dispatcher().stats(), {'queue_depth': 0, 'dropped': 0, 'completed': 5})
+
+
+class AutocommitTrackingLogTestCase(CompletionSetUpMixin, TransactionTestCase):
+    """
+    Test that completion events are sent immediately outside of a transaction.
+    """
+
+    def test_emitted_immediately(self):
+        self.set_up_completion()
+        with patch.object(tracking, 'send_events') as send_events:
+            self.completion.emit_tracking_log()
+        send_events.assert_called_once()
+        self.assertEqual(send_events.call_args[0][0][0][0], BLOCK_COMPLETION_CHANGED_EVENT_TYPE)
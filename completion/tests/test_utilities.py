@@ -4,12 +4,19 @@ The unit tests for utilities.py.
 """
 
 
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.test import RequestFactory, TestCase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from opaque_keys.edx.keys import CourseKey
 
 from ..exceptions import UnavailableCompletionData
-from ..utilities import get_key_to_last_completed_block
-from ..test_utils import UserFactory, CompletionSetUpMixin, submit_completions_for_testing
+from ..models import BlockCompletion
+from ..utilities import (aget_key_to_last_completed_block, get_aggregate_completion, get_completions_validators,
+                         get_key_to_last_completed_block)
+from ..test_utils import (UserFactory, CompletionSetUpMixin, bulk_create_completions_for_testing,
+                          submit_completions_for_testing)
 
 
 class TestCompletionUtilities(CompletionSetUpMixin, TestCase):
@@ -46,3 +53,148 @@ class TestCompletionUtilities(CompletionSetUpMixin, TestCase):
 
         with self.assertRaises(UnavailableCompletionData):
             get_key_to_last_completed_block(self.user, course_key)
+
+    async def test_aget_key_to_last_completed_block(self):
+        last_block_key = await aget_key_to_last_completed_block(self.user, self.course_key)
+        self.assertEqual(last_block_key, self.course_key.make_usage_key("video", str(4)))
+
+        with self.assertRaises(UnavailableCompletionData):
+            await aget_key_to_last_completed_block(self.user, CourseKey.from_string("edX/NotACourse/2049_T2"))
+
+
+class TestAggregateCompletion(CompletionSetUpMixin, TestCase):
+    """
+    Tests of get_aggregate_completion.
+    """
+
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string("course-v1:edX+MOOC101+2049_T2")
+
+    def _structure(self, sections, subsections, units, leaves):
+        """
+        Returns the (children, block_keys) of a synthetic course.
+        """
+        children = {'course': []}
+        block_keys = {}
+        for section in range(sections):
+            section_id = f'chapter-{section}'
+            children['course'].append(section_id)
+            children[section_id] = []
+            for subsection in range(subsections):
+                subsection_id = f'sequential-{section}-{subsection}'
+                children[section_id].append(subsection_id)
+                children[subsection_id] = []
+                for unit in range(units):
+                    unit_id = f'vertical-{section}-{subsection}-{unit}'
+                    children[subsection_id].append(unit_id)
+                    children[unit_id] = []
+                    for leaf in range(leaves):
+                        leaf_id = f'html-{section}-{subsection}-{unit}-{leaf}'
+                        children[unit_id].append(leaf_id)
+                        block_keys[leaf_id] = self.course_key.make_usage_key('html', leaf_id)
+        return children, block_keys
+
+    def _count_rows(self, func):
+        """
+        Run func() and return its result and the number of completion rows it read.
+        """
+        rows = []
+        completion_by_block_key_values = BlockCompletion.completion_by_block_key_values
+
+        def count(context_key, values):
+            values = list(values)
+            rows.extend(values)
+            return completion_by_block_key_values(context_key, values)
+
+        with patch.object(BlockCompletion, 'completion_by_block_key_values', side_effect=count):
+            result = func()
+        return result, len(rows)
+
+    def test_aggregation(self):
+        children, block_keys = self._structure(1, 1, 2, 2)
+        shared = 'html-shared'
+        block_keys[shared] = self.course_key.make_usage_key('html', shared)
+        children['vertical-0-0-0'].append(shared)
+        children['vertical-0-0-1'].append(shared)
+
+        def aggregate(root):
+            return get_aggregate_completion(self.user, self.course_key, root, children, block_keys)
+
+        self.assertEqual(aggregate('sequential-0-0'), 0)
+        BlockCompletion.objects.submit_batch_completion(self.user, [
+            (block_keys[leaf_id], 1.0) for leaf_id in block_keys if leaf_id.startswith('html-0-0-0')
+        ] + [(block_keys[shared], 1.0)])
+        self.assertEqual(aggregate('vertical-0-0-0'), 1)
+        self.assertEqual(aggregate('vertical-0-0-1'), 0)
+        self.assertEqual(aggregate('sequential-0-0'), 0)
+        BlockCompletion.objects.submit_completion(self.user, block_keys['html-0-0-1-0'], 0.5)
+        self.assertEqual(aggregate('html-0-0-1-0'), 0.5)
+        self.assertEqual(aggregate('vertical-0-0-1'), 0)
+
+    def test_reads_only_subsection_rows(self):
+        """
+        Compare the rows read for one subsection of a 5,000-block course.
+        """
+        children, block_keys = self._structure(10, 10, 10, 5)
+        self.assertEqual(len(block_keys), 5000)
+        bulk_create_completions_for_testing(
+            [self.user], self.course_key, block_keys=block_keys.values(), batch_size=100,
+        )
+
+        _, course_rows = self._count_rows(
+            lambda: BlockCompletion.get_learning_context_completions(self.user, self.course_key)
+        )
+        with self.assertNumQueries(1):
+            completion, subsection_rows = self._count_rows(
+                lambda: get_aggregate_completion(self.user.id, self.course_key, 'sequential-3-4', children, block_keys)
+            )
+        self.assertEqual(completion, 1)
+        self.assertEqual(course_rows, 5000)
+        self.assertEqual(subsection_rows, 50)
+
+
+class TestCompletionsValidators(CompletionSetUpMixin, TestCase):
+    """
+    Tests of get_completions_validators.
+    """
+
+    COMPLETION_SWITCH_ENABLED = True
+
+    def setUp(self):
+        super().setUp()
+        self.course_key = CourseKey.from_string("course-v1:edX+MOOC101+2049_T2")
+        self.block_keys = [self.course_key.make_usage_key('html', str(number)) for number in range(2)]
+
+    def test_validators_change_with_completions(self):
+        etag, last_modified = get_completions_validators(self.user, self.course_key)
+        self.assertIsNone(last_modified)
+
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        with self.assertNumQueries(1):
+            created_etag, last_modified = get_completions_validators(self.user.id, self.course_key)
+        self.assertNotEqual(created_etag, etag)
+        self.assertIsNotNone(last_modified)
+        self.assertTrue(created_etag.startswith('"'))
+
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        self.assertEqual(get_completions_validators(self.user, self.course_key)[0], created_etag)
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 0.5)
+        changed_etag = get_completions_validators(self.user, self.course_key)[0]
+        self.assertNotEqual(changed_etag, created_etag)
+        BlockCompletion.objects.submit_completion(UserFactory(), self.block_keys[1], 1.0)
+        self.assertEqual(get_completions_validators(self.user, self.course_key)[0], changed_etag)
+
+        BlockCompletion.objects.clear_learning_context_completion(self.user, self.course_key)
+        self.assertEqual(get_completions_validators(self.user, self.course_key), (etag, None))
+
+    def test_conditional_requests(self):
+        BlockCompletion.objects.submit_completion(self.user, self.block_keys[0], 1.0)
+        etag, last_modified = get_completions_validators(self.user, self.course_key)
+        for headers in ({'If-None-Match': etag}, {'If-Modified-Since': http_date(last_modified)}):
+            request = RequestFactory().get('/', headers=headers)
+            self.assertEqual(get_conditional_response(request, etag=etag, last_modified=last_modified).status_code, 304)
+        request = RequestFactory().get('/', headers={'If-None-Match': '"stale"'})
+        self.assertIsNone(get_conditional_response(request, etag=etag, last_modified=last_modified))
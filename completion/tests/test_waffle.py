@@ -0,0 +1,90 @@
+"""
+Tests of the cached completion tracking switch.
+"""
+
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from edx_django_utils.cache import RequestCache
+from edx_toggles.toggles.testutils import override_waffle_switch
+from opaque_keys.edx.keys import CourseKey
+from waffle.testutils import override_switch
+
+from .. import waffle
+from ..models import BlockCompletion
+from ..test_utils import CompletionWaffleTestMixin, UserFactory
+
+SWITCH = waffle.ENABLE_COMPLETION_TRACKING_SWITCH
+
+
+class CachedWaffleSwitchTestCase(CompletionWaffleTestMixin, TestCase):
+    """
+    Test that the completion tracking switch is looked up once per request at most.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self._start_request()
+        self.addCleanup(self._start_request)
+
+    def _start_request(self):
+        """
+        Simulate the start of a new request, as RequestCacheMiddleware does.
+        """
+        RequestCache.clear_all_namespaces()
+        SWITCH.clear_cache()
+
+    def _count_evaluations(self, func):
+        """
+        Run func() and return the number of times the switch was looked up.
+        """
+        with patch.object(waffle, 'switch_is_active', wraps=waffle.switch_is_active) as switch_is_active:
+            func()
+        return switch_is_active.call_count
+
+    def test_one_evaluation_per_batch(self):
+        user = UserFactory()
+        course_key = CourseKey.from_string('course-v1:edX+MOOC101+2049_T2')
+        blocks = [(course_key.make_usage_key('html', str(number)), 1.0) for number in range(20)]
+
+        def submit():
+            BlockCompletion.objects.submit_batch_completion(user, blocks)
+            for block_key, _ in blocks:
+                BlockCompletion.objects.submit_completion(user, block_key, 0.5)
+
+        with override_switch(SWITCH.name, True):
+            self._start_request()
+            self.assertEqual(self._count_evaluations(submit), 1)
+
+    def test_value_is_kept_across_requests(self):
+        def requests():
+            for _ in range(3):
+                RequestCache.clear_all_namespaces()
+                SWITCH.is_enabled()
+
+        self.assertEqual(self._count_evaluations(requests), 1)
+        with override_settings(COMPLETION_TRACKING_SWITCH_CACHE_TIMEOUT=0):
+            SWITCH.clear_cache()
+            self.assertEqual(self._count_evaluations(requests), 3)
+
+    def test_hit_counter(self):
+        hits, evaluations = SWITCH.hits, SWITCH.evaluations
+        for _ in range(5):
+            SWITCH.is_enabled()
+        self.assertEqual((SWITCH.hits - hits, SWITCH.evaluations - evaluations), (4, 1))
+
+    def test_saving_the_switch_clears_the_cache(self):
+        self.assertFalse(SWITCH.is_enabled())
+        with override_switch(SWITCH.name, True):
+            RequestCache.clear_all_namespaces()
+            self.assertTrue(SWITCH.is_enabled())
+        RequestCache.clear_all_namespaces()
+        self.assertFalse(SWITCH.is_enabled())
+
+    def test_overrides(self):
+        self.override_waffle_switch(True)
+        self.assertTrue(SWITCH.is_enabled())
+        with override_waffle_switch(SWITCH, False):
+            self.assertFalse(SWITCH.is_enabled())
+        self.assertTrue(SWITCH.is_enabled())
@@ -0,0 +1,111 @@
+"""
+Tests of the bounded worker pool.
+"""
+
+import threading
+
+import ddt
+from django.test import SimpleTestCase
+
+from ..workers import BoundedWorkerPool
+
+
+@ddt.ddt
+class BoundedWorkerPoolTestCase(SimpleTestCase):
+    """
+    Test that the worker pool runs tasks and applies its overflow policy.
+    """
+
+    def _blocked_pool(self, **kwargs):
+        """
+        Returns a single-worker pool whose worker is stuck until the returned event is set.
+        """
+        pool = BoundedWorkerPool('test', workers=1, **kwargs)
+        release = threading.Event()
+        started = threading.Event()
+
+        def wait():
+            started.set()
+            release.wait()
+
+        pool.submit(wait)
+        started.wait()
+        self.addCleanup(pool.drain)
+        self.addCleanup(release.set)
+        return pool, release
+
+    def test_runs_tasks(self):
+        pool = BoundedWorkerPool('test', workers=2)
+        self.addCleanup(pool.drain)
+        results = []
+        for number in range(10):
+            pool.submit(results.append, number)
+        pool.join()
+        self.assertEqual(sorted(results), list(range(10)))
+        self.assertEqual(pool.stats(), {'queue_depth': 0, 'dropped': 0, 'completed': 10})
+
+    def test_task_errors_are_logged(self):
+        pool = BoundedWorkerPool('test', workers=1)
+        self.addCleanup(pool.drain)
+        with self.assertLogs('completion.workers', 'ERROR'):
+            pool.submit(int, 'not a number')
+            pool.join()
+        self.assertEqual(pool.completed, 1)
+
+    def test_drop_oldest(self):
+        pool, release = self._blocked_pool(max_queue_size=3, overflow_policy='drop_oldest')
+        results = []
+        for number in range(5):
+            self.assertTrue(pool.submit(results.append, number))
+        self.assertEqual(pool.queue_depth, 3)
+        self.assertEqual(pool.dropped, 2)
+        release.set()
+        pool.join()
+        self.assertEqual(results, [2, 3, 4])
+
+    def test_sample(self):
+        pool, release = self._blocked_pool(max_queue_size=2, overflow_policy='sample', sample_rate=3)
+        results = []
+        accepted = [pool.submit(results.append, number) for number in range(8)]
+        self.assertEqual(accepted, [True, True, False, False, True, False, False, True])
+        self.assertEqual(pool.dropped, 6)
+        release.set()
+        pool.join()
+        self.assertEqual(results, [4, 7])
+
+    def test_reject(self):
+        pool, release = self._blocked_pool(max_queue_size=1, overflow_policy='reject')
+        results = []
+        self.assertTrue(pool.submit(results.append, 1))
+        self.assertFalse(pool.submit(results.append, 2))
+        self.assertEqual(pool.dropped, 0)
+        release.set()
+        pool.join()
+        self.assertEqual(results, [1])
+
+    def test_drain_runs_queued_tasks(self):
+        pool, release = self._blocked_pool(max_queue_size=10)
+        results = []
+        for number in range(3):
+            pool.submit(results.append, number)
+        release.set()
+        pool.drain()
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_drain_with_full_queue(self):
+        pool, release = self._blocked_pool(max_queue_size=1, overflow_policy='drop_oldest')
+        worker, = pool._threads  # pylint: disable=protected-access
+        pool.drain(timeout=0)
+        results = []
+        self.assertTrue(pool.submit(results.append, 1))
+        self.assertTrue(pool.submit(results.append, 2))
+        release.set()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        pool.join()
+        self.assertIn(2, results)
+
+    @ddt.data('drop', None)
+    def test_invalid_policy(self, policy):
+        with self.assertRaises(ValueError):
+            BoundedWorkerPool('test', overflow_policy=policy)
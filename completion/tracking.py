@@ -0,0 +1,159 @@
+"""
+Deferred emission of completion tracking logs.
+
+Events emitted inside a transaction are collected and sent together once the
+transaction commits.  Events from a transaction (or savepoint) that is rolled
+back are never sent.
+
+By default events are sent on the calling thread.  Set
+COMPLETION_EVENT_DISPATCH to 'thread' to hand them to a bounded pool of
+background workers instead, so that slow tracking backends do not add to
+request latency.
+"""
+
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import transaction
+
+from eventtracking import tracker
+
+from .workers import BoundedWorkerPool
+
+DISPATCH_SYNC = 'sync'
+DISPATCH_THREAD = 'thread'
+
+_local = threading.local()
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+class _EventBatch:
+    """
+    The events waiting for one transaction or savepoint to commit.
+    """
+    __slots__ = ('events', 'dispatched', '__weakref__')
+
+    def __init__(self):
+        self.events = []
+        self.dispatched = False
+
+    def dispatch(self):
+        """
+        Send every event in the batch.
+        """
+        self.dispatched = True
+        send_events(self.events)
+
+
+def _pending_batches():
+    """
+    Returns this thread's open batches, keyed by (database alias, savepoint ids).
+
+    Each batch is kept alive only by the on_commit callback that will send
+    it, so batches whose savepoint is rolled back disappear with the callback.
+    """
+    try:
+        return _local.batches
+    except AttributeError:
+        _local.batches = weakref.WeakValueDictionary()
+        return _local.batches
+
+
+def capture_context():
+    """
+    Returns the tracker context of the current thread, so that an event can
+    be emitted in it later, from another request or thread.
+    """
+    return tracker.get_tracker().resolve_context()
+
+
+def emit_on_commit(name, data, using=None, context=None):
+    """
+    Emit a tracking log once the current transaction on `using` commits.
+
+    Outside of a transaction the event is emitted immediately.  If a
+    `context` returned by capture_context() is given, the event is emitted in
+    it, on top of the current one.
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        send_events([(name, data, context)])
+        return
+
+    key = (connection.alias, tuple(connection.savepoint_ids))
+    batches = _pending_batches()
+    batch = batches.get(key)
+    if batch is None or batch.dispatched:
+        batch = batches[key] = _EventBatch()
+        transaction.on_commit(batch.dispatch, using=connection.alias)
+    batch.events.append((name, data, context))
+
+
+def send_events(events):
+    """
+    Send a sequence of (name, data, context) events to the tracking backends,
+    using the dispatch mode configured by COMPLETION_EVENT_DISPATCH.
+
+    Events with a context are emitted in it, and the others in the context
+    of the calling thread.
+    """
+    if getattr(settings, 'COMPLETION_EVENT_DISPATCH', DISPATCH_SYNC) != DISPATCH_THREAD:
+        for name, data, context in events:
+            if context is None:
+                tracker.emit(name, data)
+            else:
+                _emit_with_context(name, data, context)
+        return
+
+    # Tracker contexts are thread-local, so capture the request's context
+    # here and re-enter it on the worker thread.
+    current = None
+    dispatcher = get_event_dispatcher()
+    for name, data, context in events:
+        if context is None:
+            if current is None:
+                current = capture_context()
+            context = current
+        dispatcher.submit(_emit_with_context, name, data, context)
+
+
+def _emit_with_context(name, data, context):
+    """
+    Emit an event within a context captured from a request thread.
+    """
+    event_tracker = tracker.get_tracker()
+    with event_tracker.context(__name__, context):
+        event_tracker.emit(name, data)
+
+
+def get_event_dispatcher():
+    """
+    Returns the worker pool used to send events when COMPLETION_EVENT_DISPATCH is 'thread'.
+
+    Its counters (queue depth, dropped and completed events) are available from its stats() method.
+    """
+    global _dispatcher  # pylint: disable=global-statement
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = BoundedWorkerPool(
+                'completion-events',
+                workers=getattr(settings, 'COMPLETION_EVENT_DISPATCH_WORKERS', 2),
+                max_queue_size=getattr(settings, 'COMPLETION_EVENT_DISPATCH_QUEUE_SIZE', 10000),
+                overflow_policy=getattr(settings, 'COMPLETION_EVENT_DISPATCH_OVERFLOW', 'block'),
+                sample_rate=getattr(settings, 'COMPLETION_EVENT_DISPATCH_SAMPLE_RATE', 10),
+            )
+        return _dispatcher
+
+
+def reset_event_dispatcher(timeout=None):
+    """
+    Drain and discard the event worker pool, so that the next one is built
+    from the current settings.
+    """
+    global _dispatcher  # pylint: disable=global-statement
+    with _dispatcher_lock:
+        dispatcher, _dispatcher = _dispatcher, None
+    if dispatcher is not None:
+        dispatcher.drain(timeout)
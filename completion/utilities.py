@@ -5,7 +5,12 @@ the BlockCompletion model should be included here.
 
 """
 
+import hashlib
 
+from django.db.models import Count, Max
+from django.utils.http import quote_etag
+
+from . import keys
 from .exceptions import UnavailableCompletionData
 from .models import BlockCompletion
 
@@ -28,3 +33,112 @@ def get_key_to_last_completed_block(user, context_key):
         return last_completed_block.full_block_key
 
     raise UnavailableCompletionData(context_key)
+
+
+async def aget_key_to_last_completed_block(user, context_key):
+    """
+    Async version of get_key_to_last_completed_block().
+    """
+
+    last_completed_block = await BlockCompletion.aget_latest_block_completed(user, context_key)
+
+    if last_completed_block is not None:
+        return last_completed_block.full_block_key
+
+    raise UnavailableCompletionData(context_key)
+
+
+def get_completions_validators(user, context_key):
+    """
+    Returns an ETag and a Last-Modified timestamp for the completions of a
+    "user" in a learning context, for answering conditional requests without
+    loading the completions themselves.
+
+    Both are computed with a single aggregate query over the
+    (user, context_key, modified) index.  The ETag changes whenever a
+    completion is created, changed or deleted.
+
+    Parameters:
+        * user: The user, or the id of the user.
+        * context_key (LearningContextKey): The learning context.
+
+    Return value:
+        (str, int): The quoted ETag, and the time of the latest change in
+        seconds since the epoch, or None if there are no completions.
+    """
+    state = BlockCompletion.user_learning_context_completion_queryset(user, context_key).aggregate(
+        count=Count('id'), last_modified=Max('modified'),
+    )
+    last_modified = state['last_modified']
+    version = '{user_id}:{context_key}:{count}:{last_modified}'.format(
+        user_id=getattr(user, 'id', user),
+        context_key=context_key,
+        count=state['count'],
+        last_modified=last_modified.isoformat() if last_modified else '',
+    )
+    etag = quote_etag(hashlib.md5(version.encode('utf-8'), usedforsecurity=False).hexdigest())
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def get_aggregate_completion(user, context_key, root, children, block_keys):
+    """
+    Returns the aggregate completion of the block `root` for a "user" in a
+    learning context.
+
+    A block without children has its own completion value (0 if it has none).
+    A block with children is complete (1) if all of its children are, and
+    incomplete (0) otherwise.  Only the completions of the leaves below `root`
+    are read from the database, in a single query, and each block is
+    aggregated once even if it appears under several parents.
+
+    Parameters:
+        * user: The user, or the id of the user.
+        * context_key (LearningContextKey): The learning context.
+        * root: The id of the block to aggregate.
+        * children (dict): Maps block ids to lists of child block ids.  Blocks
+          that are not in it have no children.
+        * block_keys (dict): Maps the ids of blocks without children to their
+          UsageKeys.
+
+    Return value: (float) The completion of `root`.
+    """
+    leaf_ids = set()
+    seen = {root}
+    stack = [root]
+    while stack:
+        block_id = stack.pop()
+        child_ids = children.get(block_id)
+        if not child_ids:
+            leaf_ids.add(block_id)
+        for child_id in child_ids or ():
+            if child_id not in seen:
+                seen.add(child_id)
+                stack.append(child_id)
+
+    leaf_keys = [block_keys[block_id] for block_id in leaf_ids if block_id in block_keys]
+    completions = BlockCompletion.completion_by_block_key_values(
+        context_key,
+        BlockCompletion.user_learning_context_completion_queryset(user, context_key).filter(
+            block_key__in=leaf_keys
+        ).values_list(keys.serialized('block_key'), 'completion'),
+    )
+
+    values = {}
+    stack = [root]
+    while stack:
+        block_id = stack[-1]
+        if block_id in values:
+            stack.pop()
+            continue
+        child_ids = children.get(block_id)
+        if not child_ids:
+            values[block_id] = completions.get(block_keys.get(block_id), 0)
+            stack.pop()
+            continue
+        pending = [child_id for child_id in child_ids if child_id not in values]
+        if pending:
+            stack.extend(pending)
+            continue
+        values[block_id] = int(sum(values[child_id] for child_id in child_ids) == len(child_ids))
+        stack.pop()
+    return values[root]
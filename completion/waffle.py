@@ -3,8 +3,72 @@ This module contains various configuration settings via
 waffle switches for the completion app.
 """
 
+import time
 
+from django.conf import settings
 from edx_toggles.toggles import WaffleSwitch
+from waffle import switch_is_active  # pylint: disable=invalid-django-waffle-import
+
+
+class CachedWaffleSwitch(WaffleSwitch):
+    """
+    A WaffleSwitch whose value is also kept in process for a few seconds.
+
+    WaffleSwitch already caches the value for the length of a request.  This
+    class also keeps the value for COMPLETION_TRACKING_SWITCH_CACHE_TIMEOUT
+    seconds (0 turns this off), so that new requests and background workers
+    don't look the switch up again.  The request cache is still consulted
+    first, and the process value is dropped whenever the switch is saved or
+    deleted on this node, so override_waffle_switch() keeps working in tests.
+
+    `evaluations` and `hits` count how often the switch was looked up and
+    how often a cached value was used instead.
+    """
+
+    def __init__(self, name, module_name, timeout=None):
+        super().__init__(name, module_name)
+        self._timeout = timeout
+        self._value = None
+        self._expires = 0.0
+        self.evaluations = 0
+        self.hits = 0
+
+    @property
+    def timeout(self):
+        """
+        The number of seconds the value is kept in process.
+        """
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'COMPLETION_TRACKING_SWITCH_CACHE_TIMEOUT', 5)
+
+    def is_enabled(self):
+        """
+        Returns whether or not the switch is enabled.
+        """
+        request_cache = self._cached_switches
+        value = request_cache.get(self.name)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        now = time.monotonic()
+        if self._value is not None and now < self._expires:
+            self.hits += 1
+            value = self._value
+        else:
+            self.evaluations += 1
+            value = switch_is_active(self.name)
+            self._value, self._expires = value, now + self.timeout
+        request_cache[self.name] = value
+        return value
+
+    def clear_cache(self):
+        """
+        Forget the value kept in process, so that the next request looks the switch up.
+        """
+        self._value = None
+
 
 # The switch and namespace names variables are preserved for backward compatibility
 WAFFLE_NAMESPACE = "completion"
@@ -16,7 +80,15 @@ ENABLE_COMPLETION_TRACKING = "enable_completion_tracking"  # pylint: disable=ann
 #   will prevent creation of BlockCompletion objects in the database, as well as preventing completion-related
 #   network access by certain xblocks.
 # .. toggle_use_cases: open_edx
-ENABLE_COMPLETION_TRACKING_SWITCH = WaffleSwitch(
+ENABLE_COMPLETION_TRACKING_SWITCH = CachedWaffleSwitch(
     f"{WAFFLE_NAMESPACE}.{ENABLE_COMPLETION_TRACKING}",
     module_name=__name__,
 )
+
+
+def clear_switch_cache(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Forget the cached value of the completion tracking switch when it is saved or deleted.
+    """
+    if instance.name == ENABLE_COMPLETION_TRACKING_SWITCH.name:
+        ENABLE_COMPLETION_TRACKING_SWITCH.clear_cache()
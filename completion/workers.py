@@ -0,0 +1,159 @@
+"""
+A small bounded thread pool for running completion work off the request thread.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+log = logging.getLogger(__name__)
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_SAMPLE = 'sample'
+OVERFLOW_REJECT = 'reject'
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SAMPLE, OVERFLOW_REJECT)
+
+# How often idle workers check whether the pool is draining.
+POLL_INTERVAL = 0.5
+
+
+class BoundedWorkerPool:
+    """
+    Runs submitted callables on a fixed number of daemon worker threads.
+
+    Tasks wait in a queue of at most `max_queue_size` entries.  When the
+    queue is full, `overflow_policy` decides what happens to a new task:
+
+    * 'block': wait for room in the queue.
+    * 'drop_oldest': discard the oldest waiting task to make room.
+    * 'sample': keep one in every `sample_rate` new tasks, discarding the
+      oldest waiting task to make room for it, and discard the others.
+    * 'reject': discard the new task, so that the caller can run it itself.
+
+    The workers are started on first use and drained when the process exits.
+    """
+
+    def __init__(self, name, workers=2, max_queue_size=1000, overflow_policy=OVERFLOW_BLOCK, sample_rate=10):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {OVERFLOW_POLICIES}.  Got {overflow_policy!r}")
+        self.name = name
+        self.workers = workers
+        self.overflow_policy = overflow_policy
+        self.sample_rate = max(int(sample_rate), 1)
+        self.dropped = 0
+        self.completed = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._overflowed = 0
+        self._threads = []
+        self._stopping = None
+        self._registered_atexit = False
+
+    @property
+    def queue_depth(self):
+        """
+        The number of tasks waiting to run.
+        """
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        Returns the pool's counters as a dictionary.
+        """
+        return {
+            'queue_depth': self.queue_depth,
+            'dropped': self.dropped,
+            'completed': self.completed,
+        }
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(*args, **kwargs) to run on a worker thread.
+
+        Return Value: (bool) False if the task was discarded by the overflow policy.
+        """
+        self._start()
+        task = (func, args, kwargs)
+        if self.overflow_policy == OVERFLOW_BLOCK:
+            self._queue.put(task)
+            return True
+        with self._lock:
+            if self._queue.full():
+                self._overflowed += 1
+                if self.overflow_policy == OVERFLOW_REJECT:
+                    return False
+                if self.overflow_policy == OVERFLOW_SAMPLE and self._overflowed % self.sample_rate:
+                    self.dropped += 1
+                    return False
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+            self._queue.put_nowait(task)
+        return True
+
+    def join(self):
+        """
+        Block until every queued task has run.
+        """
+        self._queue.join()
+
+    def drain(self, timeout=None):
+        """
+        Run the queued tasks, then stop the worker threads.
+
+        The workers are told to stop through an event rather than a task in the
+        queue, which the 'drop_oldest' and 'sample' policies could discard.
+        """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            if threads:
+                self._stopping.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _start(self):
+        """
+        Start the worker threads if they are not running.
+        """
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping = threading.Event()
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(self._stopping,), name=f'{self.name}-{index}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            if not self._registered_atexit:
+                atexit.register(self.drain)
+                self._registered_atexit = True
+
+    def _work(self, stopping):
+        """
+        Run tasks from the queue until it is empty once `stopping` is set.
+        """
+        while True:
+            try:
+                task = self._queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if stopping.is_set():
+                    return
+                continue
+            try:
+                func, args, kwargs = task
+                try:
+                    func(*args, **kwargs)
+                except Exception:  # pylint: disable=broad-except
+                    log.exception("Error running %s task %r", self.name, func)
+                with self._lock:
+                    self.completed += 1
+            finally:
+                self._queue.task_done()